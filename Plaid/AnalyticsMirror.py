@@ -0,0 +1,303 @@
+"""
+Local columnar mirror of synced transactions for fast analytics, as Parquet files queried with DuckDB.
+
+Every committed sync (and optionally every Chase import) appends its added/modified/removed
+rows as Parquet parts under <root>/transactions/user=<user>/month=<YYYY-MM>/. Rows carry a
+version, so a modified transaction is simply a newer row and a removed one a newer tombstone;
+the `transactions` view keeps the latest version of each transaction. A user's parts are
+compacted back to one file per month once ANALYTICS_MIRROR_COMPACT_FILES extra parts have
+piled up.
+
+    python AnalyticsMirror.py rebuild user123        # (re)load a user's Plaid rows from Plaid_Transactions
+    python AnalyticsMirror.py report user123         # spend by category, merchants, balance trend
+    python AnalyticsMirror.py compact
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import threading
+import time
+import uuid
+from urllib.parse import quote
+
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError:  # the mirror is optional; without duckdb it stays disabled
+    duckdb = None
+
+from Configuration import ANALYTICS_MIRROR_DIR, ANALYTICS_MIRROR_COMPACT_FILES
+from TransactionNormalizer import TRANSACTION_SCHEMA
+
+# DuckDB type each mirrored column is written as, so every part file has the same schema
+# whatever pandas inferred for a page (e.g. an all-None column)
+_DUCKDB_TYPES = {'object': 'VARCHAR', 'category': 'VARCHAR', 'datetime64[ns]': 'DATE', 'float64': 'DOUBLE',
+                 'boolean': 'BOOLEAN'}
+COLUMNS = {**{column: _DUCKDB_TYPES[dtype] for column, dtype in TRANSACTION_SCHEMA.items()}, 'source': 'VARCHAR'}
+TOMBSTONE_COLUMNS = {'transaction_id': 'VARCHAR', 'userID': 'VARCHAR', 'account_id': 'VARCHAR'}
+
+# Later kinds win within one sync page
+_KIND_ORDER = {'added': 0, 'modified': 1, 'removed': 2}
+
+# Partition holding a user's tombstones; removed entries carry no date
+REMOVED_PARTITION = 'removed'
+
+
+def _sql_string(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+class AnalyticsMirror:
+    """
+    Parquet mirror of Plaid_Transactions under root, with DuckDB queries on top.
+
+    apply() appends one sync's deltas; queries see the current state of every transaction.
+    Writes and compactions are serialized by a lock, and so are queries, since they share
+    one in-memory DuckDB connection.
+    """
+
+    def __init__(self, root, compact_files=ANALYTICS_MIRROR_COMPACT_FILES):
+        if duckdb is None:
+            raise RuntimeError("AnalyticsMirror needs duckdb (pip install duckdb)")
+        self.root = root
+        self.compact_files = compact_files
+        self._connection = duckdb.connect()
+        self._lock = threading.RLock()
+
+    def _user_dir(self, user_id):
+        return os.path.join(self.root, 'transactions', f"user={quote(str(user_id), safe='')}")
+
+    def _parts(self, user_id=None):
+        user_dir = self._user_dir(user_id) if user_id is not None else os.path.join(self.root, 'transactions', '*')
+        return glob.glob(os.path.join(user_dir, 'month=*', '*.parquet'))
+
+    def _write(self, df, columns, path, extra_columns):
+        """Write df to one Parquet file with the declared column types"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        select = [f'CAST("{column}" AS {sql_type}) AS "{column}"' for column, sql_type in columns.items()]
+        select += [f'CAST("{column}" AS {sql_type}) AS "{column}"' for column, sql_type in extra_columns.items()]
+        self._connection.register('mirror_frame', df)
+        try:
+            self._connection.execute(f"COPY (SELECT {', '.join(select)} FROM mirror_frame) "
+                                     f"TO {_sql_string(path)} (FORMAT parquet)")
+        finally:
+            self._connection.unregister('mirror_frame')
+
+    def apply(self, user_id, deltas, source='plaid'):
+        """
+        Append one sync's deltas for a user.
+
+        Parameters:
+        user_id (str): Owner of the rows.
+        deltas (dict): 'added' / 'modified' / 'removed' -> iterable of normalized frames
+                       (as TransactionNormalizer returns them, optionally with a sync_page column).
+        source (str): Where the rows came from, e.g. 'plaid' or 'chase'.
+
+        Returns:
+        int: Rows written.
+        """
+        version = time.time_ns()
+        rows = 0
+        with self._lock:
+            for kind in ('added', 'modified', 'removed'):
+                for df in deltas.get(kind, ()):
+                    if df.empty:
+                        continue
+                    df = df.assign(_version=version,
+                                   _seq=df.get('sync_page', 0) * len(_KIND_ORDER) + _KIND_ORDER[kind],
+                                   _deleted=kind == 'removed')
+                    meta = {'_version': 'BIGINT', '_seq': 'BIGINT', '_deleted': 'BOOLEAN'}
+                    if kind == 'removed':
+                        path = os.path.join(self._user_dir(user_id), f"month={REMOVED_PARTITION}",
+                                            f"part-{uuid.uuid4().hex}.parquet")
+                        self._write(df, TOMBSTONE_COLUMNS, path, meta)
+                    else:
+                        df = df.reindex(columns=[*COLUMNS, *meta]).assign(source=source)
+                        for column in ('date', 'authorized_date'):
+                            # Rows read back from a database may hold dates as text
+                            df[column] = pd.to_datetime(df[column], errors='coerce')
+                        months = df['date'].dt.strftime('%Y-%m').fillna('unknown')
+                        for month, month_df in df.groupby(months, sort=False):
+                            path = os.path.join(self._user_dir(user_id), f"month={month}",
+                                                f"part-{uuid.uuid4().hex}.parquet")
+                            self._write(month_df, COLUMNS, path, meta)
+                    rows += len(df)
+            parts = self._parts(user_id)
+            months = {os.path.dirname(path) for path in parts}
+            if self.compact_files and len(parts) - len(months) > self.compact_files:
+                self.compact(user_id)
+        return rows
+
+    def _versions_sql(self, paths):
+        files = ', '.join(_sql_string(path) for path in paths)
+        return f"read_parquet([{files}], hive_partitioning = false, union_by_name = true)"
+
+    def _current_sql(self, paths):
+        """SELECT of the latest, not removed version of every transaction in paths"""
+        columns = ', '.join(f'"{column}"' for column in COLUMNS)
+        return (f"SELECT {columns} FROM ("
+                f"SELECT *, row_number() OVER (PARTITION BY transaction_id ORDER BY _version DESC, _seq DESC) AS _rank "
+                f"FROM {self._versions_sql(paths)}) WHERE _rank = 1 AND NOT _deleted")
+
+    def query(self, sql, params=None, user_id=None):
+        """
+        Run SQL against a `transactions` view of the current mirrored rows.
+
+        Parameters:
+        sql (str): Query using the `transactions` view.
+        params (list): Values for ? placeholders.
+        user_id (str): Only read this user's partitions. None reads every user.
+
+        Returns:
+        pd.DataFrame: The result.
+        """
+        with self._lock:
+            paths = self._parts(user_id)
+            if not paths:
+                empty = ', '.join(f'CAST(NULL AS {sql_type}) AS "{column}"' for column, sql_type in COLUMNS.items())
+                view = f"SELECT {empty} WHERE FALSE"
+            else:
+                view = self._current_sql(paths)
+            self._connection.execute(f"CREATE OR REPLACE TEMP VIEW transactions AS {view}")
+            return self._connection.execute(sql, params or []).df()
+
+    def monthly_spend_by_category(self, user_id, start_month=None, end_month=None):
+        """Outflows per month and personal_finance_category (Plaid amounts are positive for money out)"""
+        return self.query(
+            "SELECT strftime(date, '%Y-%m') AS month, personal_finance_category AS category, "
+            "sum(amount) AS spend, count(*) AS transactions FROM transactions "
+            "WHERE userID = ? AND amount > 0 AND strftime(date, '%Y-%m') BETWEEN ? AND ? "
+            "GROUP BY ALL ORDER BY month, spend DESC",
+            [user_id, start_month or '0000-00', end_month or '9999-99'], user_id)
+
+    def merchant_rollup(self, user_id, limit=20):
+        """Top merchants by total spend"""
+        return self.query(
+            "SELECT coalesce(merchant_name, counterparty_name, 'Unknown') AS merchant, sum(amount) AS spend, "
+            "count(*) AS transactions, min(date) AS first_date, max(date) AS last_date FROM transactions "
+            "WHERE userID = ? AND amount > 0 GROUP BY ALL ORDER BY spend DESC LIMIT ?",
+            [user_id, limit], user_id)
+
+    def balance_trend(self, user_id, account_id=None):
+        """
+        Daily net flow and its running total per account.
+
+        Balances themselves are not synced, so the trend is relative to the first mirrored day.
+        """
+        return self.query(
+            "SELECT account_id, date, -sum(amount) AS net_flow, "
+            "sum(-sum(amount)) OVER (PARTITION BY account_id ORDER BY date) AS cumulative_flow "
+            "FROM transactions WHERE userID = ? AND (? IS NULL OR account_id = ?) AND NOT coalesce(pending, FALSE) "
+            "GROUP BY account_id, date ORDER BY account_id, date",
+            [user_id, account_id, account_id], user_id)
+
+    def compact(self, user_id=None):
+        """Rewrite a user's parts (every user's when None) as one file per month of current rows"""
+        with self._lock:
+            if user_id is None:
+                for user_dir in glob.glob(os.path.join(self.root, 'transactions', 'user=*')):
+                    self._compact_dir(user_dir)
+            else:
+                self._compact_dir(self._user_dir(user_id))
+
+    def _compact_dir(self, user_dir, drop_source=None):
+        paths = glob.glob(os.path.join(user_dir, 'month=*', '*.parquet'))
+        if not paths:
+            return
+        sql = self._current_sql(paths)
+        if drop_source is not None:
+            sql = f"SELECT * FROM ({sql}) WHERE source IS DISTINCT FROM {_sql_string(drop_source)}"
+        current = self._connection.execute(sql).df()
+        new_dir = f"{user_dir}.compact-{uuid.uuid4().hex}"
+        meta = {'_version': 'BIGINT', '_seq': 'BIGINT', '_deleted': 'BOOLEAN'}
+        current = current.assign(_version=time.time_ns(), _seq=0, _deleted=False)
+        months = pd.to_datetime(current['date']).dt.strftime('%Y-%m').fillna('unknown')
+        for month, month_df in current.groupby(months, sort=False):
+            self._write(month_df, COLUMNS, os.path.join(new_dir, f"month={month}", 'part-compact.parquet'), meta)
+        # Swap directories, then drop the old parts; tombstones are no longer needed
+        old_dir = f"{user_dir}.old-{uuid.uuid4().hex}"
+        os.replace(user_dir, old_dir)
+        if os.path.isdir(new_dir):
+            os.replace(new_dir, user_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        print(f"Compacted {len(paths)} parts into {len(current)} rows in {os.path.basename(user_dir)}")
+
+    def drop_user(self, user_id):
+        with self._lock:
+            shutil.rmtree(self._user_dir(user_id), ignore_errors=True)
+
+    def drop_source(self, user_id, source='plaid'):
+        """Forget a user's rows from one source, keeping the others (e.g. imported Chase rows)"""
+        with self._lock:
+            self._compact_dir(self._user_dir(user_id), drop_source=source)
+
+    def rebuild(self, engine, user_id, chunksize=50000):
+        """
+        Replace a user's mirrored Plaid rows with their current Plaid_Transactions rows.
+
+        Rows from other sources are kept: Chase imports are recorded in the ingestion ledger
+        and would not be mirrored again.
+        """
+        from sqlalchemy import text
+        from SyncBuffer import TRANSACTIONS_TABLE
+
+        with self._lock:
+            self.drop_source(user_id, 'plaid')
+            rows = 0
+            with engine.connect() as connection:
+                for chunk in pd.read_sql(text(f"SELECT * FROM {TRANSACTIONS_TABLE} WHERE userID = :user_id"),
+                                         connection, params={'user_id': user_id}, chunksize=chunksize):
+                    rows += self.apply(user_id, {'added': [chunk]})
+            self.compact(user_id)
+        return rows
+
+
+_mirror = None
+_mirror_lock = threading.Lock()
+
+
+def get_mirror():
+    """Return the process-wide AnalyticsMirror, or None when ANALYTICS_MIRROR_DIR is unset or duckdb is missing"""
+    global _mirror
+    if not ANALYTICS_MIRROR_DIR or duckdb is None:
+        return None
+    with _mirror_lock:
+        if _mirror is None:
+            _mirror = AnalyticsMirror(ANALYTICS_MIRROR_DIR)
+        return _mirror
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain and query the local Parquet analytics mirror")
+    parser.add_argument('command', choices=['rebuild', 'report', 'compact'])
+    parser.add_argument('user_id', nargs='?')
+    parser.add_argument('--root', default=ANALYTICS_MIRROR_DIR or 'analytics_mirror')
+    args = parser.parse_args()
+
+    mirror = AnalyticsMirror(args.root)
+    if args.command == 'compact':
+        mirror.compact(args.user_id)
+        return
+    if not args.user_id:
+        parser.error(f"{args.command} needs a user_id")
+    if args.command == 'rebuild':
+        import DatabaseFunctions as dbf
+        start = time.perf_counter()
+        rows = mirror.rebuild(dbf.connect_to_database(), args.user_id)
+        print(f"Mirrored {rows} rows for user {args.user_id} in {time.perf_counter() - start:.2f}s")
+        return
+
+    for title, report in (('Monthly spend by category', mirror.monthly_spend_by_category),
+                          ('Top merchants', mirror.merchant_rollup),
+                          ('Balance trend', mirror.balance_trend)):
+        start = time.perf_counter()
+        df = report(args.user_id)
+        print(f"\n{title} ({len(df)} rows, {(time.perf_counter() - start) * 1000:.1f} ms)")
+        print(df.head(20).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
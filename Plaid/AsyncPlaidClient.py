@@ -0,0 +1,107 @@
+# AsyncPlaidClient.py
+
+import asyncio
+import json
+import random
+import time
+
+try:
+    import httpx
+except ImportError:  # httpx is only needed by the async server (asgi_server.py)
+    httpx = None
+
+from Configuration import (PLAID_CLIENT_ID, PLAID_SECRET_KEY, PLAID_BASE_URL, PLAID_CONNECT_TIMEOUT_SECONDS,
+                           PLAID_READ_TIMEOUT_SECONDS, PLAID_MAX_RETRIES)
+from PlaidClient import LatencyHistogram, RETRY_ERROR_TYPES, RETRY_STATUS_CODES, THROTTLE_STATUS_CODES
+
+
+class AsyncPlaidClient:
+    """
+    asyncio counterpart of PlaidClient, on one pooled keep-alive httpx.AsyncClient.
+
+    Same credentials, timeouts, retry/backoff rules and latency histogram as PlaidClient, but
+    a request waiting on Plaid suspends its coroutine instead of holding a thread, so one
+    event loop can have many Link and exchange calls in flight.
+    """
+
+    def __init__(self, base_url=PLAID_BASE_URL, client_id=PLAID_CLIENT_ID, secret=PLAID_SECRET_KEY,
+                 connect_timeout=PLAID_CONNECT_TIMEOUT_SECONDS, read_timeout=PLAID_READ_TIMEOUT_SECONDS,
+                 max_retries=PLAID_MAX_RETRIES, backoff_base=0.5, backoff_max=16.0, max_connections=100):
+        if httpx is None:
+            raise RuntimeError("AsyncPlaidClient needs httpx (pip install httpx)")
+        self.base_url = base_url.rstrip('/')
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.latency = LatencyHistogram()
+        self._credentials = {"client_id": client_id, "secret": secret}
+        self.session = httpx.AsyncClient(
+            headers={'Content-Type': 'application/json'},
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    def _should_retry(self, response, idempotent=True):
+        if response.status_code in (RETRY_STATUS_CODES if idempotent else THROTTLE_STATUS_CODES):
+            return True
+        if response.status_code < 400:
+            return False
+        try:
+            error = response.json()
+        except ValueError:
+            return False
+        return error.get('error_type') in RETRY_ERROR_TYPES or error.get('error_code') in RETRY_ERROR_TYPES
+
+    def _backoff(self, attempt, response=None):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(self.backoff_max, float(retry_after))
+        return min(self.backoff_max, self.backoff_base * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+    async def post(self, endpoint, payload=None, idempotent=True):
+        """
+        POST a request body to a Plaid endpoint such as '/link/token/create'.
+
+        Parameters:
+        endpoint (str): Path of the Plaid endpoint.
+        payload (dict): Request fields, without client_id/secret.
+        idempotent (bool): False for calls that must not run twice, as for PlaidClient.post;
+            they are only retried when the connection could not be made and on throttling.
+
+        Returns:
+        httpx.Response: The final response after any retries, with its body read.
+        """
+        url = f"{self.base_url}{endpoint}"
+        body = json.dumps({**self._credentials, **(payload or {})})
+
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                response = await self.session.post(url, content=body)
+            except (httpx.ConnectError, httpx.TimeoutException) as e:
+                self.latency.record(endpoint, time.perf_counter() - start, retried=attempt > 0)
+                # ConnectError, ConnectTimeout and PoolTimeout happen before the request is sent
+                not_sent = isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+                if attempt >= self.max_retries or not (idempotent or not_sent):
+                    raise
+                delay = self._backoff(attempt)
+                print(f"Plaid {endpoint} request failed ({e}); retrying in {delay:.1f}s")
+            else:
+                self.latency.record(endpoint, time.perf_counter() - start, retried=attempt > 0)
+                if attempt >= self.max_retries or not self._should_retry(response, idempotent):
+                    return response
+                delay = self._backoff(attempt, response)
+                print(f"Plaid {endpoint} returned {response.status_code}; retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def post_json(self, endpoint, payload=None, idempotent=True):
+        """POST to a Plaid endpoint and return the decoded JSON body"""
+        return (await self.post(endpoint, payload, idempotent)).json()
+
+    def latency_stats(self):
+        return self.latency.as_dict()
+
+    async def close(self):
+        await self.session.aclose()
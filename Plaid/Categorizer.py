@@ -0,0 +1,195 @@
+# Categorizer.py
+
+import json
+import re
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from Configuration import CATEGORY_RULES_FILE, CATEGORY_CACHE_SIZE
+
+_SPACES = re.compile(r'\s+')
+# Inline global flags such as (?i) are only valid at the start of a whole pattern
+_GLOBAL_FLAGS = re.compile(r'\(\?[aiLmsux]+\)')
+
+
+@dataclass(frozen=True)
+class CategoryRule:
+    """One user-defined categorization rule; every condition that is set must hold"""
+    category: str
+    merchant: Optional[str] = None      # regex searched (case-insensitively) in the upper-cased merchant text
+    min_amount: Optional[float] = None  # inclusive, Plaid sign: positive is money out
+    max_amount: Optional[float] = None
+    accounts: tuple = ()                # Plaid account_ids, or 'chase-<card>' for Chase CSV rows
+    override: bool = True               # False only fills rows that have no category yet
+
+
+@lru_cache(maxsize=CATEGORY_CACHE_SIZE)
+def normalize_merchant(value):
+    """Upper-case merchant text with runs of whitespace collapsed; store numbers, '#' and '*' are kept"""
+    return _SPACES.sub(' ', value.upper()).strip()
+
+
+def compile_merchant(rule):
+    """Compiled merchant regex of a rule (None if it has none); raises re.error for an invalid regex"""
+    return re.compile(rule.merchant, re.IGNORECASE) if rule.merchant else None
+
+
+def load_rules(path):
+    """
+    Read rules from a JSON file: a list of objects with the CategoryRule fields, highest priority first.
+
+    A rule with unknown fields or an invalid merchant regex is reported and skipped; the others load.
+
+    Returns:
+    list[CategoryRule]: The valid rules, or None if the file could not be read.
+    """
+    try:
+        with open(path) as f:
+            entries = json.load(f)
+    except Exception as e:
+        print(f"Error loading category rules from {path}: {e}")
+        return None
+
+    rules = []
+    for position, entry in enumerate(entries):
+        try:
+            rule = CategoryRule(**{**entry, 'accounts': tuple(entry.get('accounts') or ())})
+            compile_merchant(rule)
+        except (TypeError, AttributeError, re.error) as e:
+            print(f"Skipping category rule {position} in {path}: {e}")
+            continue
+        rules.append(rule)
+    return rules
+
+
+class Categorizer:
+    """
+    Applies CategoryRules to whole DataFrames; the first matching rule (in list order) wins.
+
+    Merchant regexes without groups or inline flags are compiled into one combined pattern, so
+    a merchant that none of them names costs a single search; the rest (backreferences are
+    renumbered and inline flags become invalid once patterns are joined) are searched one by
+    one. Which rules' regexes match is memoized per upper-cased merchant string in an LRU
+    cache, and a batch only looks up its distinct merchants; amount and account conditions
+    are then evaluated as vectorized masks over the batch. Rules with an invalid regex are
+    reported and never match.
+    """
+
+    def __init__(self, rules, cache_size=CATEGORY_CACHE_SIZE):
+        self.rules = list(rules)
+        self._invalid = set()
+        self._patterns = []
+        for index, rule in enumerate(self.rules):
+            try:
+                pattern = compile_merchant(rule)
+            except re.error as e:
+                print(f"Ignoring category rule {index} ({rule.category}), invalid merchant regex: {e}")
+                self._invalid.add(index)
+                continue
+            if pattern is not None:
+                self._patterns.append((index, pattern))
+
+        joined = [(index, pattern) for index, pattern in self._patterns
+                  if pattern.groups == 0 and not _GLOBAL_FLAGS.search(pattern.pattern)]
+        try:
+            self._combined = re.compile('|'.join(f"(?:{pattern.pattern})" for _, pattern in joined),
+                                        re.IGNORECASE) if joined else None
+        except re.error:
+            self._combined, joined = None, []
+        joined_indexes = {index for index, _ in joined}
+        self._separate = [(index, pattern) for index, pattern in self._patterns if index not in joined_indexes]
+        self._text_rules = lru_cache(maxsize=cache_size)(self._match_text)
+
+    def _match_text(self, text):
+        """Indexes of the rules whose merchant regex matches an upper-cased merchant string"""
+        candidates = self._separate
+        if self._combined is not None and self._combined.search(text):
+            candidates = self._patterns
+        return tuple(index for index, pattern in candidates if pattern.search(text))
+
+    def categorize(self, texts, amounts, accounts, current=None):
+        """
+        Category of every row, or None where no rule matches and there is no current category.
+
+        Parameters:
+        texts (pd.Series): Merchant/description text.
+        amounts (pd.Series): Amounts, positive for money out.
+        accounts (pd.Series): account_id of each row.
+        current (pd.Series): Existing categories, kept where no rule applies.
+
+        Returns:
+        tuple: (np.ndarray of categories, np.ndarray of the matching rule index or -1)
+        """
+        rows = len(texts)
+        codes, merchants = pd.factorize(pd.Series(texts, dtype=object).fillna(''))
+        # One row per distinct merchant: which rules' regexes match it
+        text_hits = np.zeros((len(self.rules), len(merchants) + 1), dtype=bool)
+        for position, merchant in enumerate(merchants):
+            text_hits[list(self._text_rules(normalize_merchant(merchant))), position] = True
+        codes = np.where(codes < 0, len(merchants), codes)
+
+        amounts = pd.to_numeric(pd.Series(amounts), errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        accounts = pd.Series(accounts, dtype=object)
+        current = pd.Series([None] * rows, dtype=object) if current is None else pd.Series(current, dtype=object)
+        uncategorized = current.isna().to_numpy()
+
+        rule_index = np.full(rows, -1)
+        for index, rule in enumerate(self.rules):
+            if index in self._invalid:
+                continue
+            mask = rule_index < 0
+            if rule.merchant:
+                mask &= text_hits[index][codes]
+            if rule.min_amount is not None:
+                mask &= amounts >= rule.min_amount
+            if rule.max_amount is not None:
+                mask &= amounts <= rule.max_amount
+            if rule.accounts:
+                mask &= accounts.isin(rule.accounts).to_numpy()
+            if not rule.override:
+                mask &= uncategorized
+            rule_index[mask] = index
+
+        categories = current.to_numpy(dtype=object, copy=True)
+        matched = rule_index >= 0
+        categories[matched] = np.array([rule.category for rule in self.rules], dtype=object)[rule_index[matched]]
+        return categories, rule_index
+
+    def apply(self, df, text_columns=('merchant_name', 'counterparty_name'), amount_column='amount',
+              account_column='account_id', category_column='personal_finance_category'):
+        """Return df with category_column set by the rules (text from the first non-null text column)"""
+        if df.empty:
+            return df
+        text_columns = [column for column in text_columns if column in df]
+        texts = df[text_columns[0]].astype(object)
+        for column in text_columns[1:]:
+            texts = texts.where(texts.notna(), df[column].astype(object))
+        current = df[category_column].astype(object) if category_column in df else None
+        categories, _ = self.categorize(texts, df[amount_column], df[account_column], current)
+        if category_column in df and isinstance(df[category_column].dtype, pd.CategoricalDtype):
+            categories = pd.Categorical(categories)
+        return df.assign(**{category_column: categories})
+
+    def cache_info(self):
+        return self._text_rules.cache_info()
+
+
+_categorizer = None
+_categorizer_lock = threading.Lock()
+
+
+def get_categorizer():
+    """Return the process-wide Categorizer, or None when CATEGORY_RULES_FILE is unset or holds no rules"""
+    global _categorizer
+    if not CATEGORY_RULES_FILE:
+        return None
+    with _categorizer_lock:
+        if _categorizer is None:
+            # A file that cannot be read categorizes nothing instead of failing every sync
+            _categorizer = Categorizer(load_rules(CATEGORY_RULES_FILE) or [])
+        return _categorizer if _categorizer.rules else None
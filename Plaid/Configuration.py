@@ -1,3 +1,5 @@
+import os
+
 # # Plaid API credentials
 # PLAID_CLIENT_ID = "66c39f3775c2500019c1848b"
 # PLAID_SECRET_KEY = "a24c6e113c28b36d6d4f26d0990c2b"
@@ -16,4 +18,59 @@ PLAID_SECRET_KEY = "d97513d09ac557159c66a0f9750280"
 
 # Plaid environment settings
 PLAID_ENV = "production"
-PLAID_WEBHOOK = "https://www.plaid.com/webhook"
\ No newline at end of file
+PLAID_WEBHOOK = "https://www.plaid.com/webhook"
+
+# Base URL for every Plaid API call. Point it at a local MockPlaidServer.py to test without Plaid.
+PLAID_BASE_URL = os.environ.get('PLAID_BASE_URL', f"https://{PLAID_ENV}.plaid.com")
+
+# Transactions sync concurrency: items synced in parallel, and the request rate shared by all of them
+PLAID_SYNC_MAX_WORKERS = int(os.environ.get('PLAID_SYNC_MAX_WORKERS', 4))
+PLAID_MAX_REQUESTS_PER_SECOND = float(os.environ.get('PLAID_MAX_REQUESTS_PER_SECOND', 5))
+
+# Outbound Plaid HTTP settings used by PlaidClient.py
+PLAID_CONNECT_TIMEOUT_SECONDS = float(os.environ.get('PLAID_CONNECT_TIMEOUT_SECONDS', 5))
+PLAID_READ_TIMEOUT_SECONDS = float(os.environ.get('PLAID_READ_TIMEOUT_SECONDS', 60))
+PLAID_MAX_RETRIES = int(os.environ.get('PLAID_MAX_RETRIES', 4))
+
+# Sync pages are buffered in memory up to this size per item, then spilled to disk until the commit
+SYNC_BUFFER_MEMORY_BUDGET_MB = float(os.environ.get('SYNC_BUFFER_MEMORY_BUDGET_MB', 256))
+
+# Parse /transactions/sync bodies incrementally (needs ijson) in batches of this many transactions
+PLAID_STREAM_SYNC = os.environ.get('PLAID_STREAM_SYNC', '1') != '0'
+PLAID_STREAM_BATCH_SIZE = int(os.environ.get('PLAID_STREAM_BATCH_SIZE', 500))
+
+# Raw sync responses are archived here as compressed per-user, per-day segments ('auto' picks zstd if installed)
+PLAID_ARCHIVE_DIR = os.environ.get('PLAID_ARCHIVE_DIR', 'plaid_responses')
+PLAID_ARCHIVE_CODEC = os.environ.get('PLAID_ARCHIVE_CODEC', 'auto')
+
+# Incoming Plaid webhooks: verify the Plaid-Verification JWT (needs PyJWT[crypto]; set to 0 only to post
+# recorded bodies locally), and coalesce repeated events for one item into one sync per window
+PLAID_WEBHOOK_VERIFY = os.environ.get('PLAID_WEBHOOK_VERIFY', '1') != '0'
+PLAID_WEBHOOK_MAX_AGE_SECONDS = int(os.environ.get('PLAID_WEBHOOK_MAX_AGE_SECONDS', 300))
+PLAID_WEBHOOK_COALESCE_SECONDS = float(os.environ.get('PLAID_WEBHOOK_COALESCE_SECONDS', 10))
+
+# Background jobs (e.g. /api/transactions syncs): jobs run at once, and finished jobs kept for status queries
+JOB_QUEUE_MAX_WORKERS = int(os.environ.get('JOB_QUEUE_MAX_WORKERS', 2))
+JOB_QUEUE_KEEP_FINISHED = int(os.environ.get('JOB_QUEUE_KEEP_FINISHED', 200))
+
+# Read API result cache: entries live this long at most and the least recently used are evicted past the limit
+QUERY_CACHE_TTL_SECONDS = float(os.environ.get('QUERY_CACHE_TTL_SECONDS', 60))
+QUERY_CACHE_MAX_ENTRIES = int(os.environ.get('QUERY_CACHE_MAX_ENTRIES', 1024))
+
+# Items.retrieve_items: /item/get requests in flight at once (still under PLAID_MAX_REQUESTS_PER_SECOND)
+PLAID_ITEM_REFRESH_MAX_WORKERS = int(os.environ.get('PLAID_ITEM_REFRESH_MAX_WORKERS', 8))
+
+# Optional local Parquet/DuckDB analytics mirror of synced transactions (needs duckdb); empty disables it.
+# A user's Parquet parts are compacted to one file per month once this many more have piled up.
+ANALYTICS_MIRROR_DIR = os.environ.get('ANALYTICS_MIRROR_DIR', '')
+ANALYTICS_MIRROR_COMPACT_FILES = int(os.environ.get('ANALYTICS_MIRROR_COMPACT_FILES', 64))
+
+# Plaid <-> Chase CSV duplicate matching: days a Plaid date may differ from the CSV's Transaction Date,
+# and the lowest combined text/date/card score accepted as a match (0-1)
+CROSS_SOURCE_DATE_WINDOW_DAYS = int(os.environ.get('CROSS_SOURCE_DATE_WINDOW_DAYS', 3))
+CROSS_SOURCE_MIN_SCORE = float(os.environ.get('CROSS_SOURCE_MIN_SCORE', 0.55))
+
+# Categorizer: JSON file of user-defined category rules applied to synced and imported transactions
+# (empty disables it), and how many upper-cased merchant strings keep their rule matches cached
+CATEGORY_RULES_FILE = os.environ.get('CATEGORY_RULES_FILE', '')
+CATEGORY_CACHE_SIZE = int(os.environ.get('CATEGORY_CACHE_SIZE', 100000))
@@ -0,0 +1,271 @@
+# CrossSourceMatcher.py
+
+import re
+from datetime import datetime, timedelta
+from decimal import Decimal
+from difflib import SequenceMatcher
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import (Column, Date, DateTime, Float, Integer, MetaData, Numeric, String, Table, delete, inspect,
+                        select, text)
+
+from Configuration import CROSS_SOURCE_DATE_WINDOW_DAYS, CROSS_SOURCE_MIN_SCORE
+from DataAccess import get_account_masks
+
+# Links between Chase CSV rows and the Plaid transactions that report the same card activity
+MATCHES_TABLE = 'Plaid_Chase_Matches'
+
+# Score weights: merchant/description similarity, closeness of the dates, card (mask) agreement
+TEXT_WEIGHT = 0.55
+DATE_WEIGHT = 0.30
+CARD_WEIGHT = 0.15
+
+# Plaid's date is the posting date; it can trail the CSV's Transaction Date by this much more
+POSTING_LAG_DAYS = 7
+
+# Ids per "IN (...)" lookup, below SQL Server's 2100 bound-parameter limit
+LOOKUP_BATCH = 1000
+
+_metadata = MetaData()
+
+matches_table = Table(
+    MATCHES_TABLE, _metadata,
+    Column('chase_transaction_id', String(100), primary_key=True),
+    Column('plaid_transaction_id', String(100), nullable=False, index=True),
+    Column('userID', String(100), nullable=False, index=True),
+    Column('card', String(10)),
+    Column('plaid_account_id', String(100)),
+    Column('amount', Numeric(14, 2)),
+    Column('chase_date', Date),
+    Column('plaid_date', Date),
+    Column('day_diff', Integer),
+    Column('text_score', Float),
+    Column('score', Float),
+    Column('matched_at', DateTime, nullable=False),
+)
+
+# Processor prefixes and noise that differ between a card statement and Plaid's merchant name
+_PREFIXES = re.compile(r'^(SQ ?\*|TST ?\*|SP ?\*?|PY ?\*|PAYPAL ?\*|GOOGLE ?\*|AMZN MKTP US\*?|IN ?\*)\s*')
+_NOISE = re.compile(r'[^A-Z ]+')
+_SPACES = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=65536)
+def normalize_text(value):
+    """Upper-case merchant/description text without processor prefixes, digits and punctuation"""
+    value = _PREFIXES.sub('', (value or '').upper())
+    return _SPACES.sub(' ', _NOISE.sub(' ', value)).strip()
+
+
+@lru_cache(maxsize=262144)
+def text_score(a, b):
+    """
+    Similarity of two normalized texts in [0, 1].
+
+    One text starting the other scores 1 ("STARBUCKS" vs "STARBUCKS STORE SEATTLE"); an empty
+    side scores 0.5, since Plaid leaves merchant_name empty for many payments.
+    """
+    if not a or not b:
+        return 0.5
+    shorter, longer = sorted((a, b), key=len)
+    if len(shorter) >= 3 and longer.startswith(shorter):
+        return 1.0
+    return SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+
+def _prepare(df, card, date, text_columns):
+    """Blocking keys and normalized text of one source"""
+    amount = pd.to_numeric(df['amount'], errors='coerce')
+    usable = (amount.notna() & date.notna()).values
+    df, amount, card, date = df[usable], amount[usable], card[usable], date[usable]
+    text_values = df[text_columns[0]].astype(object)
+    for column in text_columns[1:]:
+        text_values = text_values.where(text_values.notna(), df[column].astype(object))
+    return pd.DataFrame({
+        'id': df['transaction_id'].values,
+        'account_id': df['account_id'].values,
+        'card': card.values,
+        'cents': np.round(amount.values * 100).astype('int64'),
+        'day': date.values.astype('datetime64[D]'),
+        'text': [normalize_text(value if isinstance(value, str) else None) for value in text_values],
+    })
+
+
+def _epoch_days(days):
+    return days.values.astype('datetime64[D]').astype('int64')
+
+
+def match_transactions(plaid, chase, account_masks=None, date_window=CROSS_SOURCE_DATE_WINDOW_DAYS,
+                       min_score=CROSS_SOURCE_MIN_SCORE):
+    """
+    Pair Chase CSV rows with the Plaid transactions that report the same purchase, one to one.
+
+    Candidates are blocked with hash joins on (card, amount in cents, date bucket) - or on the
+    amount and date bucket alone for Plaid accounts whose mask is unknown - and kept when their
+    dates are within date_window days. Buckets are date_window + 1 days wide and each Plaid row
+    joins its own and both neighbouring buckets, so every pair within the window is found while
+    a repeated amount (a daily coffee, a subscription) only meets the rows of nearby days
+    instead of every row with that amount. Each candidate is scored on text similarity, date
+    distance and card agreement; the best-scoring pairs are then assigned greedily so no row
+    is used twice.
+
+    Parameters:
+    plaid (pd.DataFrame): Posted Plaid transactions (Plaid_Transactions/TransactionNormalizer columns).
+    chase (pd.DataFrame): Chase rows shaped by Import_ChaseReport_ToDBO.mirror_frame (account_id 'chase-<card>').
+    account_masks (dict): Plaid account_id -> card mask (DataAccess.get_account_masks).
+    date_window (int): Most days between the two dates of a match.
+    min_score (float): Lowest score accepted as a match.
+
+    Returns:
+    pd.DataFrame: One row per match with the MATCHES_TABLE columns (except userID and matched_at).
+    """
+    columns = [column.name for column in matches_table.columns if column.name not in ('userID', 'matched_at')]
+    if plaid.empty or chase.empty:
+        return pd.DataFrame(columns=columns)
+
+    masks = pd.Series(account_masks or {}, dtype=object)
+    plaid_card = plaid['account_id'].map(masks).fillna('')
+    plaid_date = pd.to_datetime(plaid['authorized_date'], errors='coerce') if 'authorized_date' in plaid else None
+    plaid_date = pd.to_datetime(plaid['date'], errors='coerce') if plaid_date is None else \
+        plaid_date.fillna(pd.to_datetime(plaid['date'], errors='coerce'))
+    left = _prepare(plaid, plaid_card, plaid_date,
+                    [column for column in ('merchant_name', 'counterparty_name') if column in plaid])
+    right = _prepare(chase, chase['account_id'].astype(str).str.replace('chase-', '', regex=False),
+                     pd.to_datetime(chase['date'], errors='coerce'), ['merchant_name'])
+
+    width = date_window + 1
+    right['bucket'] = _epoch_days(right['day']) // width
+    left = pd.concat([left.assign(bucket=_epoch_days(left['day']) // width + offset) for offset in (-1, 0, 1)],
+                     ignore_index=True)
+    known = left['card'] != ''
+    candidates = pd.concat([
+        left[known].merge(right, on=['card', 'cents', 'bucket'], suffixes=('_plaid', '_chase'))
+        .assign(card_known=True),
+        left[~known].drop(columns='card').merge(right, on=['cents', 'bucket'], suffixes=('_plaid', '_chase'))
+        .assign(card_known=False),
+    ], ignore_index=True)
+    candidates['day_diff'] = (candidates['day_plaid'] - candidates['day_chase']).abs().dt.days
+    candidates = candidates[candidates['day_diff'] <= date_window]
+    if candidates.empty:
+        return pd.DataFrame(columns=columns)
+
+    candidates['text_score'] = [text_score(a, b) for a, b in zip(candidates['text_plaid'], candidates['text_chase'])]
+    candidates['score'] = (TEXT_WEIGHT * candidates['text_score']
+                           + DATE_WEIGHT * (1 - candidates['day_diff'] / (date_window + 1))
+                           + CARD_WEIGHT * np.where(candidates['card_known'], 1.0, 0.5)).round(4)
+    candidates = candidates[candidates['score'] >= min_score].sort_values(
+        ['score', 'day_diff', 'id_chase', 'id_plaid'], ascending=[False, True, True, True])
+
+    used_plaid, used_chase, chosen = set(), set(), []
+    for position, (plaid_id, chase_id) in enumerate(zip(candidates['id_plaid'], candidates['id_chase'])):
+        if plaid_id not in used_plaid and chase_id not in used_chase:
+            used_plaid.add(plaid_id)
+            used_chase.add(chase_id)
+            chosen.append(position)
+    matches = candidates.iloc[chosen]
+    return pd.DataFrame({
+        'chase_transaction_id': matches['id_chase'].values,
+        'plaid_transaction_id': matches['id_plaid'].values,
+        'card': matches['card'].values,
+        'plaid_account_id': matches['account_id_plaid'].values,
+        'amount': matches['cents'].values / 100,
+        'chase_date': matches['day_chase'].dt.date.values,
+        'plaid_date': matches['day_plaid'].dt.date.values,
+        'day_diff': matches['day_diff'].values,
+        'text_score': matches['text_score'].round(4).values,
+        'score': matches['score'].values,
+    }, columns=columns)
+
+
+def _batches(values, size=LOOKUP_BATCH):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def load_plaid_candidates(connection, user_id, start_date, end_date, date_window=CROSS_SOURCE_DATE_WINDOW_DAYS):
+    """Posted Plaid transactions of a user that could match Chase rows dated start_date..end_date"""
+    from SyncBuffer import TRANSACTIONS_TABLE
+
+    if not inspect(connection).has_table(TRANSACTIONS_TABLE):
+        return pd.DataFrame(columns=['transaction_id', 'account_id', 'date', 'authorized_date', 'amount',
+                                     'merchant_name', 'counterparty_name'])
+    query = text(f"""
+        SELECT transaction_id, account_id, date, authorized_date, amount, merchant_name, counterparty_name
+        FROM {TRANSACTIONS_TABLE}
+        WHERE userID = :user_id AND date >= :start_date AND date <= :end_date AND pending = :pending""")
+    return pd.read_sql(query, connection, params={
+        'user_id': user_id, 'pending': False,
+        'start_date': pd.Timestamp(start_date).date() - timedelta(days=date_window),
+        'end_date': pd.Timestamp(end_date).date() + timedelta(days=date_window + POSTING_LAG_DAYS),
+    })
+
+
+def match_chase_rows(engine, user_id, chase, date_window=CROSS_SOURCE_DATE_WINDOW_DAYS,
+                     min_score=CROSS_SOURCE_MIN_SCORE):
+    """
+    Match one import's Chase rows against the user's Plaid transactions and store the links.
+
+    Plaid transactions already linked to a Chase row outside this batch are left out, and
+    earlier links of this batch's rows are replaced, so re-running an import is idempotent.
+
+    Parameters:
+    engine (sqlalchemy.engine.base.Engine): Database holding Plaid_Transactions.
+    user_id (str): Owner of both sources.
+    chase (pd.DataFrame): Rows shaped by Import_ChaseReport_ToDBO.mirror_frame.
+
+    Returns:
+    dict: Chase rows, Plaid candidates and matches stored.
+    """
+    chase = chase[pd.to_datetime(chase['date'], errors='coerce').notna()]
+    if chase.empty:
+        return {'chase_rows': 0, 'plaid_candidates': 0, 'matches': 0}
+    dates = pd.to_datetime(chase['date'])
+    account_masks = get_account_masks(engine, user_id)
+
+    with engine.begin() as connection:
+        _metadata.create_all(connection, checkfirst=True)
+        plaid = load_plaid_candidates(connection, user_id, dates.min(), dates.max(), date_window)
+        chase_ids = set(chase['transaction_id'])
+        taken = set()
+        for batch in _batches(plaid['transaction_id']):
+            taken.update(row.plaid_transaction_id for row in connection.execute(
+                select(matches_table.c.plaid_transaction_id, matches_table.c.chase_transaction_id)
+                .where(matches_table.c.plaid_transaction_id.in_(batch)))
+                if row.chase_transaction_id not in chase_ids)
+        plaid = plaid[~plaid['transaction_id'].isin(taken)]
+
+        matches = match_transactions(plaid, chase, account_masks, date_window, min_score)
+        for batch in _batches(chase_ids):
+            connection.execute(delete(matches_table).where(matches_table.c.chase_transaction_id.in_(batch)))
+        if not matches.empty:
+            now = datetime.now()
+            records = matches.assign(userID=user_id, matched_at=now).to_dict('records')
+            for record in records:
+                record['amount'] = Decimal(str(round(record['amount'], 2)))
+                record['day_diff'] = int(record['day_diff'])
+            connection.execute(matches_table.insert(), records)
+
+    return {'chase_rows': len(chase), 'plaid_candidates': len(plaid), 'matches': len(matches)}
+
+
+def linked_chase_ids(connection, chase_ids):
+    """The chase_ids that are linked to a Plaid transaction in Plaid_Chase_Matches"""
+    if not inspect(connection).has_table(MATCHES_TABLE):
+        return set()
+    linked = set()
+    for batch in _batches(set(chase_ids)):
+        linked.update(connection.execute(select(matches_table.c.chase_transaction_id)
+                                         .where(matches_table.c.chase_transaction_id.in_(batch))).scalars())
+    return linked
+
+
+def get_matches(engine, user_id):
+    """Stored Chase <-> Plaid links of a user, newest Chase dates first"""
+    with engine.connect() as connection:
+        if not inspect(connection).has_table(MATCHES_TABLE):
+            return pd.DataFrame(columns=matches_table.c.keys())
+        return pd.read_sql(select(matches_table).where(matches_table.c.userID == user_id)
+                           .order_by(matches_table.c.chase_date.desc()), connection)
@@ -0,0 +1,180 @@
+# DataAccess.py
+
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import Column, MetaData, String, Table, bindparam, delete, inspect, select, text
+
+# Plaid_User_Items is the item table the SPs maintain; Report_Plaid_User_Items is where
+# exchange_public_token_for_access_token stages new items before SP_Fill_Plaid_User_Items runs
+USER_ITEMS_TABLE = 'Plaid_User_Items'
+REPORT_USER_ITEMS_TABLE = 'Report_Plaid_User_Items'
+
+# Accounts of every synced item, as listed in each /transactions/sync response
+ACCOUNTS_TABLE = 'Plaid_Accounts'
+
+# Indexes that keep the lookups below proportional to one user's items, not to every item stored
+ITEM_INDEXES = {
+    USER_ITEMS_TABLE: {
+        'IX_' + USER_ITEMS_TABLE + '_Userid': ('Userid',),
+        'IX_' + USER_ITEMS_TABLE + '_item_id': ('item_id',),
+    },
+    REPORT_USER_ITEMS_TABLE: {
+        'IX_' + REPORT_USER_ITEMS_TABLE + '_user_id': ('user_id',),
+    },
+}
+
+
+@dataclass(frozen=True)
+class PlaidItem:
+    """One linked Plaid item as stored in Plaid_User_Items"""
+    user_id: str
+    item_id: Optional[str]
+    access_token: str
+    last_cursor: Optional[str] = None
+
+
+# Statements are built once at import and reused for every call: SQLAlchemy caches their
+# compiled form, and because the values are always bound parameters the database sees the
+# same SQL text each time and reuses one prepared plan instead of parsing a new string per user.
+_ITEM_COLUMNS = f"SELECT Userid, item_id, access_token, LastCursor FROM {USER_ITEMS_TABLE}"
+
+_ITEMS_STATEMENTS = {
+    # (by user, by item ids)
+    (False, False): text(_ITEM_COLUMNS),
+    (True, False): text(f"{_ITEM_COLUMNS} WHERE Userid = :user_id"),
+    (False, True): text(f"{_ITEM_COLUMNS} WHERE item_id IN :item_ids").bindparams(
+        bindparam('item_ids', expanding=True)),
+    (True, True): text(f"{_ITEM_COLUMNS} WHERE Userid = :user_id AND item_id IN :item_ids").bindparams(
+        bindparam('item_ids', expanding=True)),
+}
+
+_ACCESS_TOKENS_FOR_USER = text(f"SELECT access_token FROM {REPORT_USER_ITEMS_TABLE} WHERE user_id = :user_id")
+_ALL_ACCESS_TOKENS = text(f"SELECT access_token FROM {REPORT_USER_ITEMS_TABLE}")
+
+_metadata = MetaData()
+
+accounts_table = Table(
+    ACCOUNTS_TABLE, _metadata,
+    Column('account_id', String(100), primary_key=True),
+    Column('userID', String(100), nullable=False, index=True),
+    Column('name', String(255)),
+    Column('official_name', String(255)),
+    Column('mask', String(10)),
+    Column('type', String(50)),
+    Column('subtype', String(50)),
+)
+
+_indexed_engines = set()
+_indexed_lock = threading.Lock()
+
+
+def ensure_item_indexes(engine):
+    """
+    Create any of ITEM_INDEXES that are missing, once per engine.
+
+    Missing tables are skipped, and a failure (e.g. no ALTER permission) is only reported:
+    the queries still work without the indexes, just with a scan.
+    """
+    with _indexed_lock:
+        if engine in _indexed_engines:
+            return
+        try:
+            with engine.begin() as connection:
+                quote = connection.dialect.identifier_preparer.quote
+                inspector = inspect(connection)
+                for table_name, indexes in ITEM_INDEXES.items():
+                    if not inspector.has_table(table_name):
+                        continue
+                    existing = {index['name'] for index in inspector.get_indexes(table_name)}
+                    for name, columns in indexes.items():
+                        if name not in existing:
+                            connection.execute(text(f"CREATE INDEX {quote(name)} ON {quote(table_name)} "
+                                                    f"({', '.join(quote(column) for column in columns)})"))
+        except Exception as e:
+            print(f"Could not create item indexes: {e}")
+        _indexed_engines.add(engine)
+
+
+def get_user_items(engine, user_id=None, item_ids=None):
+    """
+    Read linked items, filtered in the database.
+
+    Parameters:
+    engine (sqlalchemy.engine.base.Engine): Database to read.
+    user_id (str): Only this user's items. None reads every user's.
+    item_ids (iterable): Only these items. None reads every item.
+
+    Returns:
+    list[PlaidItem]: The matching items.
+    """
+    ensure_item_indexes(engine)
+    params = {}
+    if user_id is not None:
+        params['user_id'] = user_id
+    if item_ids is not None:
+        params['item_ids'] = list(item_ids)
+        if not params['item_ids']:
+            return []
+    statement = _ITEMS_STATEMENTS[(user_id is not None, item_ids is not None)]
+    with engine.connect() as connection:
+        rows = connection.execute(statement, params).all()
+    return [PlaidItem(user_id=row.Userid, item_id=row.item_id, access_token=row.access_token,
+                      last_cursor=row.LastCursor) for row in rows]
+
+
+def get_access_tokens(engine, user_id=None):
+    """
+    Read access tokens from Report_Plaid_User_Items.
+
+    Parameters:
+    engine (sqlalchemy.engine.base.Engine): Database to read.
+    user_id (str): Only this user's tokens. None reads every token.
+
+    Returns:
+    list[str]: The access tokens.
+    """
+    ensure_item_indexes(engine)
+    with engine.connect() as connection:
+        if user_id is None:
+            result = connection.execute(_ALL_ACCESS_TOKENS)
+        else:
+            result = connection.execute(_ACCESS_TOKENS_FOR_USER, {'user_id': user_id})
+        return list(result.scalars())
+
+
+def get_access_token(engine, user_id):
+    """Return one access token for user_id, or None if the user has none"""
+    ensure_item_indexes(engine)
+    with engine.connect() as connection:
+        return connection.execute(_ACCESS_TOKENS_FOR_USER, {'user_id': user_id}).scalars().first()
+
+
+def store_accounts(connection, user_id, accounts):
+    """
+    Upsert Plaid account objects into Plaid_Accounts, inside the caller's transaction.
+
+    Parameters:
+    connection (sqlalchemy.engine.base.Connection): Open connection.
+    user_id (str): Owner of the accounts.
+    accounts (list): Account dicts from a Plaid response.
+    """
+    rows = [{'account_id': account['account_id'], 'userID': user_id,
+             **{column: account.get(column) for column in ('name', 'official_name', 'mask', 'type', 'subtype')}}
+            for account in accounts if account.get('account_id')]
+    if not rows:
+        return
+    _metadata.create_all(connection, checkfirst=True)
+    connection.execute(delete(accounts_table).where(accounts_table.c.account_id.in_([row['account_id'] for row in rows])))
+    connection.execute(accounts_table.insert(), rows)
+
+
+def get_account_masks(engine, user_id):
+    """Return {account_id: mask} for a user's synced accounts ({} before any sync stored them)"""
+    with engine.connect() as connection:
+        if not inspect(connection).has_table(ACCOUNTS_TABLE):
+            return {}
+        rows = connection.execute(select(accounts_table.c.account_id, accounts_table.c.mask)
+                                  .where(accounts_table.c.userID == user_id))
+        return {row.account_id: row.mask for row in rows if row.mask}
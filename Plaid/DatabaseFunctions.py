@@ -1,40 +1,302 @@
 # DatabaseFunctions.py
 
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import MetaData, Table, create_engine, inspect, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.pool import QueuePool
 import pyodbc
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 import os
+import threading
+import time
+
+
+# Connection pool settings used the first time an engine is created for a connection string.
+# Every later connect_to_database() call for the same database reuses that engine and its pool.
+DB_POOL_SIZE = int(os.environ.get('PERSONALFINANCE_DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('PERSONALFINANCE_DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = int(os.environ.get('PERSONALFINANCE_DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.environ.get('PERSONALFINANCE_DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.environ.get('PERSONALFINANCE_DB_POOL_PRE_PING', '1') != '0'
+
+# Rows sent per executemany batch by insert_dataframe_to_sql()
+BULK_CHUNKSIZE = int(os.environ.get('PERSONALFINANCE_BULK_CHUNKSIZE', 10000))
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+class PoolMetrics:
+    """Counters for connection checkouts, time spent waiting on the pool and overflow usage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.overflow_checkouts = 0
+        self.peak_overflow = 0
+        self.timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record_checkout(self, waited, overflow):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            if overflow > 0:
+                self.overflow_checkouts += 1
+                self.peak_overflow = max(self.peak_overflow, overflow)
+
+    def record_timeout(self, waited):
+        with self._lock:
+            self.timeouts += 1
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'overflow_checkouts': self.overflow_checkouts,
+                'peak_overflow': self.peak_overflow,
+                'timeouts': self.timeouts,
+                'total_wait_seconds': round(self.total_wait_seconds, 6),
+                'max_wait_seconds': round(self.max_wait_seconds, 6),
+                'avg_wait_seconds': round(self.total_wait_seconds / self.checkouts, 6) if self.checkouts else 0.0,
+            }
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that records checkout counts, wait time and overflow in a PoolMetrics object."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            self.metrics.record_timeout(time.perf_counter() - start)
+            raise
+        self.metrics.record_checkout(time.perf_counter() - start, self.overflow())
+        return connection
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool; keep counting into the same metrics
+        new_pool = super().recreate()
+        new_pool.metrics = self.metrics
+        return new_pool
+
+
+def _default_connection_string():
+    # PERSONALFINANCE_DB_URL lets you point everything at a local database, e.g. sqlite:///local.db
+    override = os.environ.get('PERSONALFINANCE_DB_URL')
+    if override:
+        return override
+
+    server = '135.148.27.67'
+    database = 'PersonalFinance'
+    username = 'brishty'
+    password = 'DoNotShare$'
+    driver = 'ODBC Driver 17 for SQL Server'
+
+    return f"mssql+pyodbc://{username}:{password}@{server}/{database}?driver={driver.replace(' ', '+')}"
 
 
+def connect_to_database(connection_string=None, pool_size=None, max_overflow=None, pool_timeout=None,
+                        pool_recycle=None, pool_pre_ping=None):
+    """
+    Return the shared, pooled SQLAlchemy engine for a database, creating it on first use.
+
+    Engines are cached per connection string for the life of the process, so callers can
+    call this as often as they like without paying for driver setup or new TCP/TLS handshakes.
+    Pool options only take effect when the engine is first created.
+
+    Parameters:
+    connection_string (str): SQLAlchemy URL. Defaults to PERSONALFINANCE_DB_URL or the SQL Server.
+    pool_size (int): Connections kept open in the pool.
+    max_overflow (int): Extra connections allowed above pool_size under load.
+    pool_timeout (int): Seconds to wait for a free connection before giving up.
+    pool_recycle (int): Seconds after which a connection is replaced.
+    pool_pre_ping (bool): Test connections on checkout and reconnect if they went stale.
 
-def connect_to_database():
+    Returns:
+    sqlalchemy.engine.base.Engine or None: The pooled engine, or None if it could not be created.
+    """
     try:
-        # Create a connection string
-        server = '135.148.27.67'
-        database = 'PersonalFinance'
-        username = 'brishty'
-        password = 'DoNotShare$'
-        driver = 'ODBC Driver 17 for SQL Server'
-        
-        connection_string = f"mssql+pyodbc://{username}:{password}@{server}/{database}?driver={driver.replace(' ', '+')}"
-        engine = create_engine(connection_string)
+        if connection_string is None:
+            connection_string = _default_connection_string()
+
+        with _engines_lock:
+            engine = _engines.get(connection_string)
+            if engine is None:
+                engine_options = {}
+                if connection_string.startswith('mssql+pyodbc'):
+                    # Send executemany batches as one bulk parameter array instead of a round trip per row
+                    engine_options['fast_executemany'] = True
+                engine = create_engine(
+                    connection_string,
+                    poolclass=MeteredQueuePool,
+                    pool_size=DB_POOL_SIZE if pool_size is None else pool_size,
+                    max_overflow=DB_MAX_OVERFLOW if max_overflow is None else max_overflow,
+                    pool_timeout=DB_POOL_TIMEOUT if pool_timeout is None else pool_timeout,
+                    pool_recycle=DB_POOL_RECYCLE if pool_recycle is None else pool_recycle,
+                    pool_pre_ping=DB_POOL_PRE_PING if pool_pre_ping is None else pool_pre_ping,
+                    **engine_options,
+                )
+                _engines[connection_string] = engine
         return engine
     except Exception as err:
         print("Error connecting to the database:", err)
         return None
+
+
+def get_pool_metrics(engine=None):
+    """
+    Report connection pool metrics.
+
+    Parameters:
+    engine (sqlalchemy.engine.base.Engine): Engine to report on. Defaults to every shared engine.
+
+    Returns:
+    dict: Checkouts, wait time, overflow and current pool state. When no engine is given,
+          a dict of those keyed by database URL (password hidden).
+    """
+    if engine is None:
+        with _engines_lock:
+            engines = list(_engines.values())
+        return {e.url.render_as_string(hide_password=True): get_pool_metrics(e) for e in engines}
+
+    pool = engine.pool
+    metrics = pool.metrics.as_dict() if hasattr(pool, 'metrics') else {}
+    metrics.update({
+        'pool_size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'checked_in': pool.checkedin(),
+        'overflow': pool.overflow(),
+    })
+    return metrics
+
+
+def dispose_engines():
+    """Close every pooled connection and forget the shared engines."""
+    with _engines_lock:
+        engines = list(_engines.values())
+        _engines.clear()
+    for engine in engines:
+        engine.dispose()
+
+
+def _reset_engines_after_fork():
+    # Forked workers (gunicorn, multiprocessing) must not share the parent's sockets
+    global _engines_lock
+    _engines_lock = threading.Lock()
+    for engine in _engines.values():
+        engine.dispose(close=False)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_engines_after_fork)
     
 
-def insert_dataframe_to_sql(df, table_name, engine):
+def _dataframe_records(df):
+    # Plain Python objects with None for NaN/NaT so every driver sends NULLs
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+def _truncate_table(connection, table_name):
+    quoted_name = connection.dialect.identifier_preparer.quote(table_name)
+    if connection.dialect.name == 'mssql':
+        connection.execute(text(f"TRUNCATE TABLE {quoted_name}"))
+    else:
+        connection.execute(text(f"DELETE FROM {quoted_name}"))
+
+
+def bulk_load_dataframe(df, table_name, connection, chunksize=None, truncate=True):
+    """
+    Load a DataFrame into a staging table inside the caller's transaction.
+
+    The table is created from the DataFrame's dtypes if it does not exist yet, and only
+    recreated when the DataFrame brings columns the table does not have. Otherwise the
+    existing schema is kept and the table is truncated (or appended to). Rows are sent in
+    executemany batches of chunksize; on SQL Server the engine uses pyodbc fast_executemany,
+    other databases fall back to their driver's regular executemany.
+
+    Parameters:
+    df (pd.DataFrame): Rows to load.
+    table_name (str): Target staging table.
+    connection (sqlalchemy.engine.base.Connection): Open connection, usually inside engine.begin().
+    chunksize (int): Rows per batch. Defaults to BULK_CHUNKSIZE.
+    truncate (bool): Empty the table before loading. False appends.
+
+    Returns:
+    int: The number of rows inserted.
+    """
+    chunksize = chunksize or BULK_CHUNKSIZE
+
+    if not inspect(connection).has_table(table_name):
+        df.head(0).to_sql(table_name, con=connection, index=False)
+    else:
+        existing_columns = {column['name'] for column in inspect(connection).get_columns(table_name)}
+        new_columns = [column for column in df.columns if column not in existing_columns]
+        if new_columns:
+            print(f"Recreating table {table_name} for new columns: {new_columns}")
+            df.head(0).to_sql(table_name, con=connection, if_exists='replace', index=False)
+        elif truncate:
+            _truncate_table(connection, table_name)
+
+    table = Table(table_name, MetaData(), autoload_with=connection)
+    insert_statement = table.insert()
+
+    rows = 0
+    for start in range(0, len(df), chunksize):
+        records = _dataframe_records(df.iloc[start:start + chunksize])
+        connection.execute(insert_statement, records)
+        rows += len(records)
+    return rows
+
+
+def insert_dataframe_to_sql(df, table_name, engine, chunksize=None, truncate=True):
+    """
+    Bulk load a DataFrame into a staging table and report throughput.
+
+    Parameters:
+    df (pd.DataFrame): Rows to load.
+    table_name (str): Target staging table.
+    engine (sqlalchemy.engine.base.Engine or Connection): Engine, or a connection whose
+        transaction the load should join.
+    chunksize (int): Rows per executemany batch. Defaults to BULK_CHUNKSIZE.
+    truncate (bool): Empty the table before loading. False appends.
+
+    Returns:
+    int or None: The number of rows inserted, or None if the load failed.
+    """
     try:
-        df.to_sql(table_name, con=engine, if_exists='replace', index=False)
-        print(f"Inserted DataFrame into table {table_name}")
+        start = time.perf_counter()
+        if isinstance(engine, Connection):
+            rows = bulk_load_dataframe(df, table_name, engine, chunksize, truncate)
+        else:
+            with engine.begin() as connection:
+                rows = bulk_load_dataframe(df, table_name, connection, chunksize, truncate)
+        elapsed = time.perf_counter() - start
+        rate = rows / elapsed if elapsed > 0 else 0
+        print(f"Inserted {rows} rows into table {table_name} in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+        return rows
     except Exception as e:
         print(f"Error inserting DataFrame into table {table_name}: {e}")
+        return None
 
 
 def run_stored_procedure(engine, procedure_name):
+    """
+    Execute a stored procedure in its own transaction.
+
+    Returns:
+    bool: True if the procedure ran and was committed, False if it failed (and was rolled back).
+    """
     with engine.connect() as connection:
         try:
             # Begin a transaction
@@ -47,12 +309,14 @@ def run_stored_procedure(engine, procedure_name):
 
                 # Commit the transaction
                 trans.commit()
+                return True
             except Exception as e:
                 # Rollback the transaction if there is an error
                 trans.rollback()
                 print(f"Error executing stored procedure {procedure_name}: {e}")
         except Exception as e:
             print(f"Error in transaction management: {e}")
+        return False
 
 
 def read_table_data(connection, table_name):
@@ -1,17 +1,40 @@
-import requests
-import json
 import pandas as pd
 import DatabaseFunctions as dbf
-from Configuration import PLAID_CLIENT_ID, PLAID_SECRET_KEY, PLAID_ENV, PLAID_WEBHOOK
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import text
+from Configuration import PLAID_WEBHOOK, PLAID_ITEM_REFRESH_MAX_WORKERS
+from DataAccess import get_access_token, get_access_tokens
+from PlaidClient import get_client
+from Transactions import plaid_rate_limiter
+
+def link_token_request(user_id):
+    """Body of the /link/token/create request for a user"""
+    return {
+        "client_name": "Personal Finance App",
+        "user": {
+            "client_user_id": user_id
+        },
+        "products": ["transactions"],
+        "country_codes": ["US"],
+        "language": "en",
+        "webhook": PLAID_WEBHOOK,
+        # Add Data Transparency Messaging configuration
+        "update_type": "manual",
+        "link_customization_name": "default",
+        "data_transparency": {
+            "use_cases": ["PERSONAL_FINANCE"],
+            "opt_out_enabled": False,
+            "show_use_cases": True,
+            "show_detailed_scopes": True,
+            "show_third_party_consent": True
+        }
+    }
 
 
 def createItem_public_token():
     """Create a public token for a specific user"""
-    url = f"https://{PLAID_ENV}.plaid.com/sandbox/public_token/create"
-    
-    payload = json.dumps({
-        "client_id": PLAID_CLIENT_ID,
-        "secret": PLAID_SECRET_KEY,
+    response_data = get_client().post_json('/sandbox/public_token/create', {
         "institution_id": "ins_20",
         "initial_products": [
             "transactions"
@@ -20,12 +43,6 @@ def createItem_public_token():
             "webhook": PLAID_WEBHOOK
         }
     })
-    headers = {
-        'Content-Type': 'application/json'
-    }
-    
-    response = requests.request("POST", url, headers=headers, data=payload)
-    response_data = response.json()
     public_token = response_data.get('public_token')
     
     return public_token
@@ -33,26 +50,22 @@ def createItem_public_token():
 
 def exchange_public_token_for_access_token(user_id, public_token):
     """Exchange public token for access token and store the relationship with user"""
-    url = f"https://{PLAID_ENV}.plaid.com/item/public_token/exchange"
-    
     print(f"Exchanging public token: {public_token[:10]}...")
     
-    payload = json.dumps({
-        "client_id": PLAID_CLIENT_ID,
-        "secret": PLAID_SECRET_KEY,
-        "public_token": public_token
-    })
-    headers = {
-        'Content-Type': 'application/json'
-    }
-
     print("Sending request to Plaid API...")
-    response = requests.request("POST", url, headers=headers, data=payload)
+    response = get_client().post('/item/public_token/exchange', {
+        "public_token": public_token
+    }, idempotent=False)
     print(f"Response status code: {response.status_code}")
     print(f"Response body: {response.text}")
     
-    response_data = response.json()
-    
+    access_token, item_id = parse_exchange_response(response.json())
+    store_user_item(user_id, item_id, access_token)
+    return access_token
+
+
+def parse_exchange_response(response_data):
+    """Return (access_token, item_id) from an /item/public_token/exchange response, raising on errors"""
     # Check for errors in the response
     if 'error' in response_data:
         print(f"Error in Plaid API response: {response_data['error']}")
@@ -67,8 +80,11 @@ def exchange_public_token_for_access_token(user_id, public_token):
         raise Exception("Missing access_token or item_id in Plaid API response")
 
     print(f"Successfully received access_token: {access_token[:10]}... and item_id: {item_id[:10]}...")
+    return access_token, item_id
+
 
-    # Store user-item relationship
+def store_user_item(user_id, item_id, access_token):
+    """Store a newly linked item for a user; database errors are reported, not raised"""
     try:
         db_connection = dbf.connect_to_database()
         user_item_data = {
@@ -78,129 +94,148 @@ def exchange_public_token_for_access_token(user_id, public_token):
             'created_at': [pd.Timestamp.now()]
         }
         user_item_df = pd.DataFrame(user_item_data)
-        
+
+        # Report_Plaid_User_Items is replaced on every insert; loading it and running
+        # SP_Fill_Plaid_User_Items in one transaction keeps concurrent exchanges (in any
+        # process) from replacing each other's row before the procedure picked it up
         print("Storing user-item relationship in database...")
-        dbf.insert_dataframe_to_sql(user_item_df, 'Report_Plaid_User_Items', db_connection)
-        print("Running stored procedure...")
-        dbf.run_stored_procedure(db_connection, 'SP_Fill_Plaid_User_Items')
+        with db_connection.begin() as connection:
+            dbf.bulk_load_dataframe(user_item_df, 'Report_Plaid_User_Items', connection)
+            print("Running stored procedure...")
+            connection.execute(text("EXEC SP_Fill_Plaid_User_Items"))
         print("Database operations completed successfully")
     except Exception as e:
         print(f"Database error: {e}")
         # Continue even if database operations fail
-    
-    return access_token
 
 
-def retrieve_items(user_id=None):
-    """Retrieve items, optionally filtered by user_id"""
-    url = f"https://{PLAID_ENV}.plaid.com/item/get"
-    
+# Staging tables written by retrieve_items, one batch per run. SP_Fill_Plaid_items moves the
+# items into Plaid_items; products and status are kept as reported by the latest refresh.
+ITEMS_TABLE = 'Report_Plaid_items'
+ITEM_PRODUCTS_TABLE = 'Report_Plaid_item_products'
+ITEM_STATUS_TABLE = 'Report_Plaid_item_status'
+
+ITEM_COLUMNS = ['consent_expiration_time', 'created_at', 'error', 'institution_id', 'institution_name',
+                'item_id', 'update_type', 'webhook', 'access_token']
+ITEM_PRODUCT_COLUMNS = ['item_id', 'product', 'product_status']
+ITEM_STATUS_COLUMNS = ['item_id', 'last_webhook_sent_at', 'last_webhook_code', 'last_failed_update',
+                       'last_successful_update']
+
+
+def _fetch_item(plaid_client, access_token):
+    """
+    Call /item/get for one access token.
+
+    Returns:
+    tuple: (item row, product rows, status row or None), or None if the item could not be read.
+    """
+    try:
+        plaid_rate_limiter.acquire()
+        response_data = plaid_client.post_json('/item/get', {
+            "access_token": access_token
+        })
+
+        # Check if 'item' key exists in response_data
+        if 'item' not in response_data:
+            print(f"Error: 'item' key not found in response. Response: {response_data}")
+            return None
+
+        item = response_data['item']
+        item_row = {column: item.get(column) for column in ITEM_COLUMNS}
+        item_row['access_token'] = access_token
+        if isinstance(item_row['error'], dict):
+            item_row['error'] = item_row['error'].get('error_code')
+
+        product_rows = [{'item_id': item.get('item_id'), 'product': product, 'product_status': product_status}
+                        for product_status in ('available', 'billed')
+                        for product in item.get(f'{product_status}_products') or []]
+
+        status_row = None
+        if 'status' in response_data and 'transactions' in response_data['status']:
+            # last_webhook is an object ({sent_at, code_sent}) or null; keep its two fields as columns
+            last_webhook = response_data['status'].get('last_webhook') or {}
+            status_row = {
+                'item_id': item.get('item_id'),
+                'last_webhook_sent_at': last_webhook.get('sent_at'),
+                'last_webhook_code': last_webhook.get('code_sent'),
+                'last_failed_update': response_data['status']['transactions'].get('last_failed_update'),
+                'last_successful_update': response_data['status']['transactions'].get('last_successful_update'),
+            }
+        return item_row, product_rows, status_row
+    except Exception as e:
+        print(f"Error retrieving item for access token {access_token}: {e}")
+        return None
+
+
+def retrieve_items(user_id=None, max_workers=PLAID_ITEM_REFRESH_MAX_WORKERS):
+    """
+    Refresh item metadata from /item/get, optionally only for one user's items.
+
+    Items are fetched up to max_workers at a time (sharing the sync rate limiter), then the
+    item, product and status rows of the whole run are written in one transaction and
+    SP_Fill_Plaid_items runs once.
+
+    Parameters:
+    user_id (str): Only this user's items. None refreshes every item.
+    max_workers (int): /item/get requests in flight at once.
+
+    Returns:
+    dict: Items refreshed and failed, elapsed seconds and items per second.
+    """
+    plaid_client = get_client()
+
     # Get access tokens from database
     db_connection = dbf.connect_to_database()
     try:
-        if user_id:
-            query = f"SELECT access_token FROM Report_Plaid_User_Items WHERE user_id = '{user_id}'"
-        else:
-            query = "SELECT access_token FROM Report_Plaid_User_Items"
-        
-        access_tokens_df = pd.read_sql(query, db_connection)
-        access_tokens = access_tokens_df['access_token'].tolist()
+        access_tokens = get_access_tokens(db_connection, user_id or None)
     except Exception as e:
         print(f"Database query error: {e}")
-        return []
-    
-    all_items = []
-    
-    for access_token in access_tokens:
-        payload = json.dumps({
-            "client_id": PLAID_CLIENT_ID,
-            "secret": PLAID_SECRET_KEY,
-            "access_token": access_token
-        })
-        headers = {
-            'Content-Type': 'application/json'
-        }
+        return None
+
+    start = time.perf_counter()
+    if max_workers <= 1 or len(access_tokens) <= 1:
+        results = [_fetch_item(plaid_client, access_token) for access_token in access_tokens]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(access_tokens)),
+                                thread_name_prefix='plaid-items') as executor:
+            results = list(executor.map(lambda access_token: _fetch_item(plaid_client, access_token),
+                                        access_tokens))
+    fetched = [result for result in results if result is not None]
+
+    item_df = pd.DataFrame([item_row for item_row, _, _ in fetched], columns=ITEM_COLUMNS)
+    products_df = pd.DataFrame([row for _, product_rows, _ in fetched for row in product_rows],
+                               columns=ITEM_PRODUCT_COLUMNS)
+    status_df = pd.DataFrame([status_row for _, _, status_row in fetched if status_row is not None],
+                             columns=ITEM_STATUS_COLUMNS)
+    print(item_df)
 
+    if fetched:
         try:
-            response = requests.request("POST", url, headers=headers, data=payload)
-            response_data = response.json()
-            
-            # Check if 'item' key exists in response_data
-            if 'item' not in response_data:
-                print(f"Error: 'item' key not found in response. Response: {response_data}")
-                continue
-
-            # Extract item details into a DataFrame
-            item_data = {
-                'consent_expiration_time': [response_data['item'].get('consent_expiration_time')],
-                'created_at': [response_data['item'].get('created_at')],
-                'error': [response_data['item'].get('error')],
-                'institution_id': [response_data['item'].get('institution_id')],
-                'institution_name': [response_data['item'].get('institution_name')],
-                'item_id': [response_data['item'].get('item_id')],
-                'update_type': [response_data['item'].get('update_type')],
-                'webhook': [response_data['item'].get('webhook')],
-                'access_token': [access_token]
-            }
-            item_df = pd.DataFrame(item_data)
-
-            # Create a DataFrame for each available product with item_id reference
-            if 'available_products' in response_data['item']:
-                available_products_data = {
-                    'item_id': [response_data['item']['item_id']] * len(response_data['item']['available_products']),
-                    'available_product': response_data['item']['available_products']
-                }
-                available_products_df = pd.DataFrame(available_products_data)
-                print(available_products_df)
-
-            # Create a DataFrame for each billed product with item_id reference
-            if 'billed_products' in response_data['item']:
-                billed_products_data = {
-                    'item_id': [response_data['item']['item_id']] * len(response_data['item']['billed_products']),
-                    'billed_product': response_data['item']['billed_products']
-                }
-                billed_products_df = pd.DataFrame(billed_products_data)
-                print(billed_products_df)
-
-            # Extract request details into a DataFrame
-            if 'request_id' in response_data:
-                request_data = {
-                    'request_id': [response_data['request_id']]
-                }
-                request_df = pd.DataFrame(request_data)
-                print(request_df)
-
-            # Extract status details into a DataFrame
-            if 'status' in response_data and 'transactions' in response_data['status']:
-                status_data = {
-                    'last_webhook': [response_data['status'].get('last_webhook')],
-                    'last_failed_update': [response_data['status']['transactions'].get('last_failed_update')],
-                    'last_successful_update': [response_data['status']['transactions'].get('last_successful_update')]
-                }
-                status_df = pd.DataFrame(status_data)
-                print(status_df)
-
-            print(item_df)
-            try:
-                dbf.insert_dataframe_to_sql(item_df, 'Report_Plaid_items', db_connection)
-                dbf.run_stored_procedure(db_connection, 'SP_Fill_Plaid_items')
-            except Exception as e:
-                print(f"Database error when inserting item data: {e}")
-                
+            with db_connection.begin() as connection:
+                for df, table_name in ((item_df, ITEMS_TABLE), (products_df, ITEM_PRODUCTS_TABLE),
+                                       (status_df, ITEM_STATUS_TABLE)):
+                    dbf.bulk_load_dataframe(df, table_name, connection)
+            dbf.run_stored_procedure(db_connection, 'SP_Fill_Plaid_items')
         except Exception as e:
-            print(f"Error retrieving item for access token {access_token}: {e}")
+            print(f"Database error when inserting item data: {e}")
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        'items': len(fetched),
+        'failed': len(results) - len(fetched),
+        'seconds': round(elapsed, 3),
+        'items_per_second': round(len(fetched) / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+    print(f"Refreshed {summary['items']} of {len(results)} items in {elapsed:.2f}s "
+          f"({summary['items_per_second']:,.1f} items/sec)")
+    return summary
 
 
 def get_access_token_for_user(user_id):
     """Get access token for a specific user"""
     try:
         db_connection = dbf.connect_to_database()
-        query = f"SELECT access_token FROM Report_Plaid_User_Items WHERE user_id = '{user_id}'"
-        access_tokens_df = pd.read_sql(query, db_connection)
-        
-        # Get access token as string with error handling
-        access_token_str = access_tokens_df['access_token'].iloc[0] if not access_tokens_df.empty else None
-        return access_token_str
+        return get_access_token(db_connection, user_id)
     except Exception as e:
         print(f"Error getting access token for user {user_id}: {e}")
         return None
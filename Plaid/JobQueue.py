@@ -0,0 +1,152 @@
+# JobQueue.py
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from Configuration import JOB_QUEUE_MAX_WORKERS, JOB_QUEUE_KEEP_FINISHED
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+class Job:
+    """
+    One background job and its progress.
+
+    A Job is also the progress object passed to TransactionsSync: it is told how many items
+    the sync covers, about every page and about every finished item.
+    """
+
+    def __init__(self, kind, key):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.result = None
+        self.progress = {'items_total': None, 'items_done': 0, 'items_failed': 0, 'pages': 0,
+                         'added': 0, 'modified': 0, 'removed': 0}
+        self._lock = threading.Lock()
+
+    def items(self, total):
+        with self._lock:
+            self.progress['items_total'] = total
+
+    def page(self, item_id, counts):
+        with self._lock:
+            self.progress['pages'] += 1
+            for kind in ('added', 'modified', 'removed'):
+                self.progress[kind] += counts.get(kind, 0)
+
+    def item_done(self, summary):
+        with self._lock:
+            self.progress['items_done'] += 1
+            if 'error' in summary:
+                self.progress['items_failed'] += 1
+
+    def fail(self, error):
+        with self._lock:
+            self.error = error
+
+    def as_dict(self, include_result=False):
+        with self._lock:
+            finished_at = self.finished_at or time.time()
+            return {
+                'job_id': self.id,
+                'kind': self.kind,
+                'key': self.key,
+                'status': self.status,
+                'error': self.error,
+                'progress': dict(self.progress),
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'elapsed_seconds': round(finished_at - self.started_at, 3) if self.started_at else None,
+                **({'result': self.result} if include_result else {}),
+            }
+
+
+class JobQueue:
+    """
+    In-process queue of background jobs on a thread pool.
+
+    Jobs are identified by (kind, key), e.g. ('transactions_sync', user_id): submitting while a
+    job with the same kind and key is queued or running returns that job instead of a new one.
+    The most recent keep_finished finished jobs stay available for status queries.
+    """
+
+    def __init__(self, max_workers=JOB_QUEUE_MAX_WORKERS, keep_finished=JOB_QUEUE_KEEP_FINISHED):
+        self.keep_finished = keep_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs = OrderedDict()
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, key, fn, *args, **kwargs):
+        """
+        Run fn(*args, progress=job, **kwargs) in the background, unless the same job is already active.
+
+        Returns:
+        tuple: (Job, created) where created is False when an active job was reused.
+        """
+        with self._lock:
+            active = self._active.get((kind, key))
+            if active is not None:
+                return active, False
+            job = Job(kind, key)
+            self._jobs[job.id] = job
+            self._active[(kind, key)] = job
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job, True
+
+    def _run(self, job, fn, args, kwargs):
+        with job._lock:
+            job.status = 'running'
+            job.started_at = time.time()
+        try:
+            result = fn(*args, progress=job, **kwargs)
+            with job._lock:
+                job.result = result
+        except Exception as e:
+            print(f"Job {job.id} ({job.kind} {job.key}) failed: {e}")
+            job.fail(str(e))
+        finally:
+            with job._lock:
+                job.status = 'failed' if job.error else 'succeeded'
+                job.finished_at = time.time()
+            with self._lock:
+                self._active.pop((job.kind, job.key), None)
+                self._prune()
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status not in ACTIVE_STATUSES]
+        for job_id in finished[:max(len(finished) - self.keep_finished, 0)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, kind=None, key=None):
+        """Jobs newest first, optionally only one kind and key"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job for job in reversed(jobs) if kind in (None, job.kind) and key in (None, job.key)]
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Return the process-wide JobQueue, creating it on first use"""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue()
+        return _job_queue
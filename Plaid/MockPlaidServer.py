@@ -0,0 +1,207 @@
+"""
+Local stand-in for the Plaid API, so the sync code can be exercised without network access.
+
+Serves /transactions/sync pages cut from a recorded sync response, /item/get metadata for
+any access token and the Link flow (/link/token/create, /sandbox/public_token/create,
+/item/public_token/exchange), with optional latency, per-token failures and a request-rate ceiling that answers 429 RATE_LIMIT_EXCEEDED.
+
+    python MockPlaidServer.py --port 8765 --latency-ms 50
+    PLAID_BASE_URL=http://127.0.0.1:8765 python Transactions.py
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_RECORDING = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plaid_responses',
+                                 'transaction_sync_user123_20250302_113810.json')
+
+
+class MockPlaid:
+    """State shared by every request handled by one mock server"""
+
+    def __init__(self, recording=DEFAULT_RECORDING, latency_ms=0, fail_tokens=(), max_requests_per_second=None):
+        with open(recording) as f:
+            recorded = json.load(f)
+        self.accounts = recorded.get('accounts', [])
+        self.transactions = recorded.get('added', [])
+        self.latency = latency_ms / 1000.0
+        self.fail_tokens = set(fail_tokens)
+        self.max_requests_per_second = max_requests_per_second
+        self.request_counts = {}
+        self._window = (0, 0)
+        self._lock = threading.Lock()
+
+    def count_request(self, path):
+        """Record a request and report whether it is over the configured rate"""
+        with self._lock:
+            self.request_counts[path] = self.request_counts.get(path, 0) + 1
+            if not self.max_requests_per_second:
+                return False
+            second, seen = self._window
+            now = int(time.time())
+            seen = seen + 1 if now == second else 1
+            self._window = (now, seen)
+            return seen > self.max_requests_per_second
+
+    def transactions_sync(self, payload):
+        count = int(payload.get('count') or 100)
+        cursor = payload.get('cursor') or 'mock-cursor-0'
+        offset = int(cursor.rsplit('-', 1)[-1])
+        page = self.transactions[offset:offset + count]
+        next_offset = offset + len(page)
+        return {
+            'accounts': self.accounts,
+            'added': page,
+            'modified': [],
+            'removed': [],
+            'next_cursor': f"mock-cursor-{next_offset}",
+            'has_more': next_offset < len(self.transactions),
+            'transactions_update_status': 'HISTORICAL_UPDATE_COMPLETE',
+        }
+
+    def link_token_create(self, payload):
+        return {
+            'link_token': f"link-sandbox-{uuid.uuid4()}",
+            'expiration': '2099-01-01T00:00:00Z',
+        }
+
+    def sandbox_public_token_create(self, payload):
+        return {'public_token': f"public-sandbox-{uuid.uuid4()}"}
+
+    def public_token_exchange(self, payload):
+        # The item and access token are derived from the public token, so exchanges are repeatable
+        token_id = (payload.get('public_token') or '').rsplit('-', 1)[-1] or uuid.uuid4().hex
+        return {
+            'access_token': f"access-sandbox-{token_id}",
+            'item_id': f"mock-item-{token_id}",
+        }
+
+    def item_get(self, payload):
+        access_token = payload.get('access_token') or ''
+        return {
+            'item': {
+                'item_id': 'mock-item-' + access_token,
+                'institution_id': 'ins_20',
+                'institution_name': 'Mock Bank',
+                'webhook': 'https://www.plaid.com/webhook',
+                'error': None,
+                'available_products': ['balance', 'identity', 'investments'],
+                'billed_products': ['transactions'],
+                'consent_expiration_time': None,
+                'created_at': '2025-03-02T11:38:10Z',
+                'update_type': 'background',
+            },
+            'status': {
+                'last_webhook': {
+                    'sent_at': '2025-03-02T11:40:02Z',
+                    'code_sent': 'SYNC_UPDATES_AVAILABLE',
+                },
+                'transactions': {
+                    'last_successful_update': '2025-03-02T11:38:10Z',
+                    'last_failed_update': None,
+                },
+            },
+        }
+
+
+def _plaid_error(error_type, error_code, message):
+    return {
+        'error_type': error_type,
+        'error_code': error_code,
+        'error_message': message,
+        'display_message': None,
+        'request_id': uuid.uuid4().hex[:15],
+    }
+
+
+class MockPlaidHandler(BaseHTTPRequestHandler):
+    server_version = 'MockPlaid/1.0'
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without TCP_NODELAY every response waits on a delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        mock = self.server.mock
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+
+        if mock.latency:
+            time.sleep(mock.latency)
+
+        if mock.count_request(self.path):
+            self._reply(429, _plaid_error('RATE_LIMIT_EXCEEDED', 'TRANSACTIONS_SYNC_LIMIT', 'rate limit exceeded'))
+            return
+
+        if payload.get('access_token') in mock.fail_tokens:
+            self._reply(400, _plaid_error('ITEM_ERROR', 'ITEM_LOGIN_REQUIRED', 'the login details of this item have changed'))
+            return
+
+        route = ROUTES.get(self.path)
+        if route is None:
+            self._reply(404, _plaid_error('INVALID_REQUEST', 'UNKNOWN_ROUTE', f"unknown route {self.path}"))
+            return
+
+        response_data = route(mock, payload)
+        response_data.setdefault('request_id', uuid.uuid4().hex[:15])
+        self._reply(200, response_data)
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class MockPlaidHTTPServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops connections under load tests with many concurrent clients
+    request_queue_size = 1024
+
+
+ROUTES = {
+    '/transactions/sync': MockPlaid.transactions_sync,
+    '/item/get': MockPlaid.item_get,
+    '/link/token/create': MockPlaid.link_token_create,
+    '/sandbox/public_token/create': MockPlaid.sandbox_public_token_create,
+    '/item/public_token/exchange': MockPlaid.public_token_exchange,
+}
+
+
+def start_mock_server(port=0, verbose=False, **options):
+    """Start a mock Plaid server on a background thread and return it; server.base_url is its address"""
+    server = MockPlaidHTTPServer(('127.0.0.1', port), MockPlaidHandler)
+    server.daemon_threads = True
+    server.mock = MockPlaid(**options)
+    server.verbose = verbose
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local mock of the Plaid API")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--recording', default=DEFAULT_RECORDING, help="Recorded /transactions/sync response to serve")
+    parser.add_argument('--latency-ms', type=float, default=0, help="Delay added to every response")
+    parser.add_argument('--fail-token', action='append', default=[], help="Access token that always gets an ITEM_ERROR")
+    parser.add_argument('--max-rps', type=int, default=None, help="Answer 429 RATE_LIMIT_EXCEEDED above this rate")
+    args = parser.parse_args()
+
+    mock_server = start_mock_server(args.port, verbose=True, recording=args.recording, latency_ms=args.latency_ms,
+                                    fail_tokens=args.fail_token, max_requests_per_second=args.max_rps)
+    print(f"Mock Plaid API listening on {mock_server.base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        mock_server.shutdown()
@@ -0,0 +1,299 @@
+# PendingReconciler.py
+
+import argparse
+from datetime import datetime
+from decimal import Decimal
+
+import pandas as pd
+from sqlalchemy import (Column, Date, DateTime, MetaData, Numeric, String, Table, bindparam, delete, inspect, select,
+                        text)
+
+# Open pending transactions, and how every resolved one ended. Maintained during the sync from
+# each page's rows, so reconciling never joins Plaid_Transactions against itself.
+PENDING_INDEX_TABLE = 'Plaid_Pending_Index'
+PENDING_HISTORY_TABLE = 'Plaid_Pending_History'
+
+# History outcomes: replaced by a posted transaction, or removed without one
+POSTED = 'posted'
+CANCELED = 'canceled'
+
+# Ids per "IN (...)" lookup, below SQL Server's 2100 bound-parameter limit
+LOOKUP_BATCH = 1000
+
+_metadata = MetaData()
+
+pending_index = Table(
+    PENDING_INDEX_TABLE, _metadata,
+    Column('transaction_id', String(100), primary_key=True),
+    Column('userID', String(100), nullable=False),
+    Column('account_id', String(100), nullable=False),
+    Column('date', Date),
+    Column('amount', Numeric(14, 2)),
+    Column('merchant_name', String(255)),
+    Column('updated_at', DateTime, nullable=False),
+)
+
+pending_history = Table(
+    PENDING_HISTORY_TABLE, _metadata,
+    Column('pending_transaction_id', String(100), primary_key=True),
+    Column('userID', String(100), nullable=False, index=True),
+    Column('account_id', String(100), nullable=False),
+    Column('outcome', String(10), nullable=False),
+    Column('transaction_id', String(100)),
+    Column('pending_date', Date),
+    Column('posted_date', Date),
+    Column('pending_amount', Numeric(14, 2)),
+    Column('posted_amount', Numeric(14, 2)),
+    Column('resolved_at', DateTime, nullable=False),
+)
+
+# Per-account lookups of the open pending transactions
+_INDEXES = {
+    'IX_' + PENDING_INDEX_TABLE + '_userID_account_id': (pending_index, ('userID', 'account_id')),
+}
+
+
+def ensure_tables(connection):
+    """Create the pending index and history tables (and their indexes) if they are missing"""
+    _metadata.create_all(connection, checkfirst=True)
+    existing = {index['name'] for index in inspect(connection).get_indexes(PENDING_INDEX_TABLE)}
+    quote = connection.dialect.identifier_preparer.quote
+    for name, (table, columns) in _INDEXES.items():
+        if name not in existing:
+            connection.execute(text(f"CREATE INDEX {quote(name)} ON {quote(table.name)} "
+                                    f"({', '.join(quote(column) for column in columns)})"))
+
+
+def _batches(values, size=LOOKUP_BATCH):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _day(value):
+    return None if pd.isna(value) else pd.Timestamp(value).date()
+
+
+def _money(value):
+    return None if value is None or pd.isna(value) else Decimal(str(round(float(value), 2)))
+
+
+class PendingReconciler:
+    """
+    Follows pending transactions through one item's sync, page by page.
+
+    Pending rows are kept in a hash index per account. A posted row whose pending_transaction_id
+    names one resolves it as POSTED; a removed entry for a still-open one resolves it as
+    CANCELED. Ids first seen in an earlier sync are looked up in Plaid_Pending_Index by primary
+    key at commit, so the work per sync is proportional to its pages, not to the history.
+    """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        # account_id -> {transaction_id: pending row} for pending rows seen in this sync
+        self._open = {}
+        # pending transaction_id -> resolution; pending details are None until looked up
+        self._resolved = {}
+        # Ids seen posted without naming a pending transaction, in case one was pending before
+        self._settled = set()
+
+    def _pop_open(self, transaction_id, account_id):
+        if account_id in self._open:
+            return self._open[account_id].pop(transaction_id, None)
+        # Removed entries without an account_id: look through every account
+        for pending in self._open.values():
+            if transaction_id in pending:
+                return pending.pop(transaction_id)
+        return None
+
+    def observe(self, kind, df):
+        """Update the index from one batch of normalized added, modified or removed rows"""
+        if df.empty:
+            return
+        if kind == 'removed':
+            for transaction_id, account_id in zip(df['transaction_id'], df['account_id']):
+                if self._resolved.get(transaction_id, {}).get('outcome') == POSTED:
+                    # Plaid removes the pending transaction once it posted; nothing more to record
+                    continue
+                pending = self._pop_open(transaction_id, account_id)
+                self._resolved[transaction_id] = {'outcome': CANCELED, 'account_id': account_id, 'pending': pending,
+                                                  'transaction_id': None, 'posted_date': None, 'posted_amount': None}
+            return
+
+        is_pending = df['pending'].fillna(False).astype(bool)
+        for row in df.loc[is_pending, ['transaction_id', 'account_id', 'date', 'amount',
+                                       'merchant_name']].to_dict('records'):
+            self._resolved.pop(row['transaction_id'], None)
+            self._open.setdefault(row['account_id'], {})[row['transaction_id']] = row
+
+        posted = df.loc[~is_pending, ['transaction_id', 'account_id', 'date', 'amount', 'pending_transaction_id']]
+        replacing = posted['pending_transaction_id'].notna()
+        self._settled.update(posted.loc[~replacing, 'transaction_id'])
+        for row in posted[replacing].to_dict('records'):
+            pending_id = row['pending_transaction_id']
+            previous = self._resolved.get(pending_id)
+            # The pending row may already be gone: removed earlier in this sync, or opened in an earlier one
+            pending = previous['pending'] if previous else self._pop_open(pending_id, row['account_id'])
+            self._resolved[pending_id] = {'outcome': POSTED, 'account_id': row['account_id'], 'pending': pending,
+                                          'transaction_id': row['transaction_id'], 'posted_date': row['date'],
+                                          'posted_amount': row['amount']}
+
+    def commit(self, connection):
+        """
+        Write the index and history changes of this sync and drop superseded pending rows from
+        Plaid_Transactions, inside the caller's transaction (after the merge).
+
+        Returns:
+        dict: Pending transactions opened, posted and canceled by this sync.
+        """
+        from SyncBuffer import TRANSACTIONS_TABLE
+
+        ensure_tables(connection)
+        now = datetime.now()
+
+        unknown = [pending_id for pending_id, resolution in self._resolved.items() if resolution['pending'] is None]
+        known = {}
+        for batch in _batches(unknown):
+            for row in connection.execute(select(pending_index).where(pending_index.c.transaction_id.in_(batch))):
+                known[row.transaction_id] = row._asdict()
+
+        history = []
+        for pending_id, resolution in self._resolved.items():
+            pending = resolution['pending'] or known.get(pending_id)
+            if pending is None:
+                # Not open: a removed posted transaction, or a posted one whose pending row was never
+                # synced (initial history) or was resolved before. Nothing to record.
+                continue
+            history.append({
+                'pending_transaction_id': pending_id,
+                'userID': self.user_id,
+                'account_id': resolution['account_id'] or pending.get('account_id') or '',
+                'outcome': resolution['outcome'],
+                'transaction_id': resolution['transaction_id'],
+                'pending_date': _day(pending.get('date')),
+                'posted_date': _day(resolution['posted_date']),
+                'pending_amount': _money(pending.get('amount')),
+                'posted_amount': _money(resolution['posted_amount']),
+                'resolved_at': now,
+            })
+
+        opened = [{'transaction_id': row['transaction_id'], 'userID': self.user_id, 'account_id': account_id or '',
+                   'date': _day(row['date']), 'amount': _money(row['amount']),
+                   'merchant_name': row['merchant_name'], 'updated_at': now}
+                  for account_id, rows in self._open.items() for row in rows.values()]
+
+        closed = set(self._resolved) | self._settled | {row['transaction_id'] for row in opened}
+        for batch in _batches(closed):
+            connection.execute(delete(pending_index).where(pending_index.c.transaction_id.in_(batch)))
+        if opened:
+            connection.execute(pending_index.insert(), opened)
+
+        if history:
+            for batch in _batches(row['pending_transaction_id'] for row in history):
+                connection.execute(delete(pending_history).where(pending_history.c.pending_transaction_id.in_(batch)))
+            connection.execute(pending_history.insert(), history)
+
+        # Current state: a posted transaction replaces its pending one even before Plaid removes it
+        superseded = [pending_id for pending_id, resolution in self._resolved.items()
+                      if resolution['outcome'] == POSTED]
+        if superseded and inspect(connection).has_table(TRANSACTIONS_TABLE):
+            statement = text(f"DELETE FROM {TRANSACTIONS_TABLE} WHERE transaction_id IN :ids").bindparams(
+                bindparam('ids', expanding=True))
+            for batch in _batches(superseded):
+                connection.execute(statement, {'ids': batch})
+
+        return {'pending_opened': len(opened),
+                'pending_posted': sum(row['outcome'] == POSTED for row in history),
+                'pending_canceled': sum(row['outcome'] == CANCELED for row in history)}
+
+
+def delete_user_pending(connection, user_id):
+    """Forget a user's open pending transactions and their history, e.g. before a replay"""
+    for table in (pending_index, pending_history):
+        if inspect(connection).has_table(table.name):
+            connection.execute(delete(table).where(table.c.userID == user_id))
+
+
+def rebuild_pending_index(engine, user_id):
+    """
+    Rebuild a user's pending index from Plaid_Transactions, e.g. for history synced before it existed.
+
+    Pending rows named by a posted row's pending_transaction_id are resolved (and dropped from
+    Plaid_Transactions) like a sync would have done; the rest are open.
+
+    Returns:
+    dict: Pending transactions opened and posted.
+    """
+    from SyncBuffer import TRANSACTIONS_TABLE
+
+    reconciler = PendingReconciler(user_id)
+    with engine.begin() as connection:
+        delete_user_pending(connection, user_id)
+        if inspect(connection).has_table(TRANSACTIONS_TABLE):
+            columns = 'transaction_id, account_id, date, amount, merchant_name, pending, pending_transaction_id'
+            pending = pd.read_sql(text(f"SELECT {columns} FROM {TRANSACTIONS_TABLE} "
+                                       f"WHERE userID = :user_id AND pending = :pending"),
+                                  connection, params={'user_id': user_id, 'pending': True})
+            posted = pd.read_sql(text(f"SELECT {columns} FROM {TRANSACTIONS_TABLE} WHERE userID = :user_id "
+                                      f"AND pending = :pending AND pending_transaction_id IS NOT NULL"),
+                                 connection, params={'user_id': user_id, 'pending': False})
+            reconciler.observe('added', pending)
+            reconciler.observe('added', posted)
+        return reconciler.commit(connection)
+
+
+def open_pending(engine, user_id, account_id=None):
+    """A user's open pending transactions, optionally for one account"""
+    statement = select(pending_index).where(pending_index.c.userID == user_id)
+    if account_id:
+        statement = statement.where(pending_index.c.account_id == account_id)
+    with engine.connect() as connection:
+        if not inspect(connection).has_table(PENDING_INDEX_TABLE):
+            return pd.DataFrame(columns=pending_index.c.keys())
+        return pd.read_sql(statement.order_by(pending_index.c.date), connection)
+
+
+def pending_resolutions(engine, user_id, since=None):
+    """
+    How a user's pending transactions were resolved, newest first.
+
+    Parameters:
+    engine (sqlalchemy.engine.base.Engine): Database to read.
+    user_id (str): Owner of the transactions.
+    since (datetime): Only resolutions recorded at or after this time.
+
+    Returns:
+    pd.DataFrame: One row per resolved pending transaction, with amount_change (posted - pending).
+    """
+    statement = select(pending_history).where(pending_history.c.userID == user_id)
+    if since is not None:
+        statement = statement.where(pending_history.c.resolved_at >= since)
+    with engine.connect() as connection:
+        if not inspect(connection).has_table(PENDING_HISTORY_TABLE):
+            return pd.DataFrame(columns=pending_history.c.keys() + ['amount_change'])
+        df = pd.read_sql(statement.order_by(pending_history.c.resolved_at.desc()), connection)
+    amounts = df[['pending_amount', 'posted_amount']].astype('float64')
+    return df.assign(amount_change=(amounts['posted_amount'] - amounts['pending_amount']).round(2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild or print a user's pending transaction reconciliation")
+    parser.add_argument('command', choices=['rebuild', 'report'])
+    parser.add_argument('user_id')
+    args = parser.parse_args()
+
+    import DatabaseFunctions as dbf
+    engine = dbf.connect_to_database()
+    if args.command == 'rebuild':
+        print(rebuild_pending_index(engine, args.user_id))
+        return
+    df = open_pending(engine, args.user_id)
+    print(f"Open pending transactions ({len(df)})")
+    print(df.to_string(index=False))
+    df = pending_resolutions(engine, args.user_id)
+    print(f"\nResolved pending transactions ({len(df)})")
+    print(df.head(50).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
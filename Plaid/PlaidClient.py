@@ -0,0 +1,176 @@
+# PlaidClient.py
+
+import json
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
+
+from Configuration import (PLAID_CLIENT_ID, PLAID_SECRET_KEY, PLAID_BASE_URL, PLAID_CONNECT_TIMEOUT_SECONDS,
+                           PLAID_READ_TIMEOUT_SECONDS, PLAID_MAX_RETRIES)
+
+# Responses worth retrying: throttling and transient server-side failures
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+RETRY_ERROR_TYPES = {'RATE_LIMIT_EXCEEDED'}
+# The only statuses retried for non-idempotent calls: Plaid throttled the request without acting on it
+THROTTLE_STATUS_CODES = {429}
+
+# Upper bounds (milliseconds) of the latency histogram buckets
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf'))
+
+
+class LatencyHistogram:
+    """Per-endpoint request latency counts in fixed millisecond buckets"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, seconds, retried=False):
+        milliseconds = seconds * 1000
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, {
+                'count': 0,
+                'retries': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'buckets': [0] * len(LATENCY_BUCKETS_MS),
+            })
+            stats['count'] += 1
+            stats['retries'] += 1 if retried else 0
+            stats['total_ms'] += milliseconds
+            stats['max_ms'] = max(stats['max_ms'], milliseconds)
+            for i, upper in enumerate(LATENCY_BUCKETS_MS):
+                if milliseconds <= upper:
+                    stats['buckets'][i] += 1
+                    break
+
+    def as_dict(self):
+        with self._lock:
+            report = {}
+            for endpoint, stats in self._endpoints.items():
+                report[endpoint] = {
+                    'count': stats['count'],
+                    'retries': stats['retries'],
+                    'avg_ms': round(stats['total_ms'] / stats['count'], 2),
+                    'max_ms': round(stats['max_ms'], 2),
+                    'buckets': {('inf' if upper == float('inf') else f"le_{upper}ms"): count
+                                for upper, count in zip(LATENCY_BUCKETS_MS, stats['buckets'])},
+                }
+            return report
+
+
+def _not_sent(error):
+    """True when a request failed while connecting, so Plaid never saw it"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    # Refused connections and DNS failures arrive as ConnectionError(MaxRetryError(reason=NewConnectionError))
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(error, requests.ConnectionError) and isinstance(reason, ConnectTimeoutError)
+
+
+class PlaidClient:
+    """
+    Thin wrapper around the Plaid REST API that owns one pooled keep-alive session.
+
+    Adds client_id/secret to every request, applies connect/read timeouts, retries 429/5xx
+    and RATE_LIMIT_EXCEEDED responses with jittered exponential backoff, and records
+    per-endpoint latency. Calls that create something (post(..., idempotent=False)) are only
+    retried when the request cannot have reached Plaid or was throttled: a 5xx or a read
+    timeout may follow a token exchange or Link token Plaid already made.
+    """
+
+    def __init__(self, base_url=PLAID_BASE_URL, client_id=PLAID_CLIENT_ID, secret=PLAID_SECRET_KEY,
+                 connect_timeout=PLAID_CONNECT_TIMEOUT_SECONDS, read_timeout=PLAID_READ_TIMEOUT_SECONDS,
+                 max_retries=PLAID_MAX_RETRIES, backoff_base=0.5, backoff_max=16.0, pool_maxsize=20):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.latency = LatencyHistogram()
+        self._credentials = {"client_id": client_id, "secret": secret}
+
+        self.session = requests.Session()
+        self.session.headers.update({'Content-Type': 'application/json'})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _should_retry(self, response, stream, idempotent=True):
+        if response.status_code in (RETRY_STATUS_CODES if idempotent else THROTTLE_STATUS_CODES):
+            return True
+        if stream or response.status_code < 400:
+            return False
+        try:
+            error = response.json()
+        except ValueError:
+            return False
+        return error.get('error_type') in RETRY_ERROR_TYPES or error.get('error_code') in RETRY_ERROR_TYPES
+
+    def _backoff(self, attempt, response=None):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(self.backoff_max, float(retry_after))
+        return min(self.backoff_max, self.backoff_base * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+    def post(self, endpoint, payload=None, stream=False, idempotent=True):
+        """
+        POST a request body to a Plaid endpoint such as '/transactions/sync'.
+
+        Parameters:
+        endpoint (str): Path of the Plaid endpoint.
+        payload (dict): Request fields, without client_id/secret.
+        stream (bool): Leave the body unread so it can be consumed incrementally.
+        idempotent (bool): False for calls that must not run twice, such as
+            '/item/public_token/exchange'; they are only retried on connect errors and throttling.
+
+        Returns:
+        requests.Response: The final response after any retries.
+        """
+        url = f"{self.base_url}{endpoint}"
+        body = json.dumps({**self._credentials, **(payload or {})})
+
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                response = self.session.post(url, data=body, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.latency.record(endpoint, time.perf_counter() - start, retried=attempt > 0)
+                if attempt >= self.max_retries or not (idempotent or _not_sent(e)):
+                    raise
+                delay = self._backoff(attempt)
+                print(f"Plaid {endpoint} request failed ({e}); retrying in {delay:.1f}s")
+            else:
+                self.latency.record(endpoint, time.perf_counter() - start, retried=attempt > 0)
+                if attempt >= self.max_retries or not self._should_retry(response, stream, idempotent):
+                    return response
+                delay = self._backoff(attempt, response)
+                print(f"Plaid {endpoint} returned {response.status_code}; retrying in {delay:.1f}s")
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def post_json(self, endpoint, payload=None, idempotent=True):
+        """POST to a Plaid endpoint and return the decoded JSON body"""
+        return self.post(endpoint, payload, idempotent=idempotent).json()
+
+    def latency_stats(self):
+        return self.latency.as_dict()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide PlaidClient, creating it on first use"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = PlaidClient()
+        return _client
@@ -0,0 +1,73 @@
+# QueryCache.py
+
+import threading
+import time
+from collections import OrderedDict
+
+from Configuration import QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_TTL_SECONDS
+
+
+class QueryCache:
+    """
+    In-memory LRU cache of read-API results, partitioned by user.
+
+    Entries expire after ttl_seconds and the least recently used entry is evicted past
+    max_entries. invalidate(user_id) drops a user's entries when a sync commits for them;
+    a per-user generation number keeps a query that was already running during the commit
+    from caching its now stale result.
+    """
+
+    def __init__(self, max_entries=QUERY_CACHE_MAX_ENTRIES, ttl_seconds=QUERY_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'evictions': 0}
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def generation(self, user_id):
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def get(self, user_id, key):
+        with self._lock:
+            entry = self._entries.get((user_id, key))
+            if entry is None or time.monotonic() - entry[1] > self.ttl_seconds:
+                if entry is not None:
+                    del self._entries[(user_id, key)]
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end((user_id, key))
+            self.stats['hits'] += 1
+            return entry[0]
+
+    def put(self, user_id, key, value, generation):
+        """Cache value unless the user's data changed since generation was read"""
+        with self._lock:
+            if self._generations.get(user_id, 0) != generation:
+                return
+            self._entries[(user_id, key)] = (value, time.monotonic())
+            self._entries.move_to_end((user_id, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            for cache_key in [cache_key for cache_key in self._entries if cache_key[0] == user_id]:
+                del self._entries[cache_key]
+            self.stats['invalidations'] += 1
+
+    def info(self):
+        with self._lock:
+            return {**self.stats, 'entries': len(self._entries), 'max_entries': self.max_entries,
+                    'ttl_seconds': self.ttl_seconds}
+
+
+query_cache = QueryCache()
+
+
+def invalidate_user(user_id):
+    """Forget cached read results for a user, e.g. after their transactions changed"""
+    query_cache.invalidate(user_id)
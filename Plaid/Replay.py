@@ -0,0 +1,179 @@
+"""
+Rebuild database state from archived /transactions/sync responses without calling Plaid.
+
+Archived pages are replayed per item in cursor order through the same normalizer,
+SyncBuffer and merge as a live sync. LastCursor is never touched.
+
+    python Replay.py user123 --workers 4 --rebuild
+    python Replay.py user123 --dry-run            # decode + normalize only, for benchmarking
+    python Replay.py user123 --legacy             # the old per-page plaid_responses/*.json files
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import inspect, text
+
+import DatabaseFunctions as dbf
+from AnalyticsMirror import get_mirror
+from Configuration import PLAID_ARCHIVE_DIR
+from PendingReconciler import delete_user_pending
+from QueryCache import invalidate_user
+from SpendAggregates import delete_user_aggregates
+from ResponseArchive import ResponseArchive, read_record
+from SyncBuffer import SyncBuffer, TRANSACTIONS_TABLE
+from TransactionNormalizer import normalize_transactions, normalize_removed
+
+
+def replay_order(entries):
+    """
+    Order archived pages per item by following cursor -> next_cursor links.
+
+    Error responses are skipped. When the same cursor was fetched more than once (e.g. a sync
+    that stopped early and was retried) the most recently archived page wins.
+
+    Returns:
+    dict: item_id -> list of index entries in cursor order.
+    """
+    by_item = {}
+    for entry in sorted(entries, key=lambda entry: entry['archived_at']):
+        if entry.get('error_code') or 'next_cursor' not in entry:
+            continue
+        by_item.setdefault(entry['item_id'], {})[entry.get('cursor')] = entry
+
+    ordered = {}
+    for item_id, by_cursor in by_item.items():
+        if None in by_cursor:
+            cursor = None
+        else:
+            # The archive starts mid-history: begin at the oldest cursor no other page leads to
+            next_cursors = {entry['next_cursor'] for entry in by_cursor.values()}
+            starts = [c for c in by_cursor if c not in next_cursors] or list(by_cursor)
+            cursor = min(starts, key=lambda c: by_cursor[c]['archived_at'])
+
+        chain = []
+        seen = set()
+        while cursor in by_cursor and cursor not in seen:
+            seen.add(cursor)
+            chain.append(by_cursor[cursor])
+            cursor = by_cursor[cursor]['next_cursor']
+        ordered[item_id] = chain
+    return ordered
+
+
+def _decode_archived(job):
+    root, entry = job
+    return json.loads(read_record(root, entry))
+
+
+def _decode_legacy(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def decode_in_order(decode, jobs, workers):
+    """Decode pages in order, up to workers at a time in separate processes, holding a bounded window"""
+    if workers <= 1:
+        for job in jobs:
+            yield decode(job)
+        return
+
+    window = workers * 4
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = []
+        for job in jobs:
+            pending.append(executor.submit(decode, job))
+            if len(pending) >= window:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+
+def replay_pages(user_id, pages, engine=None):
+    """
+    Push decoded sync pages for one item through the normalize + load pipeline.
+
+    Parameters:
+    user_id (str): Value for the userID column.
+    pages (iterable): Response dicts in cursor order.
+    engine (sqlalchemy.engine.base.Engine): Database to commit to. None only normalizes.
+
+    Returns:
+    dict: Pages and rows per kind.
+    """
+    buffer = SyncBuffer(user_id)
+    try:
+        page_count = 0
+        for page_count, page in enumerate(pages, 1):
+            buffer.append('added', normalize_transactions(page.get('added', []), user_id), page_count)
+            buffer.append('modified', normalize_transactions(page.get('modified', []), user_id), page_count)
+            buffer.append('removed', normalize_removed(page.get('removed', []), user_id), page_count)
+            buffer.add_accounts(page.get('accounts', []))
+        if engine is not None and page_count:
+            buffer.commit(engine)
+        return {'pages': page_count, **buffer.rows}
+    finally:
+        buffer.close()
+
+
+def delete_user_transactions(engine, user_id):
+    with engine.begin() as connection:
+        if inspect(connection).has_table(TRANSACTIONS_TABLE):
+            result = connection.execute(text(f"DELETE FROM {TRANSACTIONS_TABLE} WHERE userID = :user_id"),
+                                        {'user_id': user_id})
+            print(f"Deleted {result.rowcount} existing {TRANSACTIONS_TABLE} rows for user {user_id}")
+        delete_user_aggregates(connection, user_id)
+        delete_user_pending(connection, user_id)
+    invalidate_user(user_id)
+    mirror = get_mirror()
+    if mirror is not None:
+        mirror.drop_source(user_id, 'plaid')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay archived Plaid sync responses into the database")
+    parser.add_argument('user_id')
+    parser.add_argument('--archive-dir', default=PLAID_ARCHIVE_DIR)
+    parser.add_argument('--day', help="Only replay this YYYYMMDD segment")
+    parser.add_argument('--item', help="Only replay this item_id")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Processes decoding pages")
+    parser.add_argument('--legacy', action='store_true',
+                        help="Replay the old transaction_sync_<user>_<timestamp>.json files in name order")
+    parser.add_argument('--rebuild', action='store_true', help=f"Delete the user's {TRANSACTIONS_TABLE} rows first")
+    parser.add_argument('--dry-run', action='store_true', help="Decode and normalize only; write nothing")
+    args = parser.parse_args()
+
+    if args.legacy:
+        paths = sorted(glob.glob(os.path.join(args.archive_dir, f"transaction_sync_{args.user_id}_*.json")))
+        items = {'legacy': (_decode_legacy, paths)}
+    else:
+        entries = ResponseArchive(args.archive_dir).read_index(args.user_id, args.day)
+        ordered = replay_order(entries)
+        items = {item_id: (_decode_archived, [(args.archive_dir, entry) for entry in chain])
+                 for item_id, chain in ordered.items() if args.item in (None, item_id)}
+
+    engine = None if args.dry_run else dbf.connect_to_database()
+    if args.rebuild and engine is not None:
+        delete_user_transactions(engine, args.user_id)
+
+    start = time.perf_counter()
+    total_rows = 0
+    for item_id, (decode, jobs) in items.items():
+        item_start = time.perf_counter()
+        result = replay_pages(args.user_id, decode_in_order(decode, jobs, args.workers), engine)
+        rows = result['added'] + result['modified'] + result['removed']
+        total_rows += rows
+        print(f"Item {item_id}: {result['pages']} pages, {result['added']} added, {result['modified']} modified, "
+              f"{result['removed']} removed in {time.perf_counter() - item_start:.2f}s")
+
+    elapsed = time.perf_counter() - start
+    rate = total_rows / elapsed if elapsed > 0 else 0
+    print(f"Replayed {len(items)} items, {total_rows} rows in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+
+
+if __name__ == "__main__":
+    main()
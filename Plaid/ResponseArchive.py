@@ -0,0 +1,200 @@
+# ResponseArchive.py
+
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; gzip is always available
+    zstandard = None
+
+from Configuration import PLAID_ARCHIVE_DIR, PLAID_ARCHIVE_CODEC
+
+_EXTENSIONS = {'gzip': 'gz', 'zstd': 'zst'}
+
+# Top-level response fields copied into the index next to each record's location
+_INDEX_FIELDS = ('request_id', 'next_cursor', 'has_more', 'error_code')
+
+
+def _resolve_codec(codec):
+    if codec == 'auto':
+        return 'zstd' if zstandard is not None else 'gzip'
+    if codec == 'zstd' and zstandard is None:
+        raise ValueError("PLAID_ARCHIVE_CODEC is zstd but the zstandard package is not installed")
+    return codec
+
+
+def item_key(item_id, access_token):
+    """Stable archive key for an item that never exposes the access token"""
+    if item_id:
+        return str(item_id)
+    return 'token-' + hashlib.sha256(access_token.encode('utf-8')).hexdigest()[:16]
+
+
+class ArchiveRecord:
+    """
+    One response being written to the archive.
+
+    Bytes passed to write() are compressed on the fly into a standalone gzip member or
+    zstd frame; commit() appends it to the day's segment and indexes it. Newlines are
+    replaced with spaces (JSON strings cannot contain raw newlines), so each record is a
+    single JSON line once decompressed.
+    """
+
+    def __init__(self, archive, user_id, item_id, cursor):
+        self.archive = archive
+        self.user_id = user_id
+        self.item_id = item_id
+        self.cursor = cursor
+        self.raw_bytes = 0
+        self._parts = []
+        if archive.codec == 'zstd':
+            self._compressor = zstandard.ZstdCompressor(level=archive.level).compressobj()
+        else:
+            self._compressor = zlib.compressobj(archive.level, zlib.DEFLATED, 31)
+
+    def write(self, data):
+        data = data.replace(b'\r', b' ').replace(b'\n', b' ')
+        self.raw_bytes += len(data)
+        compressed = self._compressor.compress(data)
+        if compressed:
+            self._parts.append(compressed)
+
+    def commit(self, response_data):
+        """Append the record to its segment and index it with the response's cursor fields"""
+        self._parts.append(self._compressor.compress(b'\n'))
+        self._parts.append(self._compressor.flush())
+        entry = {
+            'user_id': self.user_id,
+            'item_id': self.item_id,
+            'cursor': self.cursor,
+            'raw_length': self.raw_bytes + 1,
+        }
+        entry.update({field: response_data.get(field) for field in _INDEX_FIELDS if field in response_data})
+        return self.archive._append(b''.join(self._parts), entry)
+
+
+class ResponseArchive:
+    """
+    Append-only archive of raw Plaid responses.
+
+    Records go to one compressed JSON Lines segment per user and day,
+    <root>/<user_id>/transaction_sync_<YYYYMMDD>.jsonl.<gz|zst>, and every record gets a line in
+    the matching .index.jsonl with its segment, offset and length, so any single response can
+    be read back without decompressing the rest of the segment.
+    """
+
+    def __init__(self, root=PLAID_ARCHIVE_DIR, codec=PLAID_ARCHIVE_CODEC, level=None):
+        self.root = root
+        self.codec = _resolve_codec(codec)
+        self.level = level if level is not None else (3 if self.codec == 'zstd' else 6)
+        self._lock = threading.Lock()
+
+    def _segment_paths(self, user_id, day):
+        directory = os.path.join(self.root, user_id)
+        base = f"transaction_sync_{day}"
+        return directory, f"{base}.jsonl.{_EXTENSIONS[self.codec]}", f"{base}.index.jsonl"
+
+    def record(self, user_id, item_id=None, cursor=None):
+        """Start a record for one response; write() its body, then commit() it"""
+        return ArchiveRecord(self, user_id, item_id, cursor)
+
+    def append(self, user_id, body, response_data, item_id=None, cursor=None):
+        """Archive a response body that is already in memory"""
+        record = self.record(user_id, item_id, cursor)
+        record.write(body)
+        return record.commit(response_data)
+
+    def _append(self, data, entry):
+        day = datetime.now().strftime("%Y%m%d")
+        directory, segment, index = self._segment_paths(entry['user_id'], day)
+        with self._lock:
+            os.makedirs(directory, exist_ok=True)
+            segment_path = os.path.join(directory, segment)
+            with open(segment_path, 'ab') as f:
+                offset = f.tell()
+                f.write(data)
+            entry.update({
+                'segment': os.path.join(entry['user_id'], segment),
+                'codec': self.codec,
+                'offset': offset,
+                'length': len(data),
+                'archived_at': time.time(),
+            })
+            # Index after the data, so an index line never points past the end of its segment
+            with open(os.path.join(directory, index), 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+        return entry
+
+    def read_index(self, user_id=None, day=None):
+        """
+        Return index entries in write order.
+
+        Parameters:
+        user_id (str): Only this user's records. Defaults to every user in the archive.
+        day (str): Only this YYYYMMDD segment. Defaults to every day.
+
+        Returns:
+        list: Index entries (dicts) ordered by archive time.
+        """
+        if user_id:
+            users = [user_id]
+        elif os.path.isdir(self.root):
+            users = sorted(os.listdir(self.root))
+        else:
+            users = []
+
+        entries = []
+        for user in users:
+            directory = os.path.join(self.root, user)
+            if not os.path.isdir(directory):
+                continue
+            for name in sorted(os.listdir(directory)):
+                if not name.endswith('.index.jsonl') or (day and f"_{day}." not in name):
+                    continue
+                with open(os.path.join(directory, name)) as f:
+                    entries.extend(json.loads(line) for line in f if line.strip())
+        entries.sort(key=lambda entry: entry['archived_at'])
+        return entries
+
+    def read_bytes(self, entry):
+        """Decompress one record given its index entry"""
+        return read_record(self.root, entry)
+
+    def load(self, entry):
+        """Read one record back as the original response dict"""
+        return json.loads(self.read_bytes(entry))
+
+
+def read_record(root, entry):
+    """Read and decompress one record from the archive at root (usable from worker processes)"""
+    with open(os.path.join(root, entry['segment']), 'rb') as f:
+        f.seek(entry['offset'])
+        data = f.read(entry['length'])
+    return decompress_record(data, entry['codec'])
+
+
+def decompress_record(data, codec):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise ValueError("This record is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return zlib.decompress(data, 31)
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def get_archive():
+    """Return the process-wide ResponseArchive, creating it on first use"""
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            _archive = ResponseArchive()
+        return _archive
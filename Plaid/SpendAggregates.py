@@ -0,0 +1,318 @@
+# SpendAggregates.py
+
+import argparse
+import time
+from decimal import Decimal
+
+import pandas as pd
+from sqlalchemy import (Boolean, Column, Date, Integer, MetaData, Numeric, String, Table, and_, bindparam, delete,
+                        func, inspect, select, text)
+
+# Per-bucket sums kept up to date from sync deltas, so dashboards read O(buckets) rows
+# instead of scanning Plaid_Transactions. Amounts follow Plaid: positive is money out.
+CONTRIBUTIONS_TABLE = 'Plaid_Spend_Contributions'
+DAILY_TABLE = 'Plaid_Spend_Daily'
+MONTHLY_TABLE = 'Plaid_Spend_Monthly'
+
+# Category bucket for transactions without a personal_finance_category
+UNCATEGORIZED = 'UNCATEGORIZED'
+
+MEASURES = ['amount', 'outflow', 'transactions', 'pending_amount', 'pending_transactions']
+
+# Ids per "IN (...)" lookup, below SQL Server's 2100 bound-parameter limit
+LOOKUP_BATCH = 1000
+
+# Rows added by Import_ChaseReport_ToDBO are keyed 'chase-<fingerprint>'; they are not in
+# Plaid_Transactions, so a rebuild from there must leave them alone
+CHASE_ID_PREFIX = 'chase-'
+
+_metadata = MetaData()
+
+# What each transaction currently adds to its buckets; read back to retract it on modify/remove
+contributions = Table(
+    CONTRIBUTIONS_TABLE, _metadata,
+    Column('transaction_id', String(100), primary_key=True),
+    Column('userID', String(100), nullable=False, index=True),
+    Column('account_id', String(100), nullable=False),
+    Column('category', String(100), nullable=False),
+    Column('day', Date, nullable=False),
+    Column('amount', Numeric(14, 2), nullable=False),
+    Column('pending', Boolean, nullable=False),
+)
+
+
+def _bucket_table(name, period_column):
+    return Table(
+        name, _metadata,
+        Column('userID', String(100), primary_key=True),
+        Column('account_id', String(100), primary_key=True),
+        Column('category', String(100), primary_key=True),
+        period_column,
+        Column('amount', Numeric(16, 2), nullable=False),
+        Column('outflow', Numeric(16, 2), nullable=False),
+        Column('transactions', Integer, nullable=False),
+        Column('pending_amount', Numeric(16, 2), nullable=False),
+        Column('pending_transactions', Integer, nullable=False),
+    )
+
+
+daily = _bucket_table(DAILY_TABLE, Column('day', Date, primary_key=True))
+monthly = _bucket_table(MONTHLY_TABLE, Column('month', String(7), primary_key=True))
+
+# Bucket table -> (period column, how a contribution's day maps to it)
+_BUCKETS = {
+    daily: ('day', lambda days: days),
+    monthly: ('month', lambda days: pd.to_datetime(days).dt.strftime('%Y-%m')),
+}
+
+
+def ensure_tables(connection):
+    """Create the contribution and bucket tables if they are missing"""
+    _metadata.create_all(connection, checkfirst=True)
+
+
+def _batches(values, size=LOOKUP_BATCH):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _contribution_rows(user_id, upserts):
+    """Shape added/modified transactions (TransactionNormalizer columns) into contribution rows"""
+    if upserts is None or upserts.empty:
+        return pd.DataFrame(columns=[column.name for column in contributions.columns])
+    rows = pd.DataFrame({
+        'transaction_id': upserts['transaction_id'].astype(object).values,
+        'userID': user_id,
+        'account_id': upserts['account_id'].astype(object).fillna('').values,
+        'category': upserts['personal_finance_category'].astype(object).fillna(UNCATEGORIZED).values,
+        'day': pd.to_datetime(upserts['date'], errors='coerce').dt.date.values,
+        'amount': pd.to_numeric(upserts['amount'], errors='coerce').fillna(0).round(2).values,
+        'pending': upserts['pending'].astype('boolean').fillna(False).astype(bool).values
+        if 'pending' in upserts else False,
+    })
+    # A transaction without a date cannot be bucketed
+    return rows[rows['day'].notna()]
+
+
+def _measures(rows, sign):
+    """Bucket measures each contribution row adds (sign=1) or takes away (sign=-1)"""
+    amount = rows['amount'].astype('float64')
+    pending = rows['pending'].astype(bool)
+    return rows.assign(
+        amount=amount.where(~pending, 0.0) * sign,
+        outflow=amount.clip(lower=0).where(~pending, 0.0) * sign,
+        transactions=(~pending).astype('int64') * sign,
+        pending_amount=amount.where(pending, 0.0) * sign,
+        pending_transactions=pending.astype('int64') * sign,
+    )
+
+
+def _read_contributions(connection, transaction_ids):
+    frames = []
+    for batch in _batches(transaction_ids):
+        result = connection.execute(select(contributions).where(contributions.c.transaction_id.in_(batch)))
+        frames.append(pd.DataFrame(result.fetchall(), columns=list(result.keys())))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=contributions.c.keys())
+
+
+def _apply_deltas(connection, table, deltas):
+    """Add summed measure deltas to their buckets: UPDATE existing buckets, INSERT new ones"""
+    period, to_period = _BUCKETS[table]
+    keys = ['userID', 'account_id', 'category', period]
+    deltas = deltas.assign(**{period: to_period(deltas['day'])})
+    deltas = deltas.groupby(keys, as_index=False)[MEASURES].sum()
+    deltas = deltas[(deltas[MEASURES] != 0).any(axis=1)]
+    if deltas.empty:
+        return
+
+    # Existing buckets are looked up per user by period alone (one parameter per period, unlike
+    # a row-value IN, which SQL Server does not support) and matched on the full key here
+    existing = set()
+    key_columns = [table.c[key] for key in keys]
+    for user_id, periods in deltas.groupby('userID')[period]:
+        for batch in _batches(periods.unique().tolist()):
+            existing.update(tuple(row) for row in connection.execute(
+                select(*key_columns).where(table.c.userID == user_id, table.c[period].in_(batch))))
+
+    records = [{**dict(zip(keys, key)), **{measure: _number(measure, value) for measure, value in
+                                           zip(MEASURES, values)}}
+               for key, values in zip(deltas[keys].itertuples(index=False, name=None),
+                                      deltas[MEASURES].itertuples(index=False, name=None))]
+    updates = [record for record in records if tuple(record[key] for key in keys) in existing]
+    inserts = [record for record in records if tuple(record[key] for key in keys) not in existing]
+
+    if updates:
+        connection.execute(
+            table.update()
+            .where(and_(*[table.c[key] == bindparam(f'key_{key}') for key in keys]))
+            .values({measure: table.c[measure] + bindparam(f'delta_{measure}') for measure in MEASURES}),
+            [{**{f'key_{key}': record[key] for key in keys},
+              **{f'delta_{measure}': record[measure] for measure in MEASURES}} for record in updates])
+    if inserts:
+        connection.execute(table.insert(), inserts)
+    # Buckets whose every transaction was retracted carry no information
+    connection.execute(delete(table).where(table.c.transactions == 0, table.c.pending_transactions == 0,
+                                           table.c.userID.in_(deltas['userID'].unique().tolist())))
+
+
+def _number(measure, value):
+    if measure in ('transactions', 'pending_transactions'):
+        return int(value)
+    return Decimal(str(round(float(value), 2)))
+
+
+def update_spend_aggregates(connection, user_id, upserts=None, removed_ids=()):
+    """
+    Apply one batch of transaction changes to the spend aggregates, inside the caller's transaction.
+
+    Every touched transaction's previous contribution is retracted and its new one applied, so
+    a modified amount, date, category or pending flag moves between buckets exactly once. A
+    posted transaction naming a pending_transaction_id also retracts that pending transaction,
+    so the purchase is not counted twice while Plaid has not yet sent the pending one's removal
+    (which then finds nothing left to retract).
+
+    Parameters:
+    connection (sqlalchemy.engine.base.Connection): Open connection, usually inside engine.begin().
+    user_id (str): Owner of the transactions.
+    upserts (pd.DataFrame): Latest version of each added/modified transaction (TransactionNormalizer columns).
+    removed_ids (iterable): transaction_ids removed by this batch.
+
+    Returns:
+    dict: Contributions retracted and applied.
+    """
+    ensure_tables(connection)
+    new_rows = _contribution_rows(user_id, upserts)
+
+    touched = set(removed_ids) | set(new_rows['transaction_id'])
+    if upserts is not None and 'pending_transaction_id' in upserts:
+        touched |= set(upserts['pending_transaction_id'].dropna())
+    old_rows = _read_contributions(connection, touched)
+
+    for batch in _batches(old_rows['transaction_id']):
+        connection.execute(delete(contributions).where(contributions.c.transaction_id.in_(batch)))
+    if not new_rows.empty:
+        connection.execute(contributions.insert(), [
+            {**record, 'amount': Decimal(str(record['amount'])), 'pending': bool(record['pending'])}
+            for record in new_rows.to_dict('records')])
+
+    deltas = pd.concat([_measures(old_rows, -1), _measures(new_rows, 1)], ignore_index=True)
+    if not deltas.empty:
+        for table in _BUCKETS:
+            _apply_deltas(connection, table, deltas)
+    return {'retracted': len(old_rows), 'applied': len(new_rows)}
+
+
+def delete_user_aggregates(connection, user_id, chunksize=50000):
+    """
+    Forget a user's Plaid contributions, e.g. before a rebuild from Plaid_Transactions.
+
+    Contributions of imported Chase rows are kept, and the user's buckets are recomputed from them.
+    """
+    if not inspect(connection).has_table(CONTRIBUTIONS_TABLE):
+        return
+    connection.execute(delete(contributions).where(contributions.c.userID == user_id,
+                                                   ~contributions.c.transaction_id.startswith(CHASE_ID_PREFIX)))
+    for table in _BUCKETS:
+        connection.execute(delete(table).where(table.c.userID == user_id))
+    # Paged by transaction_id, so no result set stays open while the buckets are written
+    last = ''
+    while True:
+        result = connection.execute(select(contributions)
+                                    .where(contributions.c.userID == user_id, contributions.c.transaction_id > last)
+                                    .order_by(contributions.c.transaction_id).limit(chunksize))
+        kept = pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+        if kept.empty:
+            return
+        for table in _BUCKETS:
+            _apply_deltas(connection, table, _measures(kept, 1))
+        last = kept['transaction_id'].iloc[-1]
+
+
+def rebuild_user_aggregates(engine, user_id, chunksize=50000):
+    """Recompute a user's Plaid aggregates from Plaid_Transactions, e.g. to backfill existing history"""
+    from SyncBuffer import TRANSACTIONS_TABLE
+
+    with engine.begin() as connection:
+        ensure_tables(connection)
+        delete_user_aggregates(connection, user_id)
+        rows = 0
+        if inspect(connection).has_table(TRANSACTIONS_TABLE):
+            query = text(f"SELECT * FROM {TRANSACTIONS_TABLE} WHERE userID = :user_id")
+            for chunk in pd.read_sql(query, connection, params={'user_id': user_id}, chunksize=chunksize):
+                # Posted rows in the table may still name their (already removed) pending row
+                rows += update_spend_aggregates(connection, user_id, chunk.drop(columns='pending_transaction_id',
+                                                                                errors='ignore'))['applied']
+    return rows
+
+
+def monthly_spend(engine, user_id, start_month=None, end_month=None, by_account=False):
+    """
+    Spend per month and category from the monthly buckets.
+
+    Parameters:
+    engine (sqlalchemy.engine.base.Engine): Database to read.
+    user_id (str): Owner of the transactions.
+    start_month, end_month (str): Inclusive YYYY-MM range.
+    by_account (bool): Keep accounts apart instead of summing them.
+
+    Returns:
+    pd.DataFrame: month, (account_id,) category and the bucket measures.
+    """
+    keys = [monthly.c.month, *([monthly.c.account_id] if by_account else []), monthly.c.category]
+    statement = (select(*keys, *[func.sum(monthly.c[measure]).label(measure) for measure in MEASURES])
+                 .where(monthly.c.userID == user_id,
+                        monthly.c.month >= (start_month or '0000-00'), monthly.c.month <= (end_month or '9999-99'))
+                 .group_by(*keys).order_by(monthly.c.month, *keys[1:]))
+    with engine.connect() as connection:
+        if not inspect(connection).has_table(MONTHLY_TABLE):
+            return pd.DataFrame(columns=[key.name for key in keys] + MEASURES)
+        return _with_float_measures(pd.read_sql(statement, connection))
+
+
+def daily_spend(engine, user_id, start_date=None, end_date=None, account_id=None, category=None):
+    """Daily buckets of a user, optionally for one account and/or category"""
+    conditions = [daily.c.userID == user_id]
+    if start_date:
+        conditions.append(daily.c.day >= pd.to_datetime(start_date).date())
+    if end_date:
+        conditions.append(daily.c.day <= pd.to_datetime(end_date).date())
+    if account_id:
+        conditions.append(daily.c.account_id == account_id)
+    if category:
+        conditions.append(daily.c.category == category)
+    statement = select(daily).where(*conditions).order_by(daily.c.day, daily.c.account_id, daily.c.category)
+    with engine.connect() as connection:
+        if not inspect(connection).has_table(DAILY_TABLE):
+            return pd.DataFrame(columns=daily.c.keys())
+        return _with_float_measures(pd.read_sql(statement, connection))
+
+
+def _with_float_measures(df):
+    # Numeric sums come back as Decimal; floats serialize to JSON and aggregate in pandas directly
+    return df.astype({measure: 'float64' for measure in ('amount', 'outflow', 'pending_amount')}).astype(
+        {measure: 'int64' for measure in ('transactions', 'pending_transactions')})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild or print a user's spend aggregates")
+    parser.add_argument('command', choices=['rebuild', 'report'])
+    parser.add_argument('user_id')
+    parser.add_argument('--start-month', help="YYYY-MM")
+    parser.add_argument('--end-month', help="YYYY-MM")
+    args = parser.parse_args()
+
+    import DatabaseFunctions as dbf
+    engine = dbf.connect_to_database()
+    start = time.perf_counter()
+    if args.command == 'rebuild':
+        rows = rebuild_user_aggregates(engine, args.user_id)
+        print(f"Aggregated {rows} transactions for user {args.user_id} in {time.perf_counter() - start:.2f}s")
+        return
+    df = monthly_spend(engine, args.user_id, args.start_month, args.end_month)
+    print(f"Monthly spend by category ({len(df)} rows, {(time.perf_counter() - start) * 1000:.1f} ms)")
+    print(df.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+# SyncBuffer.py
+
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+from sqlalchemy import Column, MetaData, Table, inspect, text
+
+import DatabaseFunctions as dbf
+from AnalyticsMirror import get_mirror
+from Configuration import SYNC_BUFFER_MEMORY_BUDGET_MB
+from DataAccess import store_accounts
+from PendingReconciler import PendingReconciler
+from QueryCache import invalidate_user
+from SpendAggregates import update_spend_aggregates
+from TransactionNormalizer import normalize_transactions, normalize_removed
+
+# Staging table per kind of sync delta
+STAGING_TABLES = {
+    'added': 'test_transactions_added',
+    'modified': 'test_transactions_modified',
+    'removed': 'test_transactions_removed',
+}
+
+# Current state of every synced transaction, maintained from the staged deltas
+TRANSACTIONS_TABLE = 'Plaid_Transactions'
+
+# Cursor hand-off to SP_Update_Plaid_User_Items_LastCursor, which owns the update of Plaid_User_Items
+CURSOR_STAGING_TABLE = 'temp_cursor_data'
+CURSOR_PROCEDURE = 'SP_Update_Plaid_User_Items_LastCursor'
+
+# Page number within the sync, used to keep only the latest version of a transaction
+SYNC_PAGE_COLUMN = 'sync_page'
+
+# Columns of a delta the spend aggregates need
+AGGREGATE_COLUMNS = ['transaction_id', 'account_id', 'personal_finance_category', 'date', 'amount', 'pending',
+                     'pending_transaction_id']
+
+# Indexes on TRANSACTIONS_TABLE: merge lookups by id, and the read API's per-user keyset order
+TRANSACTIONS_INDEXES = {
+    'IX_' + TRANSACTIONS_TABLE + '_transaction_id': ('transaction_id',),
+    'IX_' + TRANSACTIONS_TABLE + '_userID_date': ('userID', 'date', 'transaction_id'),
+}
+
+
+class SyncBuffer:
+    """
+    Collects the normalized added/modified/removed frames of one item's sync until commit.
+
+    Frames stay in memory up to memory_budget_mb; past that every buffered frame is pickled
+    to a temporary spill directory and read back one at a time when the buffer is committed.
+    Pending transactions are reconciled as each frame arrives (see PendingReconciler).
+    """
+
+    def __init__(self, user_id, memory_budget_mb=SYNC_BUFFER_MEMORY_BUDGET_MB):
+        self.user_id = user_id
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.memory_bytes = 0
+        self.rows = {kind: 0 for kind in STAGING_TABLES}
+        self.spilled_frames = 0
+        self._frames = {kind: [] for kind in STAGING_TABLES}
+        self._spill_dir = None
+        self.reconciler = PendingReconciler(user_id)
+        self.accounts = {}
+
+    def append(self, kind, df, page):
+        """Buffer one page's frame of a kind ('added', 'modified' or 'removed')"""
+        if df.empty:
+            return
+        self.reconciler.observe(kind, df)
+        df = df.assign(**{SYNC_PAGE_COLUMN: page})
+        self.rows[kind] += len(df)
+        self._frames[kind].append(df)
+        self.memory_bytes += int(df.memory_usage(deep=True).sum())
+        if self.memory_bytes > self.memory_budget:
+            self._spill()
+
+    def add_accounts(self, accounts):
+        """Remember the item's accounts listed in a sync page; the latest listing of each wins"""
+        for account in accounts:
+            self.accounts[account.get('account_id')] = account
+
+    def _spill(self):
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix=f"plaid-sync-{self.user_id}-")
+        for kind, frames in self._frames.items():
+            for i, frame in enumerate(frames):
+                if isinstance(frame, pd.DataFrame):
+                    path = os.path.join(self._spill_dir, f"{kind}_{self.spilled_frames:06d}.pkl")
+                    frame.to_pickle(path)
+                    frames[i] = path
+                    self.spilled_frames += 1
+        self.memory_bytes = 0
+
+    def frames(self, kind):
+        """Yield the buffered frames of a kind in page order, loading spilled ones from disk"""
+        for frame in self._frames[kind]:
+            yield frame if isinstance(frame, pd.DataFrame) else pd.read_pickle(frame)
+
+    def _empty_frame(self, kind):
+        empty = normalize_removed([], self.user_id) if kind == 'removed' else normalize_transactions([], self.user_id)
+        return empty.assign(**{SYNC_PAGE_COLUMN: pd.Series(dtype='int64')})
+
+    def stage(self, connection):
+        """Load every buffered frame into the staging tables, replacing their previous contents"""
+        for kind, table_name in STAGING_TABLES.items():
+            truncate = True
+            for frame in self.frames(kind):
+                dbf.bulk_load_dataframe(frame, table_name, connection, truncate=truncate)
+                truncate = False
+            if truncate:
+                # Nothing of this kind: still empty the table so stale rows are not merged again
+                dbf.bulk_load_dataframe(self._empty_frame(kind), table_name, connection)
+
+    def commit(self, engine, access_token=None, cursor=None):
+        """
+        Stage all buffered deltas, merge them into Plaid_Transactions, reconcile pending
+        transactions, update the spend aggregates and store the item's new cursor, all in one
+        database transaction.
+
+        Parameters:
+        engine (sqlalchemy.engine.base.Engine): Database to write to.
+        access_token (str): Item whose LastCursor is updated.
+        cursor (str): Cursor to store. None leaves LastCursor unchanged (e.g. for replays).
+
+        Returns:
+        dict: Rows committed per kind, and pending transactions opened, posted and canceled.
+        """
+        with engine.begin() as connection:
+            self.stage(connection)
+            merge_staged_transactions(connection)
+            pending = self.reconciler.commit(connection)
+            store_accounts(connection, self.user_id, list(self.accounts.values()))
+            upserts, removed_ids = self.latest_changes()
+            update_spend_aggregates(connection, self.user_id, upserts, removed_ids)
+            if cursor is not None:
+                store_cursor(connection, access_token, cursor)
+        invalidate_user(self.user_id)
+        self._mirror()
+        return {**self.rows, **pending}
+
+    def latest_changes(self):
+        """
+        The buffered deltas reduced like merge_staged_transactions does: the latest version of each
+        added/modified transaction (AGGREGATE_COLUMNS only) and the set of removed transaction_ids.
+        """
+        removed_ids = set()
+        for frame in self.frames('removed'):
+            removed_ids.update(frame['transaction_id'].dropna())
+
+        changes = [frame[AGGREGATE_COLUMNS + [SYNC_PAGE_COLUMN]].assign(change_rank=rank)
+                   for rank, kind in enumerate(('added', 'modified')) for frame in self.frames(kind)]
+        if not changes:
+            return None, removed_ids
+        upserts = (pd.concat(changes, ignore_index=True)
+                   .sort_values([SYNC_PAGE_COLUMN, 'change_rank'], kind='stable')
+                   .drop_duplicates('transaction_id', keep='last'))
+        upserts = upserts[~upserts['transaction_id'].isin(removed_ids)]
+        return upserts.drop(columns=[SYNC_PAGE_COLUMN, 'change_rank']), removed_ids
+
+    def _mirror(self):
+        # The database is the source of truth: a failed mirror update is reported and can be
+        # repaired with AnalyticsMirror.py rebuild, but does not fail the committed sync
+        mirror = get_mirror()
+        if mirror is None:
+            return
+        try:
+            mirror.apply(self.user_id, {kind: self.frames(kind) for kind in STAGING_TABLES})
+        except Exception as e:
+            print(f"Error updating analytics mirror for user {self.user_id}: {e}")
+
+    def close(self):
+        if self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+        self._frames = {kind: [] for kind in STAGING_TABLES}
+        self.memory_bytes = 0
+
+
+def store_cursor(connection, access_token, cursor):
+    """
+    Store an item's new LastCursor inside the caller's transaction.
+
+    On SQL Server this is the same temp_cursor_data + SP_Update_Plaid_User_Items_LastCursor
+    hand-off as before, run on the sync's connection so it commits or rolls back with the
+    merged transactions. Other databases (local development) have no stored procedures and
+    update Plaid_User_Items directly.
+    """
+    if connection.dialect.name == 'mssql':
+        cursor_df = pd.DataFrame({'LastCursor': [cursor], 'access_token': [access_token]})
+        dbf.bulk_load_dataframe(cursor_df, CURSOR_STAGING_TABLE, connection)
+        connection.execute(text(f"EXEC {CURSOR_PROCEDURE}"))
+    else:
+        connection.execute(
+            text("UPDATE Plaid_User_Items SET LastCursor = :cursor WHERE access_token = :access_token"),
+            {'cursor': cursor, 'access_token': access_token},
+        )
+
+
+def _ensure_transactions_table(connection, quote):
+    if inspect(connection).has_table(TRANSACTIONS_TABLE):
+        return
+    if connection.dialect.name == 'mssql':
+        source = quote(STAGING_TABLES['added'])
+        target = quote(TRANSACTIONS_TABLE)
+        connection.execute(text(f"SELECT TOP 0 * INTO {target} FROM {source}"))
+        connection.execute(text(f"ALTER TABLE {target} DROP COLUMN {quote(SYNC_PAGE_COLUMN)}"))
+    else:
+        # CREATE TABLE AS loses the declared column types on SQLite; copy them from the staging table
+        staged = Table(STAGING_TABLES['added'], MetaData(), autoload_with=connection)
+        Table(TRANSACTIONS_TABLE, MetaData(),
+              *[Column(column.name, column.type) for column in staged.columns if column.name != SYNC_PAGE_COLUMN]
+              ).create(connection)
+    ensure_transactions_indexes(connection)
+
+
+def ensure_transactions_indexes(connection):
+    """Create any of TRANSACTIONS_INDEXES that Plaid_Transactions does not have yet"""
+    quote = connection.dialect.identifier_preparer.quote
+    existing = {index['name'] for index in inspect(connection).get_indexes(TRANSACTIONS_TABLE)}
+    for name, columns in TRANSACTIONS_INDEXES.items():
+        if name not in existing:
+            connection.execute(text(f"CREATE INDEX {quote(name)} ON {quote(TRANSACTIONS_TABLE)} "
+                                    f"({', '.join(quote(column) for column in columns)})"))
+
+
+def merge_staged_transactions(connection):
+    """
+    Apply the staged deltas to Plaid_Transactions with set-based statements.
+
+    The latest staged version of each added/modified transaction is upserted (a MERGE on
+    SQL Server, delete + insert elsewhere) and removed transactions are deleted.
+    """
+    quote = connection.dialect.identifier_preparer.quote
+    _ensure_transactions_table(connection, quote)
+
+    staged_columns = {column['name'] for column in inspect(connection).get_columns(STAGING_TABLES['added'])}
+    columns = [column['name'] for column in inspect(connection).get_columns(TRANSACTIONS_TABLE)
+               if column['name'] in staged_columns]
+    column_list = ', '.join(quote(column) for column in columns)
+    added, modified, removed = (quote(STAGING_TABLES[kind]) for kind in ('added', 'modified', 'removed'))
+    target = quote(TRANSACTIONS_TABLE)
+    transaction_id = quote('transaction_id')
+    sync_page = quote(SYNC_PAGE_COLUMN)
+
+    # One row per transaction: the one from the latest page, modified winning over added
+    latest = f"""
+        SELECT {column_list} FROM (
+            SELECT {column_list}, ROW_NUMBER() OVER (
+                PARTITION BY {transaction_id} ORDER BY {sync_page} DESC, change_rank DESC) AS version_rank
+            FROM (
+                SELECT {column_list}, {sync_page}, 0 AS change_rank FROM {added}
+                UNION ALL
+                SELECT {column_list}, {sync_page}, 1 AS change_rank FROM {modified}
+            ) AS changes
+        ) AS versions
+        WHERE version_rank = 1 AND NOT EXISTS (
+            -- Not NOT IN: one NULL id among the removed rows would make it filter out every row
+            SELECT 1 FROM {removed} AS removed_rows WHERE removed_rows.{transaction_id} = versions.{transaction_id})"""
+
+    if connection.dialect.name == 'mssql':
+        updates = ', '.join(f"target.{quote(column)} = source.{quote(column)}" for column in columns)
+        values = ', '.join(f"source.{quote(column)}" for column in columns)
+        connection.execute(text(f"""
+            MERGE {target} WITH (HOLDLOCK) AS target
+            USING ({latest}) AS source
+            ON target.{transaction_id} = source.{transaction_id}
+            WHEN MATCHED THEN UPDATE SET {updates}
+            WHEN NOT MATCHED THEN INSERT ({column_list}) VALUES ({values});"""))
+    else:
+        connection.execute(text(f"""
+            DELETE FROM {target} WHERE {transaction_id} IN (
+                SELECT {transaction_id} FROM {added} UNION SELECT {transaction_id} FROM {modified})"""))
+        connection.execute(text(f"INSERT INTO {target} ({column_list}) {latest}"))
+
+    connection.execute(text(f"DELETE FROM {target} WHERE {transaction_id} IN (SELECT {transaction_id} FROM {removed})"))
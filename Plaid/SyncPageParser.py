@@ -0,0 +1,76 @@
+# SyncPageParser.py
+
+try:
+    import ijson
+except ImportError:  # streaming is optional; without ijson TransactionsSync uses response.json()
+    ijson = None
+
+DELTA_ARRAYS = ('added', 'modified', 'removed')
+_ITEM_PREFIXES = {f"{kind}.item": kind for kind in DELTA_ARRAYS}
+# The accounts of the item: a handful of small objects, returned whole
+_ITEM_PREFIXES['accounts.item'] = 'accounts'
+_SCALAR_EVENTS = {'string', 'number', 'boolean', 'null'}
+
+
+def streaming_available():
+    return ijson is not None
+
+
+class TeeReader:
+    """File-like wrapper that copies every chunk read from a stream into a sink"""
+
+    def __init__(self, stream, sink):
+        self.stream = stream
+        self.sink = sink
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        if data:
+            self.sink.write(data)
+        return data
+
+
+def iter_sync_page(stream, batch_size=500):
+    """
+    Parse a /transactions/sync response body incrementally.
+
+    Only one batch of transactions is held at a time, so memory stays flat however large the
+    page is. Objects inside top-level arrays other than the deltas and accounts are skipped.
+
+    Parameters:
+    stream: Binary file-like object with the JSON body (e.g. requests' response.raw).
+    batch_size (int): Transactions per yielded batch.
+
+    Yields:
+    tuple: ('added' | 'modified' | 'removed', list of transaction dicts) batches in body order,
+           then ('accounts', list of account dicts) if the page lists any, then ('meta', dict)
+           with the top-level scalars (next_cursor, has_more, request_id, or
+           error_code/error_message for an error response).
+    """
+    batches = {kind: [] for kind in (*DELTA_ARRAYS, 'accounts')}
+    meta = {}
+    builder = None
+    current = None
+
+    for prefix, event, value in ijson.parse(stream, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if event == 'end_map' and prefix == f"{current}.item":
+                batches[current].append(builder.value)
+                builder = None
+                if current != 'accounts' and len(batches[current]) >= batch_size:
+                    yield current, batches[current]
+                    batches[current] = []
+            continue
+
+        if event == 'start_map' and prefix in _ITEM_PREFIXES:
+            current = _ITEM_PREFIXES[prefix]
+            builder = ijson.ObjectBuilder()
+            builder.event(event, value)
+        elif event in _SCALAR_EVENTS and prefix and '.' not in prefix:
+            meta[prefix] = value
+
+    for kind, batch in batches.items():
+        if batch:
+            yield kind, batch
+    yield 'meta', meta
@@ -0,0 +1,117 @@
+# TransactionNormalizer.py
+
+import numpy as np
+import pandas as pd
+
+from Categorizer import get_categorizer
+
+# Output column -> dtype for added/modified transactions. The first ten columns keep the
+# original test_transactions_* layout; the rest expose more of the Plaid payload.
+TRANSACTION_SCHEMA = {
+    'transaction_id': 'object',
+    'userID': 'object',
+    'account_id': 'object',
+    'personal_finance_category': 'category',
+    'date': 'datetime64[ns]',
+    'authorized_date': 'datetime64[ns]',
+    'merchant_name': 'object',
+    'amount': 'float64',
+    'iso_currency_code': 'category',
+    'pending_transaction_id': 'object',
+    'pending': 'boolean',
+    'payment_channel': 'category',
+    'personal_finance_category_detailed': 'object',
+    'merchant_entity_id': 'object',
+    'location_city': 'object',
+    'location_region': 'object',
+    'location_postal_code': 'object',
+    'location_country': 'object',
+    'counterparty_name': 'object',
+    'counterparty_type': 'object',
+}
+
+REMOVED_SCHEMA = {
+    'transaction_id': 'object',
+    'userID': 'object',
+    'account_id': 'object',
+}
+
+# Top-level Plaid fields copied as-is
+_TOP_LEVEL_FIELDS = ['transaction_id', 'account_id', 'date', 'authorized_date', 'merchant_name', 'amount',
+                     'iso_currency_code', 'pending_transaction_id', 'pending', 'payment_channel',
+                     'merchant_entity_id']
+
+# Nested Plaid object -> [(field, output column)]
+_NESTED_FIELDS = {
+    'personal_finance_category': [('primary', 'personal_finance_category'),
+                                  ('detailed', 'personal_finance_category_detailed')],
+    'location': [('city', 'location_city'), ('region', 'location_region'),
+                 ('postal_code', 'location_postal_code'), ('country', 'location_country')],
+}
+
+_EMPTY = {}
+_NO_COUNTERPARTIES = (_EMPTY,)
+
+
+def _typed_column(values, dtype):
+    # Build each column directly in its final dtype instead of letting pandas infer and then casting
+    if dtype.startswith('datetime64'):
+        try:
+            # Plaid dates are ISO YYYY-MM-DD, which numpy parses natively (None becomes NaT)
+            return np.array(values, dtype='datetime64[D]').astype(dtype)
+        except ValueError:
+            return pd.to_datetime(values, format='%Y-%m-%d', errors='coerce')
+    if dtype == 'category':
+        return pd.Categorical(values)
+    if dtype == 'boolean':
+        return pd.array(values, dtype='boolean')
+    return np.array(values, dtype=dtype)
+
+
+def _apply_schema(columns, schema):
+    return pd.DataFrame({column: _typed_column(columns[column], dtype) for column, dtype in schema.items()},
+                        copy=False)
+
+
+def normalize_transactions(transactions, user_id):
+    """
+    Flatten a page of Plaid added/modified transactions into a typed DataFrame.
+
+    Each output column is built with a single comprehension over the page, which is much
+    cheaper than assembling a dict per transaction (or pd.json_normalize, which flattens
+    every nested field). Dates come back as datetime64, amounts as float64 and the
+    category, currency and payment channel as categoricals. With CATEGORY_RULES_FILE set,
+    personal_finance_category is then rewritten by the user's rules (see Categorizer).
+
+    Parameters:
+    transactions (list): Transaction objects from a /transactions/sync 'added' or 'modified' array.
+    user_id (str): Value for the userID column.
+
+    Returns:
+    pd.DataFrame: One row per transaction with the columns of TRANSACTION_SCHEMA.
+    """
+    columns = {field: [transaction.get(field) for transaction in transactions] for field in _TOP_LEVEL_FIELDS}
+    columns['userID'] = [user_id] * len(transactions)
+
+    for parent, fields in _NESTED_FIELDS.items():
+        objects = [transaction.get(parent) or _EMPTY for transaction in transactions]
+        for field, column in fields:
+            columns[column] = [obj.get(field) for obj in objects]
+
+    counterparties = [(transaction.get('counterparties') or _NO_COUNTERPARTIES)[0] for transaction in transactions]
+    columns['counterparty_name'] = [counterparty.get('name') for counterparty in counterparties]
+    columns['counterparty_type'] = [counterparty.get('type') for counterparty in counterparties]
+
+    df = _apply_schema(columns, TRANSACTION_SCHEMA)
+    categorizer = get_categorizer()
+    return df if categorizer is None else categorizer.apply(df)
+
+
+def normalize_removed(removed, user_id):
+    """Flatten a page of Plaid removed transactions into a DataFrame with the columns of REMOVED_SCHEMA"""
+    columns = {
+        'transaction_id': [transaction.get('transaction_id') for transaction in removed],
+        'userID': [user_id] * len(removed),
+        'account_id': [transaction.get('account_id') for transaction in removed],
+    }
+    return _apply_schema(columns, REMOVED_SCHEMA)
@@ -0,0 +1,136 @@
+# TransactionQueries.py
+
+import base64
+import json
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import MetaData, Table, and_, inspect, or_, select
+
+from QueryCache import query_cache
+from SyncBuffer import TRANSACTIONS_TABLE, ensure_transactions_indexes
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# Filters accepted by query_transactions, in cache-key order
+FILTERS = ('account_id', 'start_date', 'end_date', 'category', 'merchant')
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def _transactions_table(engine):
+    """Reflect Plaid_Transactions once per engine, making sure the read indexes exist"""
+    with _tables_lock:
+        table = _tables.get(engine)
+        if table is None:
+            with engine.begin() as connection:
+                if not inspect(connection).has_table(TRANSACTIONS_TABLE):
+                    return None
+                ensure_transactions_indexes(connection)
+                table = Table(TRANSACTIONS_TABLE, MetaData(), autoload_with=connection)
+            _tables[engine] = table
+        return table
+
+
+def encode_cursor(row):
+    """Opaque keyset cursor pointing just after row in (date, transaction_id) descending order"""
+    data = json.dumps([_json_value(row['date']), row['transaction_id']]).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        row_date, transaction_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return _parse_date(row_date), transaction_id
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def _parse_date(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    return datetime.fromisoformat(value)
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def query_transactions(engine, user_id, account_id=None, start_date=None, end_date=None, category=None,
+                       merchant=None, limit=DEFAULT_PAGE_SIZE, cursor=None, use_cache=True):
+    """
+    Read one page of a user's synced transactions, newest first.
+
+    Filters are bound parameters on Plaid_Transactions and the page is found by keyset
+    (date, transaction_id) instead of OFFSET, so every page is an index range scan on
+    (userID, date, transaction_id) however deep the client pages. Results are cached per
+    user until the next sync commit for that user.
+
+    Parameters:
+    engine (sqlalchemy.engine.base.Engine): Database to read.
+    user_id (str): Owner of the transactions.
+    account_id (str): Only this account.
+    start_date, end_date (str or date): Inclusive date range (YYYY-MM-DD).
+    category (str): personal_finance_category (primary) to match exactly.
+    merchant (str): Merchant name prefix.
+    limit (int): Rows per page, at most MAX_PAGE_SIZE.
+    cursor (str): next_cursor from the previous page.
+
+    Returns:
+    dict: {'transactions': [...], 'next_cursor': str or None, 'cached': bool}
+    """
+    limit = max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+    filters = {'account_id': account_id, 'start_date': start_date, 'end_date': end_date,
+               'category': category, 'merchant': merchant}
+    cache_key = (tuple(filters[name] for name in FILTERS), limit, cursor)
+    if use_cache:
+        cached = query_cache.get(user_id, cache_key)
+        if cached is not None:
+            return {**cached, 'cached': True}
+        generation = query_cache.generation(user_id)
+
+    table = _transactions_table(engine)
+    if table is None:
+        return {'transactions': [], 'next_cursor': None, 'cached': False}
+    columns = table.c
+
+    conditions = [columns.userID == user_id]
+    if account_id:
+        conditions.append(columns.account_id == account_id)
+    if start_date:
+        conditions.append(columns.date >= _parse_date(start_date))
+    if end_date:
+        conditions.append(columns.date <= _parse_date(end_date))
+    if category:
+        conditions.append(columns.personal_finance_category == category)
+    if merchant:
+        conditions.append(columns.merchant_name.startswith(merchant, autoescape=True))
+    if cursor:
+        after_date, after_id = decode_cursor(cursor)
+        conditions.append(or_(columns.date < after_date,
+                              and_(columns.date == after_date, columns.transaction_id < after_id)))
+
+    # One extra row tells whether there is a next page
+    statement = (select(table).where(*conditions)
+                 .order_by(columns.date.desc(), columns.transaction_id.desc())
+                 .limit(limit + 1))
+    with engine.connect() as connection:
+        rows = [dict(row._mapping) for row in connection.execute(statement)]
+
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    page = {
+        'transactions': [{key: _json_value(value) for key, value in row.items()} for row in rows[:limit]],
+        'next_cursor': next_cursor,
+    }
+    if use_cache:
+        query_cache.put(user_id, cache_key, page, generation)
+    return {**page, 'cached': False}
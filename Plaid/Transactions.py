@@ -1,182 +1,207 @@
-import requests
-import json
-import pandas as pd
 import DatabaseFunctions as dbf
-from Configuration import PLAID_CLIENT_ID, PLAID_SECRET_KEY, PLAID_ENV, PLAID_WEBHOOK
-import os
-from datetime import datetime
+from Configuration import (PLAID_SYNC_MAX_WORKERS, PLAID_MAX_REQUESTS_PER_SECOND, PLAID_STREAM_SYNC,
+                           PLAID_STREAM_BATCH_SIZE)
+from DataAccess import get_user_items
+from PlaidClient import get_client
+from TransactionNormalizer import normalize_transactions, normalize_removed
+from SyncBuffer import SyncBuffer
+from SyncPageParser import TeeReader, iter_sync_page, streaming_available
+from ResponseArchive import get_archive, item_key
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RateLimiter:
+    """Token bucket shared by every sync worker so parallel items stay under Plaid's request rate"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+plaid_rate_limiter = RateLimiter(PLAID_MAX_REQUESTS_PER_SECOND)
+
+# Held while an item commits, so only one item writes at a time while the others keep paging through Plaid
+_db_write_lock = threading.Lock()
+
+
+def _stream_page(response, record, buffer, user_id, page):
+    """Parse one streamed sync page into the buffer in batches, copying the raw body into an archive record"""
+    response.raw.decode_content = True
+    page_counts = {}
+    response_data = {}
+    try:
+        for kind, batch in iter_sync_page(TeeReader(response.raw, record), PLAID_STREAM_BATCH_SIZE):
+            if kind == 'meta':
+                response_data = batch
+                continue
+            if kind == 'accounts':
+                buffer.add_accounts(batch)
+                continue
+            normalize = normalize_removed if kind == 'removed' else normalize_transactions
+            buffer.append(kind, normalize(batch, user_id), page)
+            page_counts[kind] = page_counts.get(kind, 0) + len(batch)
+    finally:
+        response.close()
+    return response_data, page_counts
+
+
+def sync_item(user_id, item, db_connection, stream=None, progress=None):
+    """
+    Drain the /transactions/sync cursor for one item, page by page in cursor order, then
+    write every page's added/modified/removed rows and the final cursor in one transaction.
+
+    With stream (default: PLAID_STREAM_SYNC when ijson is installed) each page is parsed
+    incrementally from the response body instead of being loaded whole with response.json().
+    item is a DataAccess.PlaidItem. progress, if given, is told about every page (see JobQueue.Job).
+    """
+    if stream is None:
+        stream = PLAID_STREAM_SYNC and streaming_available()
+    plaid_client = get_client()
+    archive = get_archive()
+    summary = {'item_id': item.item_id, 'pages': 0, 'added': 0, 'modified': 0, 'removed': 0}
+
+    access_token = item.access_token
+    archive_key = item_key(item.item_id, access_token)
+    lastCursor = item.last_cursor
+
+    buffer = SyncBuffer(user_id)
+    try:
+        has_more = True
+        while has_more:
+            plaid_rate_limiter.acquire()
+            response = plaid_client.post('/transactions/sync', {
+                "access_token": access_token,
+                "cursor": lastCursor,
+                "count": 500
+            }, stream=stream)
+            print('printing response for access token:', access_token)
+
+            page = summary['pages'] + 1
+            record = archive.record(user_id, archive_key, cursor=lastCursor)
+
+            if stream:
+                # Rows go straight from the socket into the buffer; the body is archived as received
+                response_data, page_counts = _stream_page(response, record, buffer, user_id, page)
+            else:
+                response_data = response.json()
+                record.write(response.content)
+
+                page_counts = {}
+                if 'next_cursor' in response_data:
+                    buffer.add_accounts(response_data.get('accounts', []))
+                    for kind in ('added', 'modified', 'removed'):
+                        normalize = normalize_removed if kind == 'removed' else normalize_transactions
+                        buffer.append(kind, normalize(response_data.get(kind, []), user_id), page)
+                        page_counts[kind] = len(response_data.get(kind, []))
+
+            entry = record.commit(response_data)
+            print(f"Raw JSON response archived to {entry['segment']} at offset {entry['offset']} ({entry['length']} bytes)")
+
+            # Check for errors in the response
+            if 'error' in response_data or 'error_code' in response_data:
+                print(f"Error in Plaid API response: {response_data.get('error') or response_data.get('error_code')}")
+                break
+
+            # Check if required keys exist
+            if 'next_cursor' not in response_data or 'has_more' not in response_data:
+                print("Error: Missing required keys in response")
+                break
+
+            # Update lastCursor and has_more for the next iteration
+            lastCursor = response_data['next_cursor']
+            has_more = response_data['has_more']
+
+            summary['pages'] = page
+            if progress is not None:
+                progress.page(summary['item_id'], page_counts)
+            print(f"Page {page}: {page_counts.get('added', 0)} added, {page_counts.get('modified', 0)} modified, "
+                  f"{page_counts.get('removed', 0)} removed")
+
+        if has_more:
+            # Pagination stopped early; keep the stored cursor so the next sync starts this item over
+            print(f"Sync for item {summary['item_id']} did not finish; nothing was written")
+            summary['error'] = 'sync did not finish'
+            return summary
+
+        # The test_transactions_* staging tables are shared, so commits go one item at a time
+        with _db_write_lock:
+            summary.update(buffer.commit(db_connection, access_token, lastCursor))
+        print(f"Committed {summary['pages']} pages for item {summary['item_id']}: {summary['added']} added, "
+              f"{summary['modified']} modified, {summary['removed']} removed; pending: {summary['pending_posted']} posted, "
+              f"{summary['pending_canceled']} canceled, {summary['pending_opened']} open")
+        return summary
+    finally:
+        buffer.close()
+
+
+def _sync_item_isolated(user_id, item, db_connection, progress=None):
+    # One failing item must not abort the others
+    try:
+        summary = sync_item(user_id, item, db_connection, progress=progress)
+    except Exception as e:
+        print(f"Error syncing item {item.item_id} for user {user_id}: {e}")
+        summary = {'item_id': item.item_id, 'error': str(e)}
+    if progress is not None:
+        progress.item_done(summary)
+    return summary
 
 
-def TransactionsSync(user_id='user123'):
-    """Sync transactions for a specific user"""
-    url = f"https://{PLAID_ENV}.plaid.com/transactions/sync"
-    
+def TransactionsSync(user_id='user123', max_workers=PLAID_SYNC_MAX_WORKERS, item_ids=None, progress=None):
+    """
+    Sync transactions for a specific user, up to max_workers items in parallel.
+
+    item_ids limits the sync to those items (e.g. the ones a webhook reported). With item_ids,
+    user_id may be None to find the items across all users; each item then syncs as its own user.
+    progress receives the item count, every page and every finished item (see JobQueue.Job).
+    """
     try:
         db_connection = dbf.connect_to_database()
-        db_items = dbf.read_table_data(db_connection, 'Plaid_User_Items')
-        db_items = db_items[db_items['Userid'] == user_id]
+        # Only the requested user's (or items') rows are read, using the Userid / item_id indexes
+        db_items = get_user_items(db_connection, user_id, item_ids)
         print(db_items)
 
-        if db_items.empty:
-            print(f"No items found for user {user_id}")
+        if not db_items:
+            print(f"No items found for user {user_id}" + (f" and items {list(item_ids)}" if item_ids is not None else ""))
+            if progress is not None:
+                progress.items(0)
             return
 
-        for index, item in db_items.iterrows():
-            access_token = item['access_token']
-            
-            lastCursor = item.get('LastCursor', None)
-
-            has_more = True
-            while has_more:
-                payload = json.dumps({
-                    "client_id":  PLAID_CLIENT_ID,
-                    "secret": PLAID_SECRET_KEY,
-                    "access_token": access_token,
-                    "cursor": lastCursor,
-                    "count": 500
-                })
-                headers = {
-                    'Content-Type': 'application/json'
-                }
-
-                response = requests.request("POST", url, headers=headers, data=payload)
-                print('printing response for access token:', access_token)
-                response_data = response.json()
-
-                # Check for errors in the response
-                if 'error' in response_data:
-                    print(f"Error in Plaid API response: {response_data['error']}")
-                    break
-
-                # Create a directory for storing JSON responses if it doesn't exist
-                json_dir = "plaid_responses"
-                os.makedirs(json_dir, exist_ok=True)
-                
-                # Generate a filename with timestamp
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"{json_dir}/transaction_sync_{user_id}_{timestamp}.json"
-                
-                # Save the raw JSON response to a file
-                with open(filename, "w") as f:
-                    json.dump(response_data, f, indent=4)
-                
-                print(f"Raw JSON response saved to {filename}")
-
-                # Check if required keys exist
-                if 'next_cursor' not in response_data or 'has_more' not in response_data:
-                    print("Error: Missing required keys in response")
-                    break
-
-                # Update lastCursor and has_more for the next iteration
-                lastCursor = response_data['next_cursor']
-                has_more = response_data['has_more']
-
-                cursor_data = {
-                    'LastCursor': [lastCursor],
-                    'access_token': [access_token]
-                }
-                cursor_df = pd.DataFrame(cursor_data)
-
-                try:
-                    dbf.insert_dataframe_to_sql(cursor_df, 'temp_cursor_data', db_connection)
-                    dbf.run_stored_procedure(db_connection, 'SP_Update_Plaid_User_Items_LastCursor')
-                except Exception as e:
-                    print(f"Database error updating cursor: {e}")
-
-                # Process added transactions
-                if 'added' in response_data:
-                    added_transactions = []
-                    for transaction in response_data['added']:
-                        # Extract just the primary category if personal_finance_category exists
-                        personal_finance_category = None
-                        if transaction.get('personal_finance_category') and 'primary' in transaction.get('personal_finance_category'):
-                            personal_finance_category = transaction.get('personal_finance_category')['primary']
-                        
-                        added_transactions.append({
-                            'transaction_id': transaction['transaction_id'],
-                            'userID': user_id,
-                            'account_id': transaction['account_id'],
-                            'personal_finance_category': personal_finance_category,
-                            'date': transaction['date'],
-                            'authorized_date': transaction.get('authorized_date'),
-                            'merchant_name': transaction.get('merchant_name'),
-                            'amount': transaction['amount'],
-                            'iso_currency_code': transaction['iso_currency_code'],
-                            'pending_transaction_id': transaction.get('pending_transaction_id')
-                        })
-
-                    # Create DataFrame for added transactions
-                    if added_transactions:
-                        added_df = pd.DataFrame(added_transactions)
-                        print("Added Transactions:")
-                        print(added_df.head())
-                        try:
-                            dbf.insert_dataframe_to_sql(added_df, 'test_transactions_added', db_connection)
-                        except Exception as e:
-                            print(f"Database error inserting added transactions: {e}")
-                    else:
-                        print("No added transactions")
-
-                # Process modified transactions
-                if 'modified' in response_data:
-                    modified_transactions = []
-                    for transaction in response_data['modified']:
-                        # Extract just the primary category if personal_finance_category exists
-                        personal_finance_category = None
-                        if transaction.get('personal_finance_category') and 'primary' in transaction.get('personal_finance_category'):
-                            personal_finance_category = transaction.get('personal_finance_category')['primary']
-                        
-                        modified_transactions.append({
-                            'transaction_id': transaction['transaction_id'],
-                            'userID': user_id,
-                            'account_id': transaction['account_id'],
-                            'personal_finance_category': personal_finance_category,
-                            'date': transaction['date'],
-                            'authorized_date': transaction.get('authorized_date'),
-                            'merchant_name': transaction.get('merchant_name'),
-                            'amount': transaction['amount'],
-                            'iso_currency_code': transaction['iso_currency_code'],
-                            'pending_transaction_id': transaction.get('pending_transaction_id')
-                        })
-
-                    # Create DataFrame for modified transactions
-                    if modified_transactions:
-                        modified_df = pd.DataFrame(modified_transactions)
-                        print("\nModified Transactions:")
-                        print(modified_df.head())
-                        try:
-                            dbf.insert_dataframe_to_sql(modified_df, 'test_transactions_modified', db_connection)
-                        except Exception as e:
-                            print(f"Database error inserting modified transactions: {e}")
-                    else:
-                        print("No modified transactions")
-
-                # Process removed transactions
-                if 'removed' in response_data:
-                    removed_transactions = []
-                    for transaction in response_data['removed']:
-                        removed_transactions.append({
-                            'transaction_id': transaction['transaction_id'],
-                            'userID': user_id,
-                            'account_id': transaction['account_id']
-                        })
-
-                    # Create DataFrame for removed transactions
-                    if removed_transactions:
-                        removed_df = pd.DataFrame(removed_transactions)
-                        print("\nRemoved Transactions:")
-                        print(removed_df.head())
-                        try:
-                            dbf.insert_dataframe_to_sql(removed_df, 'test_transactions_removed', db_connection)
-                        except Exception as e:
-                            print(f"Database error inserting removed transactions: {e}")
-                    else:
-                        print("No removed transactions")
+        items = [(user_id if user_id is not None else item.user_id, item) for item in db_items]
+        if progress is not None:
+            progress.items(len(items))
+        if max_workers <= 1 or len(items) == 1:
+            results = [_sync_item_isolated(item_user_id, item, db_connection, progress) for item_user_id, item in items]
+        else:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(items)), thread_name_prefix='plaid-sync') as executor:
+                results = list(executor.map(lambda pair: _sync_item_isolated(pair[0], pair[1], db_connection, progress),
+                                            items))
+
+        failed = [result for result in results if 'error' in result]
+        print(f"Synced {len(results) - len(failed)} of {len(results)} items for user {user_id or 'any'}")
+        return results
     except Exception as e:
         print(f"Error in TransactionsSync: {e}")
+        if progress is not None:
+            progress.fail(str(e))
 
 
 # Only run this code if the file is executed directly
 if __name__ == "__main__":
     TransactionsSync()
-
@@ -0,0 +1,218 @@
+# Webhooks.py
+
+import hashlib
+import hmac
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import jwt
+except ImportError:  # PyJWT[crypto] is only needed while PLAID_WEBHOOK_VERIFY is on
+    jwt = None
+
+from Configuration import (PLAID_WEBHOOK_MAX_AGE_SECONDS, PLAID_WEBHOOK_COALESCE_SECONDS,
+                           PLAID_SYNC_MAX_WORKERS)
+from PlaidClient import get_client
+from Transactions import TransactionsSync
+
+# TRANSACTIONS webhook codes meaning /transactions/sync has new data for the item.
+# SYNC_UPDATES_AVAILABLE is the current one; the others are still sent to older integrations.
+SYNC_WEBHOOK_CODES = {'SYNC_UPDATES_AVAILABLE', 'DEFAULT_UPDATE', 'INITIAL_UPDATE', 'HISTORICAL_UPDATE',
+                      'TRANSACTIONS_REMOVED'}
+
+# Verification keys are re-fetched after this long, so a rotated (expired) key stops being accepted
+KEY_CACHE_SECONDS = 3600
+
+
+class WebhookVerificationError(Exception):
+    pass
+
+
+class WebhookVerifier:
+    """
+    Checks the Plaid-Verification header of an incoming webhook.
+
+    The header is an ES256 JWT signed with a key fetched from /webhook_verification_key/get
+    (cached by key id). It must be recent and carry the SHA-256 of the exact request body.
+    """
+
+    def __init__(self, client=None, max_age_seconds=PLAID_WEBHOOK_MAX_AGE_SECONDS):
+        self.client = client
+        self.max_age_seconds = max_age_seconds
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def _key(self, key_id):
+        with self._lock:
+            cached = self._keys.get(key_id)
+            if cached is not None and time.monotonic() - cached[1] < KEY_CACHE_SECONDS:
+                return cached[0]
+
+        response_data = (self.client or get_client()).post_json('/webhook_verification_key/get', {'key_id': key_id})
+        key = response_data.get('key')
+        if not key:
+            raise WebhookVerificationError(f"Could not fetch verification key {key_id}: "
+                                           f"{response_data.get('error_code', 'no key in response')}")
+        if key.get('expired_at') is not None:
+            raise WebhookVerificationError(f"Verification key {key_id} has expired")
+        public_key = jwt.PyJWK(key, algorithm='ES256').key
+        with self._lock:
+            self._keys[key_id] = (public_key, time.monotonic())
+        return public_key
+
+    def verify(self, body, token):
+        """
+        Verify a webhook body against its Plaid-Verification token.
+
+        Returns:
+        dict: The token's claims. Raises WebhookVerificationError when anything does not check out.
+        """
+        if jwt is None:
+            raise WebhookVerificationError("PLAID_WEBHOOK_VERIFY is on but PyJWT[crypto] is not installed")
+        if not token:
+            raise WebhookVerificationError("Missing Plaid-Verification header")
+        try:
+            header = jwt.get_unverified_header(token)
+            if header.get('alg') != 'ES256':
+                raise WebhookVerificationError(f"Unexpected signing algorithm {header.get('alg')}")
+            claims = jwt.decode(token, self._key(header.get('kid')), algorithms=['ES256'])
+        except jwt.PyJWTError as e:
+            raise WebhookVerificationError(f"Invalid Plaid-Verification token: {e}")
+
+        if time.time() - claims.get('iat', 0) > self.max_age_seconds:
+            raise WebhookVerificationError("Webhook is too old")
+        if not hmac.compare_digest(hashlib.sha256(body).hexdigest(), claims.get('request_body_sha256', '')):
+            raise WebhookVerificationError("Webhook body does not match its signature")
+        return claims
+
+
+class SyncScheduler:
+    """
+    Runs the item syncs requested by webhooks, coalescing repeated requests per item.
+
+    The first event for an item schedules a sync window_seconds later, and further events for
+    that item before it starts are folded into it. An event arriving while the item is syncing
+    schedules one follow-up sync, because the running sync may already be past the new data.
+    Items that come due together are synced in one TransactionsSync call.
+    """
+
+    def __init__(self, sync_items=None, window_seconds=PLAID_WEBHOOK_COALESCE_SECONDS, max_batches=2):
+        self.sync_items = sync_items or (lambda item_ids: TransactionsSync(None, PLAID_SYNC_MAX_WORKERS, item_ids))
+        self.window_seconds = window_seconds
+        self.stats = {'events': 0, 'coalesced': 0, 'syncs': 0, 'items_synced': 0}
+        self._due = {}
+        self._running = set()
+        self._rerun = set()
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_batches, thread_name_prefix='webhook-sync')
+        self._thread = None
+
+    def request(self, item_id):
+        """
+        Ask for a sync of one item.
+
+        Returns:
+        str: 'scheduled', 'coalesced' (folded into a pending sync) or 'after-running' (queued
+             behind the item's running sync).
+        """
+        with self._condition:
+            self.stats['events'] += 1
+            if item_id in self._due or item_id in self._rerun:
+                self.stats['coalesced'] += 1
+                return 'coalesced'
+            if item_id in self._running:
+                self._rerun.add(item_id)
+                return 'after-running'
+            self._due[item_id] = time.monotonic() + self.window_seconds
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._dispatch, name='webhook-scheduler', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+            return 'scheduled'
+
+    def _dispatch(self):
+        while True:
+            with self._condition:
+                while True:
+                    now = time.monotonic()
+                    ready = [item_id for item_id, due in self._due.items() if due <= now]
+                    if ready:
+                        break
+                    self._condition.wait(min(self._due.values()) - now if self._due else None)
+                for item_id in ready:
+                    del self._due[item_id]
+                    self._running.add(item_id)
+            self._executor.submit(self._run, ready)
+
+    def _run(self, item_ids):
+        try:
+            print(f"Webhook sync for items {item_ids}")
+            self.sync_items(item_ids)
+        except Exception as e:
+            print(f"Error in webhook sync for items {item_ids}: {e}")
+        finally:
+            with self._condition:
+                self.stats['syncs'] += 1
+                self.stats['items_synced'] += len(item_ids)
+                for item_id in item_ids:
+                    self._running.discard(item_id)
+                    if item_id in self._rerun:
+                        self._rerun.discard(item_id)
+                        self._due[item_id] = time.monotonic() + self.window_seconds
+                self._condition.notify()
+
+    def pending(self):
+        with self._condition:
+            return {'due': sorted(self._due), 'running': sorted(self._running), 'rerun': sorted(self._rerun)}
+
+
+def handle_webhook(payload, scheduler=None):
+    """
+    Act on a parsed Plaid webhook body.
+
+    Transactions updates schedule a sync of only the item they name; every other webhook is
+    logged and acknowledged.
+
+    Returns:
+    dict: What was done, for the HTTP response.
+    """
+    webhook_type = payload.get('webhook_type')
+    webhook_code = payload.get('webhook_code')
+    item_id = payload.get('item_id')
+
+    if webhook_type == 'TRANSACTIONS' and webhook_code in SYNC_WEBHOOK_CODES:
+        if not item_id:
+            return {'action': 'ignored', 'reason': 'missing item_id'}
+        status = (scheduler or get_scheduler()).request(item_id)
+        print(f"Plaid webhook {webhook_type}/{webhook_code} for item {item_id}: sync {status}")
+        return {'action': 'sync', 'item_id': item_id, 'status': status}
+
+    if payload.get('error'):
+        print(f"Plaid webhook {webhook_type}/{webhook_code} for item {item_id} reported error: {payload['error']}")
+    else:
+        print(f"Ignoring Plaid webhook {webhook_type}/{webhook_code} for item {item_id}")
+    return {'action': 'ignored', 'webhook_type': webhook_type, 'webhook_code': webhook_code}
+
+
+_verifier = None
+_scheduler = None
+_singleton_lock = threading.Lock()
+
+
+def get_verifier():
+    """Return the process-wide WebhookVerifier, creating it on first use"""
+    global _verifier
+    with _singleton_lock:
+        if _verifier is None:
+            _verifier = WebhookVerifier()
+        return _verifier
+
+
+def get_scheduler():
+    """Return the process-wide SyncScheduler, creating it on first use"""
+    global _scheduler
+    with _singleton_lock:
+        if _scheduler is None:
+            _scheduler = SyncScheduler()
+        return _scheduler
@@ -8,11 +8,16 @@ import traceback
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import your existing Python modules
-from Items import exchange_public_token_for_access_token, get_access_token_for_user
+from Items import exchange_public_token_for_access_token, get_access_token_for_user, link_token_request
 from Transactions import TransactionsSync
-from Configuration import PLAID_CLIENT_ID, PLAID_SECRET_KEY, PLAID_ENV, PLAID_WEBHOOK
-import requests
-import json
+import DatabaseFunctions as dbf
+from Configuration import PLAID_CLIENT_ID, PLAID_SECRET_KEY, PLAID_ENV, PLAID_WEBHOOK, PLAID_WEBHOOK_VERIFY
+from PlaidClient import get_client
+from JobQueue import get_job_queue
+from QueryCache import query_cache
+from SpendAggregates import monthly_spend
+from TransactionQueries import FILTERS, query_transactions
+from Webhooks import WebhookVerificationError, get_scheduler, get_verifier, handle_webhook
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
@@ -42,8 +47,6 @@ def create_link_token():
     This endpoint will be called by your frontend
     """
     try:
-        url = f"https://{PLAID_ENV}.plaid.com/link/token/create"
-        
         # You should get the user ID from your authentication system
         user_id = 'user123'  # Replace with actual user ID
         
@@ -52,35 +55,10 @@ def create_link_token():
         print(f"Client ID: {PLAID_CLIENT_ID[:5]}... (truncated)")
         print(f"Secret Key: {PLAID_SECRET_KEY[:5]}... (truncated)")
         
-        payload = json.dumps({
-            "client_id": PLAID_CLIENT_ID,
-            "secret": PLAID_SECRET_KEY,
-            "client_name": "Personal Finance App",
-            "user": {
-                "client_user_id": user_id
-            },
-            "products": ["transactions"],
-            "country_codes": ["US"],
-            "language": "en",
-            "webhook": PLAID_WEBHOOK,
-            # Add Data Transparency Messaging configuration
-            "update_type": "manual",
-            "link_customization_name": "default",
-            "data_transparency": {
-                "use_cases": ["PERSONAL_FINANCE"],
-                "opt_out_enabled": False,
-                "show_use_cases": True,
-                "show_detailed_scopes": True,
-                "show_third_party_consent": True
-            }
-        })
-        
-        headers = {
-            'Content-Type': 'application/json'
-        }
+        payload = link_token_request(user_id)
         
         print("Sending request to Plaid API...")
-        response = requests.post(url, headers=headers, data=payload)
+        response = get_client().post('/link/token/create', payload, idempotent=False)
         print(f"Response status code: {response.status_code}")
         
         # Print full response for debugging
@@ -139,18 +117,130 @@ def exchange_token():
 @app.route('/api/transactions', methods=['GET'])
 def get_transactions():
     """
-    Get transactions for the current user
+    Start syncing transactions for the current user in the background
+    Returns the job at once; a sync already running for the user is shared instead of started twice
+    """
+    try:
+        user_id = 'user123'  # Replace with actual user ID
+        job, created = get_job_queue().submit('transactions_sync', user_id, TransactionsSync, user_id)
+        return jsonify({
+            "success": True,
+            "message": "Transactions sync started" if created else "Transactions sync already running",
+            "job": job.as_dict(),
+            "status_url": f"/api/jobs/{job.id}",
+        }), 202
+    except Exception as e:
+        print(f"Error starting transactions sync: {e}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/transactions/list', methods=['GET'])
+def list_transactions():
+    """
+    Page through the current user's synced transactions, newest first
+    Filters: account_id, start_date, end_date (YYYY-MM-DD), category, merchant (prefix)
+    Paging: limit (max 500) and cursor (the next_cursor of the previous page)
+    """
+    try:
+        user_id = 'user123'  # Replace with actual user ID
+        filters = {name: request.args.get(name) for name in FILTERS}
+        page = query_transactions(dbf.connect_to_database(), user_id, limit=request.args.get('limit', type=int),
+                                  cursor=request.args.get('cursor'), **filters)
+        return jsonify(page)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error reading transactions: {e}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/spend/monthly', methods=['GET'])
+def spend_by_month():
+    """
+    Spend per month and personal_finance_category from the incrementally maintained aggregates
+    Filters: start_month, end_month (YYYY-MM); by_account=1 keeps accounts apart
     """
     try:
-        # Call your existing function to sync transactions
         user_id = 'user123'  # Replace with actual user ID
-        TransactionsSync(user_id)
-        return jsonify({"success": True, "message": "Transactions synced successfully"})
+        df = monthly_spend(dbf.connect_to_database(), user_id, request.args.get('start_month'),
+                           request.args.get('end_month'), by_account=request.args.get('by_account') == '1')
+        return jsonify(df.to_dict('records'))
     except Exception as e:
-        print(f"Error syncing transactions: {e}")
+        print(f"Error reading spend aggregates: {e}")
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/query-cache-stats', methods=['GET'])
+def query_cache_stats():
+    """
+    Report hits, misses, invalidations and size of the read API result cache
+    """
+    return jsonify(query_cache.info())
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Status, progress (items, pages, rows added/modified/removed) and result of a background job
+    """
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job {job_id}"}), 404
+    return jsonify(job.as_dict(include_result=True))
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """
+    Recent background jobs, newest first; filter with ?kind=transactions_sync&key=<user_id>
+    """
+    jobs = get_job_queue().list(request.args.get('kind'), request.args.get('key'))
+    return jsonify([job.as_dict() for job in jobs])
+
+@app.route('/api/plaid/webhook', methods=['POST'])
+def plaid_webhook():
+    """
+    Receive Plaid webhooks and schedule a sync of only the item they name.
+    Replay a recorded body locally (with PLAID_WEBHOOK_VERIFY=0):
+    curl -X POST -H "Content-Type: application/json" --data @webhook_samples/sync_updates_available.json http://localhost:5000/api/plaid/webhook
+    """
+    body = request.get_data()
+    if PLAID_WEBHOOK_VERIFY:
+        try:
+            get_verifier().verify(body, request.headers.get('Plaid-Verification'))
+        except WebhookVerificationError as e:
+            print(f"Rejected Plaid webhook: {e}")
+            return jsonify({"error": str(e)}), 401
+        except Exception as e:
+            print(f"Error verifying Plaid webhook: {e}")
+            traceback.print_exc()
+            return jsonify({"error": "Could not verify webhook"}), 500
+
+    payload = request.get_json(force=True, silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"error": "Webhook body is not a JSON object"}), 400
+    return jsonify(handle_webhook(payload))
+
+@app.route('/api/plaid/webhook/stats', methods=['GET'])
+def plaid_webhook_stats():
+    """
+    Report webhook events received, coalesced and the syncs they triggered
+    """
+    scheduler = get_scheduler()
+    return jsonify({**scheduler.stats, **scheduler.pending()})
+
+@app.route('/api/db-pool-stats', methods=['GET'])
+def db_pool_stats():
+    """
+    Report checkouts, wait time and overflow for the shared database connection pools
+    """
+    return jsonify(dbf.get_pool_metrics())
+
+@app.route('/api/plaid-latency', methods=['GET'])
+def plaid_latency():
+    """
+    Report per-endpoint latency histograms for outbound Plaid calls
+    """
+    return jsonify(get_client().latency_stats())
+
 @app.route('/test', methods=['GET'])
 def test():
     """
@@ -165,25 +255,17 @@ def create_sandbox_public_token():
     This is a workaround for institution registration issues
     """
     try:
-        url = f"https://{PLAID_ENV}.plaid.com/sandbox/public_token/create"
-        
-        payload = json.dumps({
-            "client_id": PLAID_CLIENT_ID,
-            "secret": PLAID_SECRET_KEY,
+        payload = {
             "institution_id": "ins_109508", # Chase Bank in sandbox
             "initial_products": ["transactions"],
             # Add Data Transparency Messaging configuration
             "options": {
                 "webhook": PLAID_WEBHOOK
             }
-        })
-        
-        headers = {
-            'Content-Type': 'application/json'
         }
         
         print("Creating sandbox public token directly...")
-        response = requests.post(url, headers=headers, data=payload)
+        response = get_client().post('/sandbox/public_token/create', payload, idempotent=False)
         print(f"Response status code: {response.status_code}")
         print(f"Response body: {response.text}")
         
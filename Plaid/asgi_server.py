@@ -0,0 +1,326 @@
+"""
+Async (ASGI) mode of api_server.py, for serving many concurrent Link and exchange flows from one process.
+
+Same routes and JSON responses as the Flask app. Plaid calls go through one pooled
+AsyncPlaidClient and suspend instead of holding a worker thread; database work (which is
+synchronous SQLAlchemy/pyodbc) runs in the default thread pool via asyncio.to_thread.
+
+    uvicorn asgi_server:app --port 5000
+"""
+
+import asyncio
+import json
+import mimetypes
+import os
+import traceback
+from urllib.parse import parse_qs
+
+import DatabaseFunctions as dbf
+from AsyncPlaidClient import AsyncPlaidClient
+from Configuration import PLAID_CLIENT_ID, PLAID_SECRET_KEY, PLAID_ENV, PLAID_WEBHOOK, PLAID_WEBHOOK_VERIFY
+from Items import link_token_request, parse_exchange_response, store_user_item
+from JobQueue import get_job_queue
+from QueryCache import query_cache
+from SpendAggregates import monthly_spend
+from TransactionQueries import FILTERS, query_transactions
+from Transactions import TransactionsSync
+from Webhooks import WebhookVerificationError, get_scheduler, get_verifier, handle_webhook
+
+PUBLIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'public')
+
+_plaid = None
+
+
+def plaid():
+    """The AsyncPlaidClient of the running app, created on first use inside its event loop"""
+    global _plaid
+    if _plaid is None:
+        _plaid = AsyncPlaidClient()
+    return _plaid
+
+
+class Request:
+    """The parts of an ASGI HTTP request the handlers use"""
+
+    def __init__(self, scope, body):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.query = {name: values[0] for name, values in parse_qs(scope.get('query_string', b'').decode()).items()}
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        self.body = body
+
+    def json(self):
+        try:
+            return json.loads(self.body or b'null')
+        except ValueError:
+            return None
+
+
+async def create_link_token(request):
+    """Create a link token for Plaid Link"""
+    try:
+        user_id = 'user123'  # Replace with actual user ID
+        response = await plaid().post('/link/token/create', link_token_request(user_id), idempotent=False)
+        response_data = response.json()
+        if 'error' in response_data:
+            print(f"Plaid API error: {response_data['error']}")
+            return 400, {"error": response_data['error']}
+        return 200, response_data
+    except Exception as e:
+        print(f"Error creating link token: {e}")
+        traceback.print_exc()
+        return 500, {"error": str(e)}
+
+
+async def exchange_token(request):
+    """Exchange a public token for an access token after a successful Plaid Link flow"""
+    try:
+        data = request.json() or {}
+        public_token = data.get('public_token')
+        if not public_token:
+            print("Error: Missing public token in request")
+            return 400, {"error": "Missing public token"}
+
+        user_id = 'user123'  # Replace with actual user ID
+        response_data = await plaid().post_json('/item/public_token/exchange', {"public_token": public_token},
+                                                idempotent=False)
+        access_token, item_id = parse_exchange_response(response_data)
+        await asyncio.to_thread(store_user_item, user_id, item_id, access_token)
+        return 200, {"success": True, "message": "Successfully linked account"}
+    except Exception as e:
+        print(f"Error exchanging public token: {e}")
+        traceback.print_exc()
+        return 500, {"error": str(e)}
+
+
+async def create_sandbox_public_token(request):
+    """Create a sandbox public token directly and exchange it"""
+    try:
+        response_data = await plaid().post_json('/sandbox/public_token/create', {
+            "institution_id": "ins_109508",  # Chase Bank in sandbox
+            "initial_products": ["transactions"],
+            "options": {
+                "webhook": PLAID_WEBHOOK
+            }
+        }, idempotent=False)
+        if 'error' in response_data:
+            print(f"Plaid API error: {response_data['error']}")
+            return 400, {"error": response_data['error']}
+        public_token = response_data.get('public_token')
+        if not public_token:
+            return 500, {"error": "Missing public_token in response"}
+
+        user_id = 'user123'  # Replace with actual user ID
+        exchange_data = await plaid().post_json('/item/public_token/exchange', {"public_token": public_token},
+                                                idempotent=False)
+        access_token, item_id = parse_exchange_response(exchange_data)
+        await asyncio.to_thread(store_user_item, user_id, item_id, access_token)
+        return 200, {
+            "success": True,
+            "message": "Successfully created and exchanged sandbox public token",
+            "public_token": public_token[:10] + "..."  # Only return part of the token for security
+        }
+    except Exception as e:
+        print(f"Error creating sandbox public token: {e}")
+        traceback.print_exc()
+        return 500, {"error": str(e)}
+
+
+async def get_transactions(request):
+    """Start syncing transactions for the current user in the background"""
+    try:
+        user_id = 'user123'  # Replace with actual user ID
+        job, created = get_job_queue().submit('transactions_sync', user_id, TransactionsSync, user_id)
+        return 202, {
+            "success": True,
+            "message": "Transactions sync started" if created else "Transactions sync already running",
+            "job": job.as_dict(),
+            "status_url": f"/api/jobs/{job.id}",
+        }
+    except Exception as e:
+        print(f"Error starting transactions sync: {e}")
+        traceback.print_exc()
+        return 500, {"error": str(e)}
+
+
+async def list_transactions(request):
+    """Page through the current user's synced transactions, newest first"""
+    try:
+        user_id = 'user123'  # Replace with actual user ID
+        filters = {name: request.query.get(name) for name in FILTERS}
+        limit = request.query.get('limit')
+        page = await asyncio.to_thread(query_transactions, dbf.connect_to_database(), user_id,
+                                       limit=int(limit) if limit and limit.isdigit() else None,
+                                       cursor=request.query.get('cursor'), **filters)
+        return 200, page
+    except ValueError as e:
+        return 400, {"error": str(e)}
+    except Exception as e:
+        print(f"Error reading transactions: {e}")
+        traceback.print_exc()
+        return 500, {"error": str(e)}
+
+
+async def spend_by_month(request):
+    """Spend per month and personal_finance_category from the incrementally maintained aggregates"""
+    try:
+        user_id = 'user123'  # Replace with actual user ID
+        df = await asyncio.to_thread(monthly_spend, dbf.connect_to_database(), user_id,
+                                     request.query.get('start_month'), request.query.get('end_month'),
+                                     by_account=request.query.get('by_account') == '1')
+        return 200, df.to_dict('records')
+    except Exception as e:
+        print(f"Error reading spend aggregates: {e}")
+        traceback.print_exc()
+        return 500, {"error": str(e)}
+
+
+async def get_job(request, job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return 404, {"error": f"Unknown job {job_id}"}
+    return 200, job.as_dict(include_result=True)
+
+
+async def list_jobs(request):
+    jobs = get_job_queue().list(request.query.get('kind'), request.query.get('key'))
+    return 200, [job.as_dict() for job in jobs]
+
+
+async def plaid_webhook(request):
+    """Receive Plaid webhooks and schedule a sync of only the item they name"""
+    if PLAID_WEBHOOK_VERIFY:
+        try:
+            # Verification may fetch a key from Plaid with the blocking client
+            await asyncio.to_thread(get_verifier().verify, request.body, request.headers.get('plaid-verification'))
+        except WebhookVerificationError as e:
+            print(f"Rejected Plaid webhook: {e}")
+            return 401, {"error": str(e)}
+        except Exception as e:
+            print(f"Error verifying Plaid webhook: {e}")
+            traceback.print_exc()
+            return 500, {"error": "Could not verify webhook"}
+
+    payload = request.json()
+    if not isinstance(payload, dict):
+        return 400, {"error": "Webhook body is not a JSON object"}
+    return 200, handle_webhook(payload)
+
+
+async def plaid_webhook_stats(request):
+    scheduler = get_scheduler()
+    return 200, {**scheduler.stats, **scheduler.pending()}
+
+
+async def query_cache_stats(request):
+    return 200, query_cache.info()
+
+
+async def db_pool_stats(request):
+    return 200, dbf.get_pool_metrics()
+
+
+async def plaid_latency(request):
+    return 200, plaid().latency_stats()
+
+
+async def test(request):
+    return 200, {"message": "API server is working!"}
+
+
+ROUTES = {
+    ('GET', '/api/create-link-token'): create_link_token,
+    ('POST', '/api/exchange-public-token'): exchange_token,
+    ('GET', '/api/create-sandbox-public-token'): create_sandbox_public_token,
+    ('GET', '/api/transactions'): get_transactions,
+    ('GET', '/api/transactions/list'): list_transactions,
+    ('GET', '/api/spend/monthly'): spend_by_month,
+    ('GET', '/api/jobs'): list_jobs,
+    ('POST', '/api/plaid/webhook'): plaid_webhook,
+    ('GET', '/api/plaid/webhook/stats'): plaid_webhook_stats,
+    ('GET', '/api/query-cache-stats'): query_cache_stats,
+    ('GET', '/api/db-pool-stats'): db_pool_stats,
+    ('GET', '/api/plaid-latency'): plaid_latency,
+    ('GET', '/test'): test,
+}
+
+
+def _read_static(path):
+    """Bytes of a file under public/, or None if it does not exist or is outside public/"""
+    file_path = os.path.realpath(os.path.join(PUBLIC_DIR, path))
+    if not file_path.startswith(os.path.realpath(PUBLIC_DIR) + os.sep) or not os.path.isfile(file_path):
+        return None
+    with open(file_path, 'rb') as f:
+        return f.read()
+
+
+async def _dispatch(request):
+    """Return (status, content type, body bytes) for a request"""
+    handler = ROUTES.get((request.method, request.path))
+    if handler is not None:
+        status, data = await handler(request)
+    elif request.method == 'GET' and request.path.startswith('/api/jobs/'):
+        status, data = await get_job(request, request.path[len('/api/jobs/'):])
+    elif request.method == 'GET' and not request.path.startswith('/api/'):
+        path = request.path.lstrip('/') or 'index.html'
+        content = await asyncio.to_thread(_read_static, path)
+        if content is not None:
+            return 200, mimetypes.guess_type(path)[0] or 'application/octet-stream', content
+        status, data = 404, {"error": f"Could not serve {path}"}
+    else:
+        status, data = 404, {"error": f"No route for {request.method} {request.path}"}
+    return status, 'application/json', json.dumps(data, default=str).encode('utf-8')
+
+
+async def _lifespan(receive, send):
+    global _plaid
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            print("Starting ASGI server...")
+            print(f"Plaid environment: {PLAID_ENV}")
+            print(f"Client ID present: {'Yes' if PLAID_CLIENT_ID else 'No'}")
+            print(f"Secret key present: {'Yes' if PLAID_SECRET_KEY else 'No'}")
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if _plaid is not None:
+                await _plaid.close()
+                _plaid = None
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """The ASGI application"""
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+    if scope['method'] == 'OPTIONS':
+        # CORS preflight, answered like flask_cors does for api_server.py
+        await send({'type': 'http.response.start', 'status': 204, 'headers': [
+            (b'access-control-allow-origin', b'*'),
+            (b'access-control-allow-methods', b'GET, POST, OPTIONS'),
+            (b'access-control-allow-headers', dict(scope['headers']).get(b'access-control-request-headers', b'*')),
+        ]})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+
+    status, content_type, content = await _dispatch(Request(scope, body))
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', content_type.encode('latin-1')),
+                    (b'content-length', str(len(content)).encode('latin-1')),
+                    # Same as flask_cors' default in api_server.py
+                    (b'access-control-allow-origin', b'*')],
+    })
+    await send({'type': 'http.response.body', 'body': content})
@@ -0,0 +1,147 @@
+"""
+Load test: Link + exchange flows against the Flask app under gunicorn vs. the ASGI app under uvicorn.
+
+Both servers talk to a local MockPlaidServer with the given latency, so the test measures how
+many flows one deployment keeps in flight while Plaid is slow. Each flow is what the frontend
+does: GET /api/create-link-token, get a public token (from the mock, standing in for Plaid
+Link in the browser), then POST /api/exchange-public-token.
+
+    python benchmark_api_server.py [--flows 500] [--concurrency 100] [--latency-ms 200] [--gunicorn-workers 4]
+
+Needs httpx, gunicorn and uvicorn. The database defaults to a throwaway SQLite file (--db-url to change).
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _start(command, env, url):
+    """Start a server process and wait until url answers"""
+    process = subprocess.Popen(command, cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{command[0]} exited with {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{command[0]} did not start")
+
+
+def _stop(process):
+    process.terminate()
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def _flow(client, server_url, plaid_url):
+    start = time.perf_counter()
+    response = await client.get(f"{server_url}/api/create-link-token")
+    response.raise_for_status()
+    # Plaid Link runs in the browser; the mock hands out the public token it would return
+    response = await client.post(f"{plaid_url}/sandbox/public_token/create", json={})
+    public_token = response.json()['public_token']
+    response = await client.post(f"{server_url}/api/exchange-public-token", json={'public_token': public_token})
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def _load(server_url, plaid_url, flows, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency * 2)
+
+    async with httpx.AsyncClient(limits=limits, timeout=120) as client:
+        async def one():
+            async with semaphore:
+                try:
+                    return await _flow(client, server_url, plaid_url)
+                except Exception as e:
+                    print(f"Flow failed: {e!r}")
+                    return None
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one() for _ in range(flows)))
+        elapsed = time.perf_counter() - start
+
+    latencies = sorted(result for result in results if result is not None)
+    return elapsed, latencies, flows - len(latencies)
+
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Flask and ASGI API servers against a mock Plaid")
+    parser.add_argument('--flows', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--latency-ms', type=float, default=200, help="Mock Plaid latency per request")
+    parser.add_argument('--gunicorn-workers', type=int, default=4)
+    parser.add_argument('--gunicorn-threads', type=int, default=1)
+    parser.add_argument('--db-url', help="Database for the servers; defaults to a temporary SQLite file")
+    parser.add_argument('--servers', default='flask,asgi', help="Comma-separated: flask, asgi")
+    args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp(prefix='api_bench_')
+    plaid_port = _free_port()
+    plaid_url = f"http://127.0.0.1:{plaid_port}"
+    env = {**os.environ, 'PLAID_BASE_URL': plaid_url, 'PLAID_ARCHIVE_DIR': os.path.join(temp_dir, 'archive'),
+           'PERSONALFINANCE_DB_URL': args.db_url or f"sqlite:///{os.path.join(temp_dir, 'bench.db')}"}
+
+    mock = subprocess.Popen([sys.executable, 'MockPlaidServer.py', '--port', str(plaid_port),
+                             '--latency-ms', str(args.latency_ms)],
+                            cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        time.sleep(1)
+        print(f"{args.flows} flows, {args.concurrency} concurrent, mock Plaid latency {args.latency_ms:.0f} ms "
+              f"(3 Plaid calls per flow)\n")
+        print(f"{'server':<40} {'seconds':>8} {'flows/sec':>10} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+        for server in args.servers.split(','):
+            port = _free_port()
+            if server == 'flask':
+                name = f"Flask, gunicorn {args.gunicorn_workers}x{args.gunicorn_threads} threads"
+                command = [sys.executable, '-m', 'gunicorn', '-w', str(args.gunicorn_workers),
+                           '--threads', str(args.gunicorn_threads), '-b', f"127.0.0.1:{port}", 'api_server:app']
+            elif server == 'asgi':
+                name = "ASGI, uvicorn 1 process"
+                command = [sys.executable, '-m', 'uvicorn', 'asgi_server:app', '--port', str(port),
+                           '--log-level', 'warning']
+            else:
+                print(f"Unknown server {server}")
+                continue
+
+            server_url = f"http://127.0.0.1:{port}"
+            process = _start(command, env, f"{server_url}/test")
+            try:
+                elapsed, latencies, errors = asyncio.run(_load(server_url, plaid_url, args.flows, args.concurrency))
+            finally:
+                _stop(process)
+            print(f"{name:<40} {elapsed:>8.2f} {len(latencies) / elapsed:>10.1f} "
+                  f"{_percentile(latencies, 0.5) * 1000:>8.0f} {_percentile(latencies, 0.95) * 1000:>8.0f} {errors:>7}")
+    finally:
+        _stop(mock)
+
+
+if __name__ == "__main__":
+    main()
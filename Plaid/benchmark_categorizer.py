@@ -0,0 +1,83 @@
+"""
+Micro-benchmark: Categorizer throughput on a synthetic batch of card transactions.
+
+    python benchmark_categorizer.py [--rows 1000000] [--merchants 50000] [--rules 200] [--batch 100000]
+
+Rows draw their merchant from a skewed (Zipf) pool with a few store numbers each, like real card
+activity, so most lookups hit the per-merchant cache. Each run prints rows/sec and the cache hit rate.
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from Categorizer import Categorizer, CategoryRule
+
+
+def merchant_word(i):
+    # Letters only, so the synthetic rules cannot match a store number by accident
+    word = ''
+    for _ in range(4):
+        i, letter = divmod(i, 26)
+        word += chr(ord('A') + letter)
+    return word
+
+
+def synthetic_batch(rows, merchants, seed=0):
+    rng = np.random.default_rng(seed)
+    names = np.array([f"MERCHANT {merchant_word(i)} {['STORE', 'SHOP', 'CAFE', 'MARKET'][i % 4]}"
+                      for i in range(merchants)])
+    picks = np.minimum(rng.zipf(1.3, rows) - 1, merchants - 1)
+    store_numbers = rng.integers(1, 9, rows).astype(str)
+    return pd.DataFrame({
+        'merchant_name': np.char.add(np.char.add(names[picks], ' #'), store_numbers),
+        'amount': np.round(rng.gamma(2, 30, rows), 2),
+        'account_id': rng.choice(['acct-a', 'acct-b', 'chase-1234'], rows),
+        'personal_finance_category': rng.choice(['FOOD_AND_DRINK', 'GENERAL_MERCHANDISE', None], rows),
+    })
+
+
+def synthetic_rules(count, merchants, seed=0):
+    rng = np.random.default_rng(seed)
+    rules = []
+    for i in range(count):
+        ids = '|'.join(merchant_word(merchant) for merchant in rng.integers(0, merchants, 5))
+        rules.append(CategoryRule(
+            category=f"CATEGORY_{i % 25}",
+            merchant=rf"^MERCHANT ({ids}) " if i % 10 else rf"\b{['CAFE', 'MARKET'][i % 2]}\b",
+            min_amount=None if i % 3 else 5.0,
+            max_amount=None if i % 4 else 250.0,
+            accounts=('chase-1234',) if i % 7 == 0 else (),
+            override=bool(i % 5),
+        ))
+    return rules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure Categorizer rows/sec")
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--merchants', type=int, default=50000)
+    parser.add_argument('--rules', type=int, default=200)
+    parser.add_argument('--batch', type=int, default=100000, help="Rows per apply() call, like a sync page or CSV chunk")
+    args = parser.parse_args()
+
+    df = synthetic_batch(args.rows, args.merchants)
+    categorizer = Categorizer(synthetic_rules(args.rules, args.merchants))
+
+    start = time.perf_counter()
+    categorized = [categorizer.apply(df.iloc[offset:offset + args.batch]) for offset in range(0, len(df), args.batch)]
+    elapsed = time.perf_counter() - start
+
+    changed = sum(int((batch['personal_finance_category'].astype(object).fillna('')
+                       != df.loc[batch.index, 'personal_finance_category'].fillna('')).sum()) for batch in categorized)
+    info = categorizer.cache_info()
+    print(f"{args.rows} rows, {args.rules} rules, {args.merchants} merchants, batches of {args.batch}")
+    print(f"{elapsed:.2f}s, {args.rows / elapsed:,.0f} rows/sec ({args.rows / elapsed * 60:,.0f} rows/min), "
+          f"{changed} rows recategorized")
+    print(f"merchant cache: {info.hits} hits, {info.misses} misses, {info.currsize} entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+# The Plaid modules import each other by bare name, as when run from the Plaid folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+@pytest.fixture
+def engine():
+    """A fresh in-memory SQLite database; StaticPool keeps every connection on the same one"""
+    engine = create_engine('sqlite://', poolclass=StaticPool)
+    yield engine
+    engine.dispose()
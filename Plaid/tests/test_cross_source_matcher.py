@@ -0,0 +1,85 @@
+import pandas as pd
+from sqlalchemy import text
+
+from CrossSourceMatcher import get_matches, linked_chase_ids, match_chase_rows, match_transactions
+from DataAccess import store_accounts
+
+USER = 'u1'
+
+
+def plaid_frame(*values):
+    return pd.DataFrame(list(values), columns=['transaction_id', 'account_id', 'date', 'amount', 'merchant_name'])
+
+
+def chase_frame(*values):
+    df = pd.DataFrame(list(values), columns=['transaction_id', 'date', 'amount', 'merchant_name'])
+    return df.assign(account_id='chase-1234')
+
+
+def store_plaid(engine, plaid):
+    with engine.begin() as connection:
+        store_accounts(connection, USER, [{'account_id': 'acc-1', 'mask': '1234'}])
+    plaid.assign(userID=USER, authorized_date=None, counterparty_name=None, pending=False,
+                 date=pd.to_datetime(plaid['date']).dt.date).to_sql('Plaid_Transactions', engine, index=False)
+
+
+def stored_links(engine):
+    matches = get_matches(engine, USER)
+    return sorted(zip(matches['chase_transaction_id'], matches['plaid_transaction_id']))
+
+
+def test_reimporting_the_same_rows_keeps_one_link_each(engine):
+    store_plaid(engine, plaid_frame(('p1', 'acc-1', '2026-03-02', 4.5, 'Starbucks'),
+                                    ('p2', 'acc-1', '2026-03-03', 62.1, 'Whole Foods')))
+    chase = chase_frame(('c1', '2026-03-01', 4.5, 'SQ *STARBUCKS #123'), ('c2', '2026-03-03', 62.1, 'WHOLEFDS MKT'))
+
+    first = match_chase_rows(engine, USER, chase)
+    second = match_chase_rows(engine, USER, chase)
+
+    assert first['matches'] == second['matches'] == 2
+    assert stored_links(engine) == [('c1', 'p1'), ('c2', 'p2')]
+
+
+def test_plaid_row_linked_by_another_import_is_not_reused(engine):
+    store_plaid(engine, plaid_frame(('p1', 'acc-1', '2026-03-02', 4.5, 'Starbucks')))
+    match_chase_rows(engine, USER, chase_frame(('c1', '2026-03-02', 4.5, 'STARBUCKS')))
+
+    summary = match_chase_rows(engine, USER, chase_frame(('c9', '2026-03-02', 4.5, 'STARBUCKS')))
+
+    assert summary['matches'] == 0
+    assert stored_links(engine) == [('c1', 'p1')]
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT COUNT(*) FROM Plaid_Chase_Matches")).scalar() == 1
+
+
+def test_linked_chase_ids_are_only_the_matched_rows(engine):
+    with engine.connect() as connection:
+        assert linked_chase_ids(connection, ['c1']) == set()
+    store_plaid(engine, plaid_frame(('p1', 'acc-1', '2026-03-02', 4.5, 'Starbucks')))
+    match_chase_rows(engine, USER, chase_frame(('c1', '2026-03-02', 4.5, 'STARBUCKS'),
+                                               ('c2', '2026-03-05', 18.0, 'BOOKSHOP')))
+
+    with engine.connect() as connection:
+        assert linked_chase_ids(connection, ['c1', 'c2']) == {'c1'}
+
+
+def test_repeated_amounts_pair_by_date():
+    days = pd.date_range('2026-01-01', periods=60, freq='D')
+    plaid = plaid_frame(*[(f'p{i}', 'acc-1', day, 4.5, 'STARBUCKS') for i, day in enumerate(days)])
+    chase = chase_frame(*[(f'c{i}', day, 4.5, 'STARBUCKS') for i, day in enumerate(days)])
+
+    matches = match_transactions(plaid, chase, {'acc-1': '1234'})
+
+    assert len(matches) == 60
+    assert (matches['chase_transaction_id'].str[1:] == matches['plaid_transaction_id'].str[1:]).all()
+    assert (matches['day_diff'] == 0).all()
+
+
+def test_date_window_is_inclusive_across_buckets():
+    chase = chase_frame(('c1', '2026-01-01', 20.0, 'HARDWARE STORE'))
+    for days_apart, expected in ((3, 1), (4, 0)):
+        plaid = plaid_frame(('p1', 'acc-1', pd.Timestamp('2026-01-01') + pd.Timedelta(days=days_apart), 20.0,
+                             'HARDWARE STORE'))
+        assert len(match_transactions(plaid, chase, {'acc-1': '1234'}, date_window=3, min_score=0)) == expected
+        assert len(match_transactions(chase.assign(account_id='acc-1'), plaid.assign(account_id='chase-1234'),
+                                      {'acc-1': '1234'}, date_window=3, min_score=0)) == expected
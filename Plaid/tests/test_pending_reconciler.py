@@ -0,0 +1,87 @@
+import pandas as pd
+from sqlalchemy import text
+
+from PendingReconciler import CANCELED, POSTED, PendingReconciler, open_pending, pending_resolutions
+
+USER = 'u1'
+COLUMNS = ['transaction_id', 'account_id', 'date', 'amount', 'merchant_name', 'pending', 'pending_transaction_id']
+
+
+def rows(*values):
+    return pd.DataFrame(list(values), columns=COLUMNS)
+
+
+def removed(*transaction_ids):
+    return pd.DataFrame({'transaction_id': list(transaction_ids), 'account_id': [None] * len(transaction_ids)})
+
+
+def sync(engine, *batches):
+    """One sync: observe (kind, frame) batches in page order, then commit"""
+    reconciler = PendingReconciler(USER)
+    for kind, df in batches:
+        reconciler.observe(kind, df)
+    with engine.begin() as connection:
+        return reconciler.commit(connection)
+
+
+def history(engine):
+    return pending_resolutions(engine, USER).set_index('pending_transaction_id')
+
+
+def test_pending_posted_in_a_later_sync(engine):
+    assert sync(engine, ('added', rows(('p1', 'acc', '2026-01-02', 10.0, 'CAFE', True, None)))) == \
+        {'pending_opened': 1, 'pending_posted': 0, 'pending_canceled': 0}
+    assert open_pending(engine, USER)['transaction_id'].tolist() == ['p1']
+
+    counts = sync(engine, ('added', rows(('q1', 'acc', '2026-01-04', 12.5, 'CAFE', False, 'p1'))))
+
+    assert counts['pending_posted'] == 1
+    assert open_pending(engine, USER).empty
+    resolution = history(engine).loc['p1']
+    assert resolution['outcome'] == POSTED
+    assert resolution['transaction_id'] == 'q1'
+    assert resolution['amount_change'] == 2.5
+
+
+def test_removal_after_post_does_not_cancel(engine):
+    sync(engine, ('added', rows(('p1', 'acc', '2026-01-02', 10.0, 'CAFE', True, None))))
+    sync(engine, ('added', rows(('q1', 'acc', '2026-01-04', 10.0, 'CAFE', False, 'p1'))))
+
+    # Plaid removes the pending transaction in a later sync than the one that posted it
+    counts = sync(engine, ('removed', removed('p1')))
+
+    assert counts == {'pending_opened': 0, 'pending_posted': 0, 'pending_canceled': 0}
+    assert history(engine)['outcome'].to_dict() == {'p1': POSTED}
+
+
+def test_removal_after_post_within_one_sync(engine):
+    counts = sync(engine,
+                  ('added', rows(('p1', 'acc', '2026-01-02', 10.0, 'CAFE', True, None))),
+                  ('added', rows(('q1', 'acc', '2026-01-03', 10.0, 'CAFE', False, 'p1'))),
+                  ('removed', removed('p1')))
+
+    assert counts == {'pending_opened': 0, 'pending_posted': 1, 'pending_canceled': 0}
+    assert history(engine)['outcome'].to_dict() == {'p1': POSTED}
+
+
+def test_pending_removed_without_a_post_is_canceled(engine):
+    sync(engine, ('added', rows(('p2', 'acc', '2026-02-01', 30.0, 'HOTEL', True, None))))
+
+    counts = sync(engine, ('removed', removed('p2')))
+
+    assert counts['pending_canceled'] == 1
+    assert history(engine).loc['p2', 'outcome'] == CANCELED
+    assert open_pending(engine, USER).empty
+
+
+def test_posted_row_drops_its_pending_row_from_transactions(engine):
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE Plaid_Transactions (transaction_id TEXT, userID TEXT)"))
+        connection.execute(text("INSERT INTO Plaid_Transactions VALUES ('p1', 'u1'), ('q1', 'u1')"))
+    sync(engine, ('added', rows(('p1', 'acc', '2026-01-02', 10.0, 'CAFE', True, None))))
+
+    sync(engine, ('added', rows(('q1', 'acc', '2026-01-04', 10.0, 'CAFE', False, 'p1'))))
+
+    with engine.connect() as connection:
+        remaining = connection.execute(text("SELECT transaction_id FROM Plaid_Transactions")).scalars().all()
+    assert remaining == ['q1']
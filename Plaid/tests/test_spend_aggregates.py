@@ -0,0 +1,85 @@
+import pandas as pd
+
+from SpendAggregates import daily_spend, delete_user_aggregates, monthly_spend, update_spend_aggregates
+
+USER = 'u1'
+
+
+def transaction(transaction_id, date, amount, category='FOOD_AND_DRINK', pending=False, pending_transaction_id=None):
+    return {'transaction_id': transaction_id, 'account_id': 'acc-1', 'personal_finance_category': category,
+            'date': date, 'amount': amount, 'pending': pending, 'pending_transaction_id': pending_transaction_id}
+
+
+def apply(engine, upserts=(), removed_ids=()):
+    with engine.begin() as connection:
+        return update_spend_aggregates(connection, USER, pd.DataFrame(list(upserts)) if upserts else None,
+                                       removed_ids)
+
+
+def buckets(engine):
+    return monthly_spend(engine, USER).set_index(['month', 'category'])
+
+
+def test_modified_date_moves_the_transaction_to_its_new_bucket(engine):
+    apply(engine, [transaction('t1', '2026-01-31', 12.5), transaction('t2', '2026-01-05', 7.25)])
+    apply(engine, [transaction('t1', '2026-02-01', 12.5)])
+
+    monthly = buckets(engine)
+    assert monthly.loc[('2026-01', 'FOOD_AND_DRINK'), 'amount'] == 7.25
+    assert monthly.loc[('2026-01', 'FOOD_AND_DRINK'), 'transactions'] == 1
+    assert monthly.loc[('2026-02', 'FOOD_AND_DRINK'), 'amount'] == 12.5
+    assert list(daily_spend(engine, USER)['day'].astype(str)) == ['2026-01-05', '2026-02-01']
+
+
+def test_modified_category_moves_and_empty_buckets_are_dropped(engine):
+    apply(engine, [transaction('t1', '2026-03-10', 40.0)])
+    apply(engine, [transaction('t1', '2026-03-10', 45.0, category='GENERAL_MERCHANDISE')])
+
+    monthly = buckets(engine)
+    assert list(monthly.index) == [('2026-03', 'GENERAL_MERCHANDISE')]
+    assert monthly['amount'].tolist() == [45.0]
+
+
+def test_posted_transaction_replaces_its_pending_one_once(engine):
+    apply(engine, [transaction('p1', '2026-04-01', 20.0, pending=True)])
+    assert buckets(engine)['pending_transactions'].tolist() == [1]
+
+    apply(engine, [transaction('q1', '2026-04-02', 21.0, pending_transaction_id='p1')])
+    # Plaid's removal of the pending row arrives afterwards and finds nothing left to retract
+    apply(engine, removed_ids=['p1'])
+
+    monthly = buckets(engine)
+    assert monthly['amount'].tolist() == [21.0]
+    assert monthly['transactions'].tolist() == [1]
+    assert monthly['pending_transactions'].tolist() == [0]
+
+
+def test_reapplying_the_same_batch_changes_nothing(engine):
+    batch = [transaction(f't{i}', f'2026-05-{i + 1:02d}', 1.0 + i) for i in range(5)]
+    apply(engine, batch)
+    before = buckets(engine)
+    apply(engine, batch)
+
+    pd.testing.assert_frame_equal(buckets(engine), before)
+
+
+def test_lookup_of_many_buckets_spans_batches(engine):
+    # More distinct periods than one IN (...) batch holds
+    days = pd.date_range('2020-01-01', periods=1500, freq='D')
+    apply(engine, [transaction(f't{i}', day.strftime('%Y-%m-%d'), 1.0) for i, day in enumerate(days)])
+    apply(engine, [transaction(f't{i}', day.strftime('%Y-%m-%d'), 2.0) for i, day in enumerate(days)])
+
+    daily = daily_spend(engine, USER)
+    assert len(daily) == 1500
+    assert (daily['amount'] == 2.0).all()
+    assert (daily['transactions'] == 1).all()
+
+
+def test_rebuild_keeps_imported_chase_rows(engine):
+    apply(engine, [transaction('p1', '2026-04-02', 10.0), transaction('chase-ab12', '2026-04-03', 3.5)])
+    with engine.begin() as connection:
+        delete_user_aggregates(connection, USER, chunksize=1)
+
+    monthly = buckets(engine)
+    assert monthly.loc[('2026-04', 'FOOD_AND_DRINK'), 'amount'] == 3.5
+    assert monthly.loc[('2026-04', 'FOOD_AND_DRINK'), 'transactions'] == 1
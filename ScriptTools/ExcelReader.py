@@ -0,0 +1,144 @@
+# ExcelReader.py
+
+import re
+from datetime import date, datetime
+from itertools import islice
+
+import pandas as pd
+
+try:
+    from openpyxl import load_workbook
+except ImportError:  # openpyxl is what pd.read_excel uses for .xlsx, but keep the import optional
+    load_workbook = None
+
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:  # calamine (Rust) is optional and faster; openpyxl is the fallback
+    CalamineWorkbook = None
+
+_CELL_RANGE = re.compile(r'^([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?$')
+
+
+def available_engines():
+    return [name for name, module in (('calamine', CalamineWorkbook), ('openpyxl', load_workbook)) if module is not None]
+
+
+def _column_number(letters):
+    number = 0
+    for letter in letters:
+        number = number * 26 + ord(letter) - ord('A') + 1
+    return number
+
+
+def parse_range(cell_range):
+    """
+    Turn an A1-style range such as 'B3:H5000' into 1-based (min_row, min_col, max_row, max_col).
+
+    A single cell ('B3') means from that cell to the end of the sheet; max_row/max_col are then None.
+    """
+    if not cell_range:
+        return 1, 1, None, None
+    match = _CELL_RANGE.match(cell_range.replace('$', '').upper())
+    if match is None:
+        raise ValueError(f"Invalid cell range: {cell_range}")
+    first_col, first_row, last_col, last_row = match.groups()
+    if last_col is None:
+        return int(first_row), _column_number(first_col), None, None
+    return int(first_row), _column_number(first_col), int(last_row), _column_number(last_col)
+
+
+def _openpyxl_rows(file_path, sheet, bounds):
+    if load_workbook is None:
+        raise ImportError("Streaming .xlsx reads need openpyxl")
+    min_row, min_col, max_row, max_col = bounds
+    # read_only parses the sheet XML as it is iterated instead of building every cell first
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if isinstance(sheet, str) else workbook.worksheets[sheet or 0]
+        yield from worksheet.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col,
+                                       values_only=True)
+    finally:
+        workbook.close()
+
+
+def _calamine_rows(file_path, sheet, bounds):
+    min_row, min_col, max_row, max_col = bounds
+    workbook = CalamineWorkbook.from_path(file_path)
+    worksheet = (workbook.get_sheet_by_name(sheet) if isinstance(sheet, str)
+                 else workbook.get_sheet_by_index(sheet or 0))
+    # calamine rows start at the sheet's first used cell; line the range up with it
+    first_row, first_col = worksheet.start or (0, 0)
+    skip_rows = max(min_row - 1 - first_row, 0)
+    stop_rows = None if max_row is None else max(max_row - first_row, 0)
+    start_col = max(min_col - 1 - first_col, 0)
+    stop_col = None if max_col is None else max(max_col - first_col, 0)
+    for row in islice(worksheet.iter_rows(), skip_rows, stop_rows):
+        # calamine returns '' for empty cells where openpyxl returns None
+        yield [None if value == '' else value for value in row[start_col:stop_col]]
+
+
+def iter_excel_rows(file_path, sheet=None, cell_range=None, engine='auto'):
+    """Yield the cell values of a worksheet row by row as tuples/lists, within cell_range"""
+    if engine == 'auto':
+        engine = 'calamine' if CalamineWorkbook is not None else 'openpyxl'
+    bounds = parse_range(cell_range)
+    if engine == 'calamine':
+        if CalamineWorkbook is None:
+            raise ImportError("engine='calamine' needs the python-calamine package")
+        return _calamine_rows(file_path, sheet, bounds)
+    return _openpyxl_rows(file_path, sheet, bounds)
+
+
+def iter_excel_chunks(file_path, sheet=None, cell_range=None, chunksize=10000, dtype=None, engine='auto'):
+    """
+    Read a worksheet in DataFrame chunks without loading the whole workbook.
+
+    The first row of the range is the header. Empty rows are skipped.
+
+    Parameters:
+    file_path (str): .xlsx workbook.
+    sheet (str or int): Sheet name or 0-based index. Defaults to the first sheet.
+    cell_range (str): A1-style range, e.g. 'A1:F200000' or 'B3' (B3 to the end of the sheet).
+    chunksize (int): Rows per yielded DataFrame.
+    dtype (dict or str): Column dtypes applied to every chunk, as for pd.read_excel; str reads every column as text.
+    engine (str): 'calamine', 'openpyxl' or 'auto' (calamine when installed).
+
+    Yields:
+    pd.DataFrame: Up to chunksize rows each, with the same columns.
+    """
+    rows = iter(iter_excel_rows(file_path, sheet, cell_range, engine))
+    header = next(rows, None)
+    if header is None:
+        return
+    columns = [str(value) if value not in (None, '') else f"Unnamed: {i}" for i, value in enumerate(header)]
+    width = len(columns)
+
+    chunk = []
+    for row in rows:
+        if any(value not in (None, '') for value in row):
+            # read_only worksheets can return short rows when trailing cells are empty
+            chunk.append(tuple(row[:width]) + (None,) * (width - len(row)))
+            if len(chunk) >= chunksize:
+                yield _frame(chunk, columns, dtype)
+                chunk = []
+    if chunk:
+        yield _frame(chunk, columns, dtype)
+
+
+def _frame(rows, columns, dtype):
+    if dtype is str:
+        # Every cell as text, dates included, so each chunk has the same column types
+        return pd.DataFrame([[None if value in (None, '') else str(value) for value in row] for row in rows],
+                            columns=columns, dtype=object)
+    df = pd.DataFrame.from_records(rows, columns=columns)
+    for column, column_dtype in (dtype or {}).items():
+        if column not in df.columns:
+            continue
+        if column_dtype is str:
+            # Keep empty cells empty and real date cells as dates; only text and numbers become str
+            values = df[column]
+            convert = values.notna() & ~values.map(lambda value: isinstance(value, (datetime, date)))
+            df[column] = values.where(~convert, values[convert].astype(str))
+        else:
+            df[column] = df[column].astype(column_dtype)
+    return df
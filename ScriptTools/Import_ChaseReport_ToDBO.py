@@ -1,93 +1,523 @@
+import argparse
+import io
+import numpy as np
 import pandas as pd
 import os
-import shutil
+import sys
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
+from sqlalchemy import and_, inspect, or_, select
 import DatabaseFunctions
+from IngestionLedger import IngestionLedger, card_from_filename, file_digest, row_fingerprints
+from SchemaRegistry import CHASE_CREDIT_CARD
 
-print("Starting Chase CSV processing script...")
+# The optional analytics mirror, the spend aggregates and Plaid matching are shared with the Plaid sync
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Plaid'))
+from AnalyticsMirror import ANALYTICS_MIRROR_DIR, AnalyticsMirror, duckdb
+from Categorizer import get_categorizer
+from CrossSourceMatcher import linked_chase_ids, match_chase_rows
+from SpendAggregates import CONTRIBUTIONS_TABLE, update_spend_aggregates
 
-# Get current working directory and set up paths
-current_dir = os.getcwd()
-chase_dir = os.path.join(current_dir, "ChaseReports")
-archive_dir = os.path.join(chase_dir, "archive")
+FILL_PROCEDURE = 'SP_Fill_Report_ChaseCreditCardTransactions'
+LEDGER_FILE = 'ingestion_ledger.sqlite'
 
-print(f"\nCurrent working directory: {current_dir}")
-print(f"Chase directory: {chase_dir}")
-print(f"Archive directory: {archive_dir}")
+# Typed staging table and read dtypes for Chase credit card exports
+SCHEMA = CHASE_CREDIT_CARD
 
-# Verify chase_dir exists
-if not os.path.exists(chase_dir):
-    raise FileNotFoundError(f"Chase directory not found at: {chase_dir}\nPlease make sure you're running the script from the correct directory.")
-    
-# Create archive directory if it doesn't exist
-if not os.path.exists(archive_dir):
-    print(f"\nCreating archive directory at: {archive_dir}")
-    os.makedirs(archive_dir, exist_ok=True)
-else:
-    print(f"\nArchive directory already exists at: {archive_dir}")
-
-# Find all Chase CSV files in the directory
-chase_files = [f for f in os.listdir(chase_dir) if f.endswith('.CSV') and f.startswith('Chase')]
-print(f"\nFound {len(chase_files)} Chase CSV files:")
-for file in chase_files:
-    print(f"- {file}")
-
-# Initialize an empty list to store DataFrames
-dfs = []
-print("\nProcessing files...")
-
-# Process each file
-for file in chase_files:
-    file_path = os.path.join(chase_dir, file)
-    print(f"\nProcessing: {file}")
-    
+
+class ImportStats:
+    """Summary statistics for an import, updated one chunk at a time instead of from a concatenated DataFrame"""
+
+    def __init__(self):
+        self.rows = 0
+        self.columns = 0
+        self.total_amount = 0.0
+        self.min_date = None
+        self.max_date = None
+        self.rows_per_file = {}
+        self.head = None
+        self.skipped_files = 0
+        self.skipped_file_bytes = 0
+        self.skipped_rows = 0
+        self.skipped_row_bytes = 0
+
+    def skip_file(self, file_path):
+        self.skipped_files += 1
+        self.skipped_file_bytes += os.path.getsize(file_path)
+
+    def skip_rows(self, chunk, kept):
+        skipped = len(chunk) - len(kept)
+        if skipped:
+            self.skipped_rows += skipped
+            self.skipped_row_bytes += int(chunk.memory_usage(deep=True).sum() - kept.memory_usage(deep=True).sum())
+
+    def update(self, chunk, file):
+        if self.head is None:
+            self.head = chunk.head()
+        self.rows += len(chunk)
+        self.columns = max(self.columns, chunk.shape[1])
+        self.total_amount += chunk['Amount'].sum()
+        dates = pd.to_datetime(chunk['Transaction Date'], errors='coerce').dropna()
+        if not dates.empty:
+            self.min_date = dates.min() if self.min_date is None else min(self.min_date, dates.min())
+            self.max_date = dates.max() if self.max_date is None else max(self.max_date, dates.max())
+        self.rows_per_file[file] = self.rows_per_file.get(file, 0) + len(chunk)
+
+    def merge(self, other):
+        """Add another ImportStats (e.g. one file's) to these totals"""
+        if self.head is None:
+            self.head = other.head
+        self.rows += other.rows
+        self.columns = max(self.columns, other.columns)
+        self.total_amount += other.total_amount
+        for date in (other.min_date, other.max_date):
+            if date is not None:
+                self.min_date = date if self.min_date is None else min(self.min_date, date)
+                self.max_date = date if self.max_date is None else max(self.max_date, date)
+        for file, rows in other.rows_per_file.items():
+            self.rows_per_file[file] = self.rows_per_file.get(file, 0) + rows
+        self.skipped_files += other.skipped_files
+        self.skipped_file_bytes += other.skipped_file_bytes
+        self.skipped_rows += other.skipped_rows
+        self.skipped_row_bytes += other.skipped_row_bytes
+
+    def report(self):
+        date_range = (f"{self.min_date:%m/%d/%Y} to {self.max_date:%m/%d/%Y}"
+                      if self.min_date is not None else "n/a")
+        print(f"\nImport statistics:")
+        print(f"- Total rows: {self.rows}")
+        print(f"- Total columns: {self.columns}")
+        print(f"- Date range: {date_range}")
+        print(f"- Total amount: ${self.total_amount:.2f}")
+        print(f"- Number of source files: {len(self.rows_per_file)}")
+        print(f"- Skipped files already imported: {self.skipped_files} ({self.skipped_file_bytes:,} bytes)")
+        print(f"- Skipped duplicate rows: {self.skipped_rows} ({self.skipped_row_bytes:,} bytes in memory)")
+
+        if self.head is not None:
+            print("\nFirst few rows:")
+            print(self.head)
+
+        print("\nSource files imported:")
+        for source_file, file_count in self.rows_per_file.items():
+            print(f"- {source_file}: {file_count} transactions")
+
+
+def is_chase_file(filename):
+    return filename.endswith('.CSV') and filename.startswith('Chase')
+
+
+def parse_chase_file(file_path, chunksize):
+    """Read one Chase CSV in typed chunks shaped to the staging schema, tagged with source file and row number"""
+    file = os.path.basename(file_path)
+    row_offset = 0
+    for chunk in pd.read_csv(file_path, dtype=SCHEMA.read_dtypes, chunksize=chunksize):
+        chunk['Source_File'] = file
+        chunk['Source_File_RowID'] = range(row_offset + 1, row_offset + len(chunk) + 1)  # Index starting from 1
+        row_offset += len(chunk)
+        yield SCHEMA.coerce(chunk)
+
+
+def parse_chase_block(file, header, block):
+    """Parse one block of CSV records (without the header line) into a typed chunk; rows are numbered by the caller"""
+    chunk = pd.read_csv(io.StringIO(header + block), dtype=SCHEMA.read_dtypes)
+    chunk['Source_File'] = file
+    return SCHEMA.coerce(chunk)
+
+
+def _records(lines):
+    # A quoted field can hold line breaks; a record ends once its quotes are balanced
+    record = ''
+    for line in lines:
+        record += line
+        if record.count('"') % 2 == 0:
+            yield record
+            record = ''
+    if record:
+        yield record
+
+
+def read_blocks(file_path, chunksize):
+    """Yield (header line, text of up to chunksize records) for a CSV; always at least one block"""
+    with open(file_path, newline='', encoding='utf-8-sig') as f:
+        records = _records(f)
+        header = next(records, '')
+        block = []
+        sent = False
+        for record in records:
+            block.append(record)
+            if len(block) >= chunksize:
+                yield header, ''.join(block)
+                sent = True
+                block = []
+        if block or not sent:
+            yield header, ''.join(block)
+
+
+def rule_categories(chunk, card):
+    """
+    Category the CATEGORY_RULES_FILE rules give each row, None where no rule applies (or no
+    rules are set). Chase's own Category counts as the current one, so rules that only fill
+    uncategorized rows leave it alone.
+    """
+    categorizer = get_categorizer()
+    if categorizer is None:
+        return None
+    # Rules use Plaid's sign, positive for money out
+    categories, rule_index = categorizer.categorize(chunk['Description'], -chunk['Amount'].astype('float64'),
+                                                    pd.Series(f"chase-{card}", index=chunk.index), chunk['Category'])
+    return np.where(rule_index >= 0, categories, None)
+
+
+def mirror_frame(chunk, user_id):
+    """
+    Staged Chase rows shaped like normalized Plaid transactions for the analytics mirror, spend
+    aggregates and Plaid matching.
+
+    Chase amounts are negative for purchases and Plaid's positive, so the sign is flipped. The
+    staged Transaction_ID is a row fingerprint, stable across imports, so a re-imported row
+    replaces its earlier copy in the mirror and aggregates instead of adding to it. The staged
+    Rule_Category wins over Chase's own Category.
+    """
+    return pd.DataFrame({
+        'transaction_id': chunk['Transaction_ID'].values,
+        'userID': user_id,
+        'account_id': ('chase-' + chunk['Source_File'].map(card_from_filename)).values,
+        'personal_finance_category': chunk['Rule_Category'].fillna(chunk['Category']).values,
+        'date': pd.to_datetime(chunk['Transaction Date']).values,
+        'merchant_name': chunk['Description'].values,
+        'amount': -chunk['Amount'].astype('float64').values,
+        'iso_currency_code': 'USD',
+        'pending': False,
+    })
+
+
+def read_staged_rows(engine, chunksize):
+    """
+    Yield the staging table's rows in (Source_File, Source_File_RowID) order, chunksize at a time.
+
+    Each chunk is its own query starting after the last row read, so no cursor stays open
+    while the caller writes the chunk elsewhere.
+    """
+    table = SCHEMA.table()
+    source_file, row_id = table.c.Source_File, table.c.Source_File_RowID
+    last = None
+    while True:
+        query = select(table).order_by(source_file, row_id).limit(chunksize)
+        if last is not None:
+            query = query.where(or_(source_file > last[0], and_(source_file == last[0], row_id > last[1])))
+        with engine.connect() as connection:
+            chunk = pd.read_sql(query, connection)
+        if chunk.empty:
+            return
+        yield chunk
+        last = chunk['Source_File'].iloc[-1], int(chunk['Source_File_RowID'].iloc[-1])
+
+
+def aggregate_chase_rows(connection, user_id, frame, add=True):
+    """
+    Add Chase rows to the spend aggregates, except rows linked to a Plaid transaction in
+    Plaid_Chase_Matches: the Plaid copy is counted already, so a linked row's earlier
+    contribution is retracted instead. With add=False, only linked rows are retracted.
+    """
+    linked = linked_chase_ids(connection, frame['transaction_id'])
+    if add:
+        update_spend_aggregates(connection, user_id, frame[~frame['transaction_id'].isin(linked)], linked)
+    elif linked and inspect(connection).has_table(CONTRIBUTIONS_TABLE):
+        update_spend_aggregates(connection, user_id, removed_ids=linked)
+
+
+def publish_staged_rows(engine, user_id, chunksize, mirror=None, aggregate=False, match=False):
+    """
+    Pass the staged rows, chunk by chunk, to the analytics mirror, Plaid matching and the spend aggregates.
+
+    Each chunk is matched before it is aggregated, so rows that turn out to be the same
+    purchase as a synced Plaid transaction are not counted twice.
+
+    Returns:
+    bool: False if the mirror or the aggregates could not be updated; the import should then
+    not be recorded as done, so the next run stages (and publishes) the rows again.
+    """
+    start = datetime.now()
+    matched = {'chase_rows': 0, 'plaid_candidates': 0, 'matches': 0}
+    for chunk in read_staged_rows(engine, chunksize):
+        frame = mirror_frame(chunk, user_id)
+        if mirror is not None:
+            try:
+                mirror.apply(user_id, {'added': [frame]}, source='chase')
+            except Exception as e:
+                print(f"Error updating analytics mirror: {e}")
+                return False
+        if match:
+            try:
+                summary = match_chase_rows(engine, user_id, frame)
+                matched = {key: matched[key] + summary[key] for key in matched}
+            except Exception as e:
+                print(f"Error matching Chase rows to Plaid transactions: {e}")
+        if aggregate or match:
+            try:
+                with engine.begin() as connection:
+                    aggregate_chase_rows(connection, user_id, frame, add=aggregate)
+            except Exception as e:
+                print(f"Error updating spend aggregates: {e}")
+                if aggregate:
+                    return False
+    if match:
+        print(f"Matched {matched['matches']} of {matched['chase_rows']} Chase rows to "
+              f"{matched['plaid_candidates']} Plaid transactions in {(datetime.now() - start).total_seconds():.1f}s")
+    return True
+
+
+def parse_in_order(file_paths, workers, chunksize):
+    """
+    Yield (path, chunks) in the original file order, where chunks is an iterator over the
+    file's parsed chunks that raises if the file cannot be read or parsed.
+
+    With several workers, this process reads each file as text blocks of chunksize records
+    and the pool parses one block per task. At most workers * 2 blocks are parsed ahead of
+    the writer, so memory stays bounded by chunks, not files.
+    """
+    if workers <= 1:
+        for file_path in file_paths:
+            yield file_path, parse_chase_file(file_path, chunksize)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        tasks = _submit_blocks(executor, file_paths, chunksize, window=workers * 2)
+        for file_path, file_tasks in groupby(tasks, key=itemgetter(0)):
+            yield file_path, _numbered_chunks(file_tasks)
+
+
+def _submit_blocks(executor, file_paths, chunksize, window):
+    # (path, future) per block in file order, submitted at most window blocks ahead of the consumer
+    pending = deque()
+    for file_path in file_paths:
+        file = os.path.basename(file_path)
+        try:
+            for header, block in read_blocks(file_path, chunksize):
+                pending.append((file_path, executor.submit(parse_chase_block, file, header, block)))
+                if len(pending) >= window:
+                    yield pending.popleft()
+        except Exception as e:
+            failed = Future()
+            failed.set_exception(e)
+            pending.append((file_path, failed))
+    while pending:
+        yield pending.popleft()
+
+
+def _numbered_chunks(file_tasks):
+    row_offset = 0
+    for _, future in file_tasks:
+        chunk = future.result()
+        chunk['Source_File_RowID'] = range(row_offset + 1, row_offset + len(chunk) + 1)  # Index starting from 1
+        row_offset += len(chunk)
+        yield chunk
+
+
+def unstage_file(engine, file):
+    """Delete one file's rows from the staging table; False if they could not be removed"""
     try:
-        # Read the CSV file into a DataFrame
-        print(f"Reading CSV file: {file}")
-        df = pd.read_csv(file_path)
-        
-        # Add filename column and index
-        df['Source_File'] = file
-        df['Source_File_RowID'] = range(1, len(df) + 1)  # Add index starting from 1
-        
-        db_connection = DatabaseFunctions.connect_to_database()
-        
-        DatabaseFunctions.insert_dataframe_to_sql(df, 'temp_Report_ChaseCreditCardTransactions', db_connection)
-        DatabaseFunctions.run_stored_procedure(db_connection, 'SP_Fill_Report_ChaseCreditCardTransactions')
-        print(f"Successfully loaded DataFrame with shape: {df.shape}")
-        dfs.append(df)
-        
-        # Move file to archive folder without changing the name
-        archive_path = os.path.join(archive_dir, file)
-        print(f"Moving file to archive: {file}")
-        shutil.move(file_path, archive_path)
-        print(f"Successfully archived file")
-        
+        table = SCHEMA.table()
+        with engine.begin() as connection:
+            connection.execute(table.delete().where(table.c.Source_File == file))
+        return True
+    except Exception as e:
+        print(f"Error removing {file} from {SCHEMA.table_name}: {e}")
+        return False
+
+
+def import_chase_files(file_paths, archive_dir, workers=1, chunksize=10000, ledger=None, mirror=None,
+                       user_id=None, aggregate=False, match=False):
+    """
+    Load Chase CSV exports into the staging table and run the fill procedure once.
+
+    Files are parsed in parallel, but every chunk is written by this process in file order
+    through one pooled engine. Successfully staged files are archived once the procedure succeeded.
+    With a ledger, files imported before are archived without being read and rows already
+    loaded from an overlapping statement are dropped before they are sent to the server.
+
+    Parameters:
+    file_paths (list): CSV files to import, in the order they should be loaded.
+    archive_dir (str): Folder imported files are moved to.
+    workers (int): Processes parsing files.
+    chunksize (int): Rows per CSV chunk and per bulk insert.
+    ledger (IngestionLedger): Record of imported files and rows. None imports everything.
+    mirror (AnalyticsMirror): Also append the staged rows to this analytics mirror, as user_id's.
+    user_id (str): User the mirrored and aggregated rows belong to.
+    aggregate (bool): Also add the staged rows to user_id's spend aggregates.
+    match (bool): Link the staged rows to user_id's Plaid transactions of the same card activity.
+
+    Returns:
+    ImportStats: Totals for everything that was staged.
+    """
+    stats = ImportStats()
+    db_connection = DatabaseFunctions.connect_to_database()
+    if db_connection is None:
+        print("Failed to connect to the database.")
+        return stats
+    try:
+        with db_connection.begin() as connection:
+            SCHEMA.ensure_table(connection)
     except Exception as e:
-        print(f"ERROR processing {file}: {str(e)}")
-
-# Combine all DataFrames
-if dfs:
-    print("\nCombining all DataFrames...")
-    combined_df = pd.concat(dfs, ignore_index=True)
-    print(f"Successfully created combined DataFrame!")
-    print(f"\nCombined DataFrame statistics:")
-    print(f"- Total rows: {combined_df.shape[0]}")
-    print(f"- Total columns: {combined_df.shape[1]}")
-    print(f"- Date range: {combined_df['Transaction Date'].min()} to {combined_df['Transaction Date'].max()}")
-    print(f"- Total amount: ${combined_df['Amount'].sum():.2f}")
-    print(f"- Number of source files: {combined_df['Source_File'].nunique()}")
-    
-    print("\nFirst few rows of combined DataFrame:")
-    print(combined_df.head())
-    
-    # Print unique source files
-    print("\nSource files in DataFrame:")
-    for source_file in combined_df['Source_File'].unique():
-        file_count = len(combined_df[combined_df['Source_File'] == source_file])
-        print(f"- {source_file}: {file_count} transactions")
-    
-else:
-    print("\nNo CSV files were processed")
-
-print("\nScript execution completed!")
\ No newline at end of file
+        print(f"Error creating staging table {SCHEMA.table_name}: {e}")
+        return stats
+
+    done_files = []
+    digests = {}
+    if ledger is not None:
+        new_files = []
+        for file_path in file_paths:
+            digest = file_digest(file_path)
+            if ledger.has_file(digest):
+                print(f"Skipping {os.path.basename(file_path)}: already imported")
+                stats.skip_file(file_path)
+                done_files.append(file_path)
+            else:
+                digests[file_path] = digest
+                new_files.append(file_path)
+        file_paths = new_files
+
+    staged_files = []
+    truncate = True
+    for file_path, chunks in parse_in_order(file_paths, workers, chunksize):
+        file = os.path.basename(file_path)
+        print(f"\nProcessing: {file}")
+        card = card_from_filename(file)
+        occurrences = {}
+        id_occurrences = {}
+        file_stats = ImportStats()
+        try:
+            for chunk in chunks:
+                # Fingerprint every row before the ledger drops any, so occurrence numbers match across imports
+                chunk['Transaction_ID'] = [f"chase-{fingerprint.hex()}" for fingerprint in
+                                           row_fingerprints(chunk, card, id_occurrences)]
+                # Staged with every import, so the report table is categorized without --mirror/--aggregate
+                chunk['Rule_Category'] = rule_categories(chunk, card)
+                if ledger is not None:
+                    kept = ledger.filter_new_rows(chunk, card, occurrences)
+                    file_stats.skip_rows(chunk, kept)
+                    chunk = kept
+                    if chunk.empty:
+                        continue
+                if DatabaseFunctions.insert_dataframe_to_sql(chunk, SCHEMA.table_name, db_connection, chunksize, truncate) is None:
+                    # A partly staged file must not reach the fill procedure; leave every file for the next run
+                    print(f"ERROR loading {file}; stopping before {FILL_PROCEDURE}")
+                    if ledger is not None:
+                        ledger.rollback()
+                    return stats
+                truncate = False
+                file_stats.update(chunk, file)
+        except Exception as e:
+            # Chunks are streamed, so part of the file may be staged already; take it back out and skip the file
+            print(f"ERROR processing {file}: {str(e)}")
+            if not unstage_file(db_connection, file):
+                if ledger is not None:
+                    ledger.rollback()
+                return stats
+            if ledger is not None:
+                ledger.discard_file_rows()
+            continue
+        stats.merge(file_stats)
+        if ledger is not None:
+            ledger.add_file(digests[file_path], file, os.path.getsize(file_path), file_stats.rows)
+        staged_files.append(file_path)
+
+    # truncate is still set when no row reached the staging table, which then holds the last run's rows
+    if not truncate and not DatabaseFunctions.run_stored_procedure(db_connection, FILL_PROCEDURE):
+        # The staged rows never reached the report table; leave every file for the next run
+        print(f"ERROR: {FILL_PROCEDURE} failed; files were not archived")
+        if ledger is not None:
+            ledger.rollback()
+        return stats
+    # Rows only count as imported once the procedure succeeded; they are read back from the
+    # staging table rather than kept in memory, however many files the run imported
+    if not truncate and (mirror is not None or aggregate or match):
+        if not publish_staged_rows(db_connection, user_id, chunksize, mirror, aggregate, match):
+            print("ERROR: the imported rows could not be mirrored or aggregated; files were not archived")
+            if ledger is not None:
+                ledger.rollback()
+            return stats
+    if ledger is not None:
+        ledger.commit()
+
+    for file_path in done_files + staged_files:
+        # Move file to archive folder without changing the name, in one atomic rename
+        file = os.path.basename(file_path)
+        print(f"Moving file to archive: {file}")
+        os.replace(file_path, os.path.join(archive_dir, file))
+    print(f"Successfully archived {len(done_files) + len(staged_files)} files")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import Chase credit card CSV exports into SQL Server")
+    parser.add_argument('--chase-dir', default=os.path.join(os.getcwd(), "ChaseReports"))
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Processes parsing CSV files")
+    parser.add_argument('--chunksize', type=int, default=10000, help="Rows per CSV chunk and bulk insert")
+    parser.add_argument('--ledger', help=f"Ingestion ledger path (default: <chase-dir>/{LEDGER_FILE})")
+    parser.add_argument('--no-ledger', action='store_true', help="Import every file and row, skipping nothing")
+    parser.add_argument('--mirror', default=ANALYTICS_MIRROR_DIR or None,
+                        help="Also append imported rows to the Parquet analytics mirror in this folder (needs duckdb)")
+    parser.add_argument('--aggregate', action='store_true',
+                        help="Also add imported rows to the spend aggregates, except rows linked to a Plaid transaction")
+    parser.add_argument('--match', action='store_true',
+                        help="Link imported rows to the same activity synced from Plaid (Plaid_Chase_Matches)")
+    parser.add_argument('--user', '--mirror-user', default='user123',
+                        help="User the mirrored, aggregated and matched Chase rows belong to")
+    args = parser.parse_args()
+
+    print("Starting Chase CSV processing script...")
+
+    chase_dir = args.chase_dir
+    archive_dir = os.path.join(chase_dir, "archive")
+
+    print(f"\nCurrent working directory: {os.getcwd()}")
+    print(f"Chase directory: {chase_dir}")
+    print(f"Archive directory: {archive_dir}")
+
+    # Verify chase_dir exists
+    if not os.path.exists(chase_dir):
+        raise FileNotFoundError(f"Chase directory not found at: {chase_dir}\nPlease make sure you're running the script from the correct directory.")
+
+    # Create archive directory if it doesn't exist
+    os.makedirs(archive_dir, exist_ok=True)
+
+    # Find all Chase CSV files in the directory
+    chase_files = sorted(f for f in os.listdir(chase_dir) if is_chase_file(f))
+    print(f"\nFound {len(chase_files)} Chase CSV files:")
+    for file in chase_files:
+        print(f"- {file}")
+
+    if not chase_files:
+        print("\nNo CSV files were processed")
+        return
+
+    ledger = None if args.no_ledger else IngestionLedger(args.ledger or os.path.join(chase_dir, LEDGER_FILE))
+    mirror = None
+    if args.mirror:
+        if duckdb is None:
+            print("duckdb is not installed; not updating the analytics mirror")
+        else:
+            mirror = AnalyticsMirror(args.mirror)
+
+    start = datetime.now()
+    try:
+        stats = import_chase_files([os.path.join(chase_dir, f) for f in chase_files], archive_dir,
+                                   args.workers, args.chunksize, ledger, mirror, args.user, args.aggregate,
+                                   args.match)
+    finally:
+        if ledger is not None:
+            ledger.close()
+    if stats.rows or stats.skipped_files or stats.skipped_rows:
+        stats.report()
+    else:
+        print("\nNo CSV files were processed")
+
+    print(f"\nScript execution completed in {(datetime.now() - start).total_seconds():.1f}s!")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,64 +1,121 @@
+import argparse
 import os
-import shutil
 import pandas as pd
 import DatabaseFunctions as dbf
+from ExcelReader import iter_excel_chunks
+from IngestionLedger import IngestionLedger, file_digest
+from SchemaRegistry import create_table, load_dataframe, schema_for
 
 # Directory containing csv files
 folder_path = 'C:/Users/brishty/OneDrive - Bentex/Github/Dash2/DB Imports'
-archive_path = os.path.join(folder_path, 'Archive')  # Archive folder within DB Imports
+LEDGER_FILE = 'ingestion_ledger.sqlite'  # Content hashes of files already imported
+SUPPORTED_EXTENSIONS = ('.csv', '.xlsx')
+CHUNKSIZE = 10000  # Rows read and bulk inserted at a time
 
-# Function to process each csv file
-def process_csv_file(file_path):
-    try:
-        # Extract filename from file path
-        filename = os.path.basename(file_path)
-        print("This is the file: " + filename)
-        
-        # Read csv file into DataFrame
-        df = pd.read_csv(file_path)
-        
-        # Insert DataFrame into SQL
-        dbf.insert_dataframe_to_sql(df, filename, dbf.connect_to_database())
-        print(f"Successfully processed {filename}")
-        
-        # Move file to archive folder after processing
-        archive_file_path = os.path.join(archive_path, filename)
-        shutil.move(file_path, archive_file_path)
-        print(f"Moved {filename} to archive.")
-        
-    except Exception as e:
-        print(f"Error processing {file_path}: {e}")
 
-# Function to process each excel file
-def process_excel_file(file_path):
+def archive_path_for(folder):
+    return os.path.join(folder, 'Archive')  # Archive folder within DB Imports
+
+
+# Move a file into the archive folder in one rename, so it is never half in both places
+def archive_file(file_path, archive_path):
+    filename = os.path.basename(file_path)
+    os.replace(file_path, os.path.join(archive_path, filename))
+    print(f"Moved {filename} to archive.")
+
+
+# Function to process each csv or excel file
+def process_file(file_path, ledger, archive_path):
+    """
+    Load one CSV/XLSX file into its registered staging table and archive it.
+
+    Files without a SchemaRegistry entry still go to a table named after the file. Their
+    columns are read as text: the table is created from the first chunk, and types inferred
+    from it alone need not fit the rest of the file.
+
+    Returns:
+    str: 'imported', 'skipped' (same content imported before) or None on error.
+    """
     try:
         # Extract filename from file path
         filename = os.path.basename(file_path)
+        digest = file_digest(file_path)
+        if ledger is not None and ledger.has_file(digest):
+            # Archive a file whose exact content was imported before instead of loading it again
+            print(f"Skipping {filename}: already imported")
+            archive_file(file_path, archive_path)
+            return 'skipped'
+
         print("This is the file: " + filename)
-        
-        # Read excel file into DataFrame
-        df = pd.read_excel(file_path)
-        
-        # Insert DataFrame into SQL
-        dbf.insert_dataframe_to_sql(df, filename, dbf.connect_to_database())
+
+        schema = schema_for(filename)
+        dtype = schema.read_dtypes if schema is not None else str
+
+        # Read file in chunks; workbooks are streamed from the selected sheet and range
+        if filename.endswith('.xlsx'):
+            sheet = schema.sheet if schema is not None else None
+            cell_range = schema.cell_range if schema is not None else None
+            chunks = iter_excel_chunks(file_path, sheet, cell_range, CHUNKSIZE, dtype)
+        else:
+            chunks = pd.read_csv(file_path, dtype=dtype, chunksize=CHUNKSIZE)
+        if schema is None:
+            print(f"No staging schema registered for {filename}; loading into table {filename}")
+
+        # Insert each chunk into SQL, replacing the table's contents with the first one
+        engine = dbf.connect_to_database()
+        if schema is not None and not create_table(schema, engine):
+            print(f"Error processing {file_path}: staging table unavailable")
+            return None
+        rows = 0
+        for i, chunk in enumerate(chunks):
+            if schema is not None:
+                loaded = load_dataframe(chunk, schema, engine, CHUNKSIZE, truncate=i == 0, create=False)
+            else:
+                loaded = dbf.insert_dataframe_to_sql(chunk, filename, engine, CHUNKSIZE, truncate=i == 0)
+            if loaded is None:
+                print(f"Error processing {file_path}: insert failed")
+                return None
+            rows += loaded
         print(f"Successfully processed {filename}")
-        
+        if ledger is not None:
+            ledger.add_file(digest, filename, os.path.getsize(file_path), rows)
+            ledger.commit()
+
         # Move file to archive folder after processing
-        archive_file_path = os.path.join(archive_path, filename)
-        shutil.move(file_path, archive_file_path)
-        print(f"Moved {filename} to archive.")
-        
+        archive_file(file_path, archive_path)
+        return 'imported'
+
     except Exception as e:
         print(f"Error processing {file_path}: {e}")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import every CSV/XLSX file in a folder into its own table")
+    parser.add_argument('--folder', default=folder_path)
+    args = parser.parse_args()
+
+    archive_path = archive_path_for(args.folder)
+
+    # Ensure the Archive folder exists
+    os.makedirs(archive_path, exist_ok=True)
+
+    ledger = IngestionLedger(os.path.join(args.folder, LEDGER_FILE))
+    skipped_files = 0
+    skipped_bytes = 0
+
+    # Loop through files in the directory
+    for filename in os.listdir(args.folder):
+        if filename.endswith(SUPPORTED_EXTENSIONS):  # Adjust file extensions as needed
+            file_path = os.path.join(args.folder, filename)
+            size = os.path.getsize(file_path)
+            if process_file(file_path, ledger, archive_path) == 'skipped':
+                skipped_files += 1
+                skipped_bytes += size
+
+    ledger.close()
+    print(f"Skipped {skipped_files} files already imported ({skipped_bytes:,} bytes)")
+
 
-# Ensure the Archive folder exists
-os.makedirs(archive_path, exist_ok=True)
-
-# Loop through files in the directory
-for filename in os.listdir(folder_path):
-    if filename.endswith('.csv'):  # Adjust file extension as needed
-        file_path = os.path.join(folder_path, filename)
-        process_csv_file(file_path)
-    if filename.endswith('.xlsx'):  # Adjust file extension as needed
-        file_path = os.path.join(folder_path, filename)
-        process_excel_file(file_path)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# IngestionLedger.py
+
+import hashlib
+import os
+import re
+import sqlite3
+import time
+
+import pandas as pd
+
+# Rows per "IN (...)" lookup, below SQLite's default limit on bound parameters
+LOOKUP_BATCH = 900
+
+# Chase exports are named like Chase1234_Activity20240101_20240131_20240201.CSV
+_CHASE_CARD = re.compile(r'^Chase(\d{4})', re.IGNORECASE)
+
+
+def file_digest(file_path, block_size=1 << 20):
+    """SHA-256 of a file's content, read in blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def card_from_filename(filename):
+    """Last four card digits from a Chase export name, or '' when the name has none"""
+    match = _CHASE_CARD.match(os.path.basename(filename))
+    return match.group(1) if match else ''
+
+
+def row_fingerprints(df, card, occurrences=None, date_column='Transaction Date', amount_column='Amount',
+                     description_column='Description'):
+    """
+    Fingerprint each transaction row as (card, date, amount, description, occurrence).
+
+    The occurrence number counts identical rows within a file, so two real purchases of
+    the same amount at the same merchant on the same day stay distinct, while the same pair
+    repeated in an overlapping statement matches the fingerprints already recorded.
+
+    Parameters:
+    df (pandas.DataFrame): Rows to fingerprint.
+    card (str): Card the rows belong to.
+    occurrences (dict): Counts carried between the chunks of one file. Pass the same dict
+                        for every chunk of a file; None counts within df only.
+
+    Returns:
+    list: 16-byte digests in row order.
+    """
+    if occurrences is None:
+        occurrences = {}
+    # Dates as ISO text whether the frame holds raw export strings or parsed dates
+    raw_dates = df[date_column].astype(str).str.strip()
+    dates = pd.to_datetime(df[date_column], errors='coerce').dt.strftime('%Y-%m-%d').fillna(raw_dates)
+    amounts = df[amount_column].round(2).map('{:.2f}'.format)
+    descriptions = df[description_column].fillna('').astype(str).str.strip().str.upper()
+    fingerprints = []
+    for key in zip(dates, amounts, descriptions):
+        occurrence = occurrences.get(key, 0)
+        occurrences[key] = occurrence + 1
+        row = '\x1f'.join((card, *key, str(occurrence)))
+        fingerprints.append(hashlib.blake2b(row.encode('utf-8'), digest_size=16).digest())
+    return fingerprints
+
+
+class IngestionLedger:
+    """
+    Local SQLite record of what has already been loaded into SQL Server.
+
+    Files are keyed by content hash, so a re-dropped export is recognised in one lookup
+    whatever its name. Rows are kept as 16-byte fingerprints in a WITHOUT ROWID table, so
+    overlapping statements can be filtered before anything is sent to the server.
+    Fingerprints seen during an import are held as pending until commit(), which is only
+    called once the data has reached its final table. Those of the file being read are kept
+    apart until add_file(), so a file that fails halfway can be dropped with discard_file_rows().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                sha256 TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                rows INTEGER,
+                imported_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS rows (
+                fingerprint BLOB PRIMARY KEY
+            ) WITHOUT ROWID;
+        """)
+        self._pending_files = []
+        self._pending_rows = set()
+        self._file_rows = set()
+
+    def has_file(self, digest):
+        row = self.connection.execute("SELECT 1 FROM files WHERE sha256 = ?", (digest,)).fetchone()
+        return row is not None or any(pending[0] == digest for pending in self._pending_files)
+
+    def _known(self, fingerprints):
+        known = set()
+        for start in range(0, len(fingerprints), LOOKUP_BATCH):
+            batch = fingerprints[start:start + LOOKUP_BATCH]
+            placeholders = ', '.join('?' * len(batch))
+            known.update(row[0] for row in self.connection.execute(
+                f"SELECT fingerprint FROM rows WHERE fingerprint IN ({placeholders})", batch))
+        return known
+
+    def filter_new_rows(self, df, card, occurrences=None):
+        """
+        Drop rows whose fingerprint is already in the ledger or pending from this import.
+        Pass one occurrences dict per file (see row_fingerprints).
+
+        Returns:
+        pandas.DataFrame: The rows not seen before (the new ones are added to pending).
+        """
+        if df.empty:
+            return df
+        fingerprints = row_fingerprints(df, card, occurrences)
+        known = self._known(fingerprints)
+        keep = [fingerprint not in known and fingerprint not in self._pending_rows
+                and fingerprint not in self._file_rows for fingerprint in fingerprints]
+        self._file_rows.update(fingerprint for fingerprint, new in zip(fingerprints, keep) if new)
+        return df[keep]
+
+    def add_file(self, digest, name, size, rows=None):
+        """Mark a file, and the rows filtered since the last add_file(), as imported once commit() is called"""
+        self._pending_files.append((digest, name, size, rows, time.time()))
+        self._pending_rows.update(self._file_rows)
+        self._file_rows = set()
+
+    def discard_file_rows(self):
+        """Forget the rows filtered since the last add_file(), e.g. after that file failed to load"""
+        self._file_rows = set()
+
+    def commit(self):
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO files (sha256, name, size, rows, imported_at) VALUES (?, ?, ?, ?, ?)",
+                self._pending_files)
+            self.connection.executemany("INSERT OR IGNORE INTO rows (fingerprint) VALUES (?)",
+                                        ((fingerprint,) for fingerprint in self._pending_rows | self._file_rows))
+        self.rollback()
+
+    def rollback(self):
+        """Forget everything pending, e.g. after the import failed"""
+        self._pending_files = []
+        self._pending_rows = set()
+        self._file_rows = set()
+
+    def close(self):
+        self.connection.close()
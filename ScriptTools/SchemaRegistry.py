@@ -0,0 +1,169 @@
+# SchemaRegistry.py
+
+import fnmatch
+import os
+
+import pandas as pd
+from sqlalchemy import Column, Date, Index, Integer, MetaData, Numeric, String, Table, inspect
+
+import DatabaseFunctions as dbf
+
+# Pandas dtype each declared column is read as. Dates are read as text and parsed with the
+# schema's date_format, so a bad date becomes NULL; a non-numeric amount still fails the file.
+_READ_DTYPES = {Date: str, String: str, Numeric: 'float64', Integer: 'Int64'}
+
+
+class StagingSchema:
+    """
+    A declared staging table: its name, typed columns, indexes and how to read matching files.
+
+    Parameters:
+    table_name (str): Target table.
+    columns (list): sqlalchemy Column objects, named exactly like the file headers.
+    indexes (list): Tuples of column names; one non-unique index is created per tuple.
+    date_format (str): strptime format of the Date columns in the files.
+    sheet (str or int): Worksheet to read from .xlsx files. Defaults to the first one.
+    cell_range (str): A1-style range holding the header and rows in .xlsx files, e.g. 'A5:H100000'.
+    """
+
+    def __init__(self, table_name, columns, indexes=(), date_format=None, sheet=None, cell_range=None):
+        self.table_name = table_name
+        self.columns = columns
+        self.indexes = indexes
+        self.date_format = date_format
+        self.sheet = sheet
+        self.cell_range = cell_range
+
+    @property
+    def column_names(self):
+        return [column.name for column in self.columns]
+
+    @property
+    def read_dtypes(self):
+        """dtype mapping for pd.read_csv/read_excel so pandas does not infer column types"""
+        return {column.name: _READ_DTYPES[_base_type(column.type)] for column in self.columns
+                if _base_type(column.type) in _READ_DTYPES}
+
+    def table(self, metadata=None):
+        table = Table(self.table_name, metadata if metadata is not None else MetaData(),
+                      *[column._copy() for column in self.columns])
+        for index_columns in self.indexes:
+            Index(f"IX_{self.table_name}_{'_'.join(index_columns)}".replace(' ', ''),
+                  *[table.c[name] for name in index_columns])
+        return table
+
+    def ensure_table(self, connection):
+        """
+        Create the typed table and its indexes if they are missing.
+
+        A table left over from an untyped load (one missing any declared column) is
+        replaced, since its rows are only staging data.
+        """
+        table = self.table()
+        if inspect(connection).has_table(self.table_name):
+            existing = {column['name'] for column in inspect(connection).get_columns(self.table_name)}
+            if set(self.column_names) <= existing:
+                return
+            print(f"Recreating staging table {self.table_name} with its declared schema")
+            table.drop(connection)
+        table.create(connection)
+
+    def coerce(self, df):
+        """
+        Shape a DataFrame to the declared columns: extra columns are dropped, missing ones
+        become NULL, dates are parsed and text is cut to the declared length.
+        """
+        extra = [column for column in df.columns if column not in self.column_names]
+        if extra:
+            print(f"Ignoring columns not declared for {self.table_name}: {extra}")
+        df = df.reindex(columns=self.column_names)
+        for column in self.columns:
+            base_type = _base_type(column.type)
+            if base_type is Date:
+                df[column.name] = pd.to_datetime(df[column.name], format=self.date_format, errors='coerce').dt.date
+            elif base_type is String and column.type.length:
+                df[column.name] = df[column.name].astype('string').str.slice(0, column.type.length).astype(object)
+            elif base_type is Numeric:
+                df[column.name] = pd.to_numeric(df[column.name], errors='coerce')
+        return df
+
+
+def _base_type(sql_type):
+    for base_type in _READ_DTYPES:
+        if isinstance(sql_type, base_type):
+            return base_type
+    return None
+
+
+CHASE_CREDIT_CARD = StagingSchema(
+    'temp_Report_ChaseCreditCardTransactions',
+    [
+        Column('Transaction Date', Date),
+        Column('Post Date', Date),
+        Column('Description', String(200)),
+        Column('Category', String(100)),
+        Column('Type', String(50)),
+        Column('Amount', Numeric(12, 2)),
+        Column('Memo', String(500)),
+        Column('Source_File', String(260)),
+        Column('Source_File_RowID', Integer),
+        # 'chase-<row fingerprint>', stable across imports; the mirror and aggregates key rows by it
+        Column('Transaction_ID', String(100)),
+        # Category from the CATEGORY_RULES_FILE rules, NULL where no rule applies
+        Column('Rule_Category', String(100)),
+    ],
+    indexes=[('Source_File', 'Source_File_RowID'), ('Transaction Date',)],
+    date_format='%m/%d/%Y',
+)
+
+# (file name pattern, schema), checked in order; patterns are case-insensitive globs.
+# CHASE_CREDIT_CARD is not listed: its table is shared by a whole Chase batch and only
+# Import_ChaseReport_ToDBO loads it, together with SP_Fill_Report_ChaseCreditCardTransactions.
+SCHEMAS = []
+
+
+def register(pattern, schema):
+    """Declare the staging table for files matching pattern, ahead of existing patterns"""
+    SCHEMAS.insert(0, (pattern, schema))
+
+
+def schema_for(filename):
+    """Return the StagingSchema for a file name, or None when no pattern matches"""
+    name = os.path.basename(filename).lower()
+    for pattern, schema in SCHEMAS:
+        if fnmatch.fnmatchcase(name, pattern.lower()):
+            return schema
+    return None
+
+
+def create_table(schema, engine):
+    """
+    Create (or repair) a schema's staging table once, before a file's chunks are loaded.
+
+    Returns:
+    bool: True if the table is ready, False if it could not be created.
+    """
+    try:
+        with engine.begin() as connection:
+            schema.ensure_table(connection)
+        return True
+    except Exception as e:
+        print(f"Error creating staging table {schema.table_name}: {e}")
+        return False
+
+
+def load_dataframe(df, schema, engine, chunksize=None, truncate=True, create=True):
+    """
+    Coerce a DataFrame to its schema and bulk load it into the pre-created staging table.
+
+    Parameters:
+    create (bool): Check for (and create) the table first. Callers loading a file in chunks
+        call create_table once and pass False.
+
+    Returns:
+    int or None: Rows inserted, or None if the load failed (as insert_dataframe_to_sql).
+    """
+    df = schema.coerce(df)
+    if create and not create_table(schema, engine):
+        return None
+    return dbf.insert_dataframe_to_sql(df, schema.table_name, engine, chunksize, truncate)
@@ -0,0 +1,287 @@
+"""
+Long-running ingestion service for the ChaseReports and DB Imports folders.
+
+New files are picked up from filesystem events (watchdog, when installed) or by polling:
+a folder is only listed again when its own modification time changes. A file is imported
+once its size and modification time have stayed the same for --settle seconds, so files
+still being copied or saved are left alone. Ready files go through a bounded queue per folder
+to its worker threads and are archived with an atomic rename.
+
+    python Watch_Import_Folders.py --chase-dir ChaseReports --imports-dir "DB Imports"
+"""
+
+import argparse
+import os
+import queue
+import threading
+import time
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # watchdog is optional; without it the folders are polled
+    Observer = None
+    FileSystemEventHandler = object
+
+import Import_ChaseReport_ToDBO as chase_import
+import Import_File_To_DBO as file_import
+from IngestionLedger import IngestionLedger
+
+
+def _is_temporary(filename):
+    # Office lock files (~$Book.xlsx) and hidden/partial download files
+    return filename.startswith(('~$', '.')) or filename.endswith(('.tmp', '.partial', '.crdownload'))
+
+
+class WatchedFolder:
+    """
+    One folder, the files in it that should be imported, and how to import a batch of them.
+
+    handler(paths, ledger) imports the given ready files; each worker thread owns its ledger.
+    Chase exports share one staging table, so that folder runs a single worker which imports
+    everything waiting in the queue as one batch.
+    """
+
+    def __init__(self, name, path, matches, handler, ledger_path, workers=1, queue_size=100):
+        self.name = name
+        self.path = path
+        self.matches = matches
+        self.handler = handler
+        self.ledger_path = ledger_path
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.directory_mtime = None
+        # path -> (size, mtime_ns, time the file last changed, time first seen)
+        self.pending = {}
+        self.queued = {}
+        # Files whose import failed, with the (size, mtime_ns) they failed with
+        self.failed = {}
+        self.lock = threading.Lock()
+
+    def wants(self, file_path):
+        filename = os.path.basename(file_path)
+        return (os.path.dirname(os.path.abspath(file_path)) == os.path.abspath(self.path)
+                and not _is_temporary(filename) and self.matches(filename))
+
+    def notice(self, file_path):
+        """Start tracking a file that appeared or changed"""
+        if not self.wants(file_path):
+            return
+        with self.lock:
+            if file_path not in self.pending and file_path not in self.queued:
+                now = time.monotonic()
+                self.pending[file_path] = (None, None, now, now)
+
+    def scan(self):
+        """List the folder if it changed since the last scan and track any new files"""
+        try:
+            directory_mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if directory_mtime == self.directory_mtime:
+            return
+        self.directory_mtime = directory_mtime
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    self.notice(entry.path)
+
+    def ready_files(self, settle_seconds):
+        """Pending files whose size and mtime have not changed for settle_seconds"""
+        now = time.monotonic()
+        ready = []
+        with self.lock:
+            for file_path, (size, mtime, changed_at, seen_at) in list(self.pending.items()):
+                try:
+                    stat = os.stat(file_path)
+                except FileNotFoundError:
+                    del self.pending[file_path]
+                    continue
+                if (stat.st_size, stat.st_mtime_ns) != (size, mtime):
+                    self.pending[file_path] = (stat.st_size, stat.st_mtime_ns, now, seen_at)
+                elif self.failed.get(file_path) == (size, mtime):
+                    continue  # Failed before and unchanged since; wait for a new version
+                elif now - changed_at >= settle_seconds and _can_open(file_path):
+                    ready.append((file_path, seen_at))
+        return ready
+
+    def enqueue(self, file_path, seen_at):
+        """Queue a ready file; False when the queue is full and the file has to wait"""
+        try:
+            self.queue.put_nowait(file_path)
+        except queue.Full:
+            return False
+        with self.lock:
+            del self.pending[file_path]
+            self.queued[file_path] = seen_at
+        return True
+
+    def worker(self, stop):
+        ledger = IngestionLedger(self.ledger_path)
+        try:
+            while not stop.is_set():
+                try:
+                    batch = [self.queue.get(timeout=0.5)]
+                except queue.Empty:
+                    continue
+                if self.workers == 1:
+                    # Only worker for this folder: take everything else that is ready as well
+                    while True:
+                        try:
+                            file_path = self.queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        batch.append(file_path)
+                self._import(batch, ledger)
+        finally:
+            ledger.close()
+
+    def _import(self, batch, ledger):
+        try:
+            self.handler(batch, ledger)
+        except Exception as e:
+            print(f"[{self.name}] Error importing {len(batch)} files: {e}")
+        now = time.monotonic()
+        with self.lock:
+            for file_path in batch:
+                seen_at = self.queued.pop(file_path)
+                try:
+                    stat = os.stat(file_path)
+                except FileNotFoundError:
+                    # Archived: done
+                    self.failed.pop(file_path, None)
+                    print(f"[{self.name}] {os.path.basename(file_path)} imported {now - seen_at:.1f}s after it appeared")
+                    continue
+                print(f"[{self.name}] {os.path.basename(file_path)} was not archived; retrying when it changes")
+                self.failed[file_path] = (stat.st_size, stat.st_mtime_ns)
+                self.pending[file_path] = (stat.st_size, stat.st_mtime_ns, now, seen_at)
+
+
+def _can_open(file_path):
+    # Windows keeps files that are still being written locked
+    try:
+        with open(file_path, 'rb'):
+            return True
+    except OSError:
+        return False
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, folder):
+        self.folder = folder
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.folder.notice(event.src_path)
+
+    def on_modified(self, event):
+        self.on_created(event)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.folder.notice(event.dest_path)
+
+
+def watch(folders, settle_seconds=2.0, poll_seconds=1.0, use_events=True, stop=None):
+    """
+    Import files from the watched folders as they arrive until stop is set (or Ctrl+C).
+
+    Parameters:
+    folders (list): WatchedFolder instances.
+    settle_seconds (float): How long a file must stay unchanged before it is imported.
+    poll_seconds (float): Interval between checks of pending files (and folder listings when polling).
+    use_events (bool): Use watchdog filesystem events when it is installed.
+    stop (threading.Event): Set to shut down; created when None.
+    """
+    stop = stop or threading.Event()
+    for folder in folders:
+        os.makedirs(folder.path, exist_ok=True)
+    observer = None
+    if use_events and Observer is not None:
+        observer = Observer()
+        for folder in folders:
+            observer.schedule(_EventHandler(folder), folder.path, recursive=False)
+        observer.start()
+    print(f"Watching {', '.join(folder.path for folder in folders)} "
+          f"({'filesystem events' if observer is not None else 'polling'})")
+
+    threads = []
+    for folder in folders:
+        for i in range(folder.workers):
+            thread = threading.Thread(target=folder.worker, args=(stop,), name=f"{folder.name}-{i}", daemon=True)
+            thread.start()
+            threads.append(thread)
+
+    try:
+        for folder in folders:
+            folder.scan()  # Files that arrived while the service was down
+        while not stop.wait(poll_seconds):
+            for folder in folders:
+                if observer is None:
+                    folder.scan()
+                for file_path, seen_at in folder.ready_files(settle_seconds):
+                    if not folder.enqueue(file_path, seen_at):
+                        break  # Queue full; the rest stays pending until the workers catch up
+    except KeyboardInterrupt:
+        print("Stopping...")
+    finally:
+        stop.set()
+        if observer is not None:
+            observer.stop()
+            observer.join()
+        for thread in threads:
+            thread.join()
+
+
+def chase_folder(chase_dir, chunksize=10000, queue_size=100):
+    archive_dir = os.path.join(chase_dir, "archive")
+    os.makedirs(archive_dir, exist_ok=True)
+
+    def handler(paths, ledger):
+        stats = chase_import.import_chase_files(sorted(paths), archive_dir, 1, chunksize, ledger)
+        if stats.rows or stats.skipped_files or stats.skipped_rows:
+            stats.report()
+
+    return WatchedFolder('chase', chase_dir, chase_import.is_chase_file, handler,
+                         os.path.join(chase_dir, chase_import.LEDGER_FILE), 1, queue_size)
+
+
+def imports_folder(imports_dir, workers=2, queue_size=100):
+    archive_path = file_import.archive_path_for(imports_dir)
+    os.makedirs(archive_path, exist_ok=True)
+
+    def handler(paths, ledger):
+        for file_path in paths:
+            file_import.process_file(file_path, ledger, archive_path)
+
+    return WatchedFolder('imports', imports_dir, lambda f: f.endswith(file_import.SUPPORTED_EXTENSIONS), handler,
+                         os.path.join(imports_dir, file_import.LEDGER_FILE), workers, queue_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import files from the ChaseReports and DB Imports folders as they arrive")
+    parser.add_argument('--chase-dir', default=os.path.join(os.getcwd(), "ChaseReports"))
+    parser.add_argument('--imports-dir', default=file_import.folder_path)
+    parser.add_argument('--no-chase', action='store_true', help="Do not watch the Chase folder")
+    parser.add_argument('--no-imports', action='store_true', help="Do not watch the DB Imports folder")
+    parser.add_argument('--settle', type=float, default=2.0, help="Seconds a file must stay unchanged before import")
+    parser.add_argument('--poll', type=float, default=1.0, help="Seconds between checks")
+    parser.add_argument('--workers', type=int, default=2, help="Import threads for the DB Imports folder")
+    parser.add_argument('--queue-size', type=int, default=100, help="Ready files waiting per folder")
+    parser.add_argument('--chunksize', type=int, default=10000, help="Rows per Chase CSV chunk and bulk insert")
+    parser.add_argument('--polling', action='store_true', help="Poll even when watchdog is installed")
+    args = parser.parse_args()
+
+    folders = []
+    if not args.no_chase:
+        folders.append(chase_folder(args.chase_dir, args.chunksize, args.queue_size))
+    if not args.no_imports:
+        folders.append(imports_folder(args.imports_dir, args.workers, args.queue_size))
+    if not folders:
+        parser.error("Nothing to watch")
+
+    watch(folders, args.settle, args.poll, use_events=not args.polling)
+
+
+if __name__ == "__main__":
+    main()
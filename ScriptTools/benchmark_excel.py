@@ -0,0 +1,101 @@
+"""
+Benchmark: pd.read_excel on a whole workbook vs. the streaming ExcelReader chunks.
+
+Every candidate runs in a fresh process, so its peak memory is its own.
+
+    python benchmark_excel.py [--rows 200000] [--workbook bench_200k.xlsx] [--chunksize 10000]
+"""
+
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from ExcelReader import CalamineWorkbook, iter_excel_chunks
+
+HEADER = ['Transaction Date', 'Post Date', 'Description', 'Category', 'Type', 'Amount', 'Memo']
+CATEGORIES = ['Food & Drink', 'Shopping', 'Travel', 'Groceries', 'Gas', 'Bills & Utilities']
+
+
+def generate_workbook(path, rows):
+    """Write a Chase-like workbook with openpyxl's write-only mode"""
+    from openpyxl import Workbook
+
+    random.seed(0)
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet('Transactions')
+    worksheet.append(HEADER)
+    start = date(2020, 1, 1)
+    for i in range(rows):
+        day = start + timedelta(days=i % 1500)
+        worksheet.append([day, day + timedelta(days=1), f"MERCHANT {i % 5000:04d}", random.choice(CATEGORIES),
+                          'Sale', round(-random.random() * 200, 2), None if i % 7 else 'memo'])
+    workbook.save(path)
+
+
+def _peak_memory_mb():
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KiB, macOS bytes
+        return peak / 1024 / (1024 if os.uname().sysname == 'Darwin' else 1)
+    if psutil is not None:
+        return getattr(psutil.Process().memory_info(), 'peak_wset', 0) / 1024 / 1024
+    return float('nan')
+
+
+def _run(candidate, path, chunksize):
+    start = time.perf_counter()
+    if candidate == 'pd.read_excel (openpyxl)':
+        rows = len(pd.read_excel(path))
+    elif candidate == 'pd.read_excel (calamine)':
+        rows = len(pd.read_excel(path, engine='calamine'))
+    else:
+        engine = 'calamine' if 'calamine' in candidate else 'openpyxl'
+        rows = sum(len(chunk) for chunk in iter_excel_chunks(path, chunksize=chunksize, engine=engine))
+    return rows, time.perf_counter() - start, _peak_memory_mb()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark whole-workbook vs. streaming XLSX reads")
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--workbook', help="Workbook to read; generated with --rows rows if it does not exist")
+    parser.add_argument('--chunksize', type=int, default=10000)
+    args = parser.parse_args()
+
+    path = args.workbook or f"bench_{args.rows // 1000}k.xlsx"
+    if not os.path.exists(path):
+        print(f"Generating {path} with {args.rows} rows...")
+        start = time.perf_counter()
+        generate_workbook(path, args.rows)
+        print(f"Generated in {time.perf_counter() - start:.1f}s ({os.path.getsize(path) / 1024 / 1024:.1f} MB)")
+
+    candidates = ['pd.read_excel (openpyxl)', f'iter_excel_chunks openpyxl ({args.chunksize}-row chunks)']
+    if CalamineWorkbook is not None:
+        candidates += ['pd.read_excel (calamine)', f'iter_excel_chunks calamine ({args.chunksize}-row chunks)']
+    else:
+        print("python-calamine is not installed; skipping the calamine candidates")
+
+    print(f"\n{'candidate':<46} {'rows':>8} {'seconds':>8} {'rows/sec':>10} {'peak MB':>8}")
+    for candidate in candidates:
+        # A fresh process per candidate so peak memory is not inherited from the previous one
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            rows, elapsed, peak = executor.submit(_run, candidate, path, args.chunksize).result()
+        print(f"{candidate:<46} {rows:>8} {elapsed:>8.2f} {rows / elapsed:>10,.0f} {peak:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()